@@ -0,0 +1,293 @@
+'''Batch (non-interactive) question runner for Agent-G.
+
+Reads questions as JSON lines from a file or stdin, answers them on a
+bounded thread pool and writes one JSON line per question, in input order,
+with the answer, latency and token usage. Useful for regression checks after
+editing notebooks or the system prompt.
+
+Each input line is either a JSON string (the question) or an object:
+
+    {"id": "garage-key", "question": "Where is the garage key?",
+     "notebook": "Garden", "pages": "10-40", "history": "none"}
+
+`id`, `notebook`, `pages` and `history` are optional. Every question gets its
+own copy of the starting history ("profile": the profile's stored
+conversation, the default; "none": no history), answers are never added to
+it, and the stored profile is read but never written.
+
+Progress and diagnostics go to stderr, so stdout carries only the results.
+
+Usage:
+    python -m agent_cli.batch questions.jsonl [--profile test_user] [--output answers.jsonl]
+        [--concurrency 4] [--history profile|none] [--two-stage off|local|model] [--model NAME]
+    cat questions.jsonl | python -m agent_cli.batch -
+'''
+import argparse
+import contextlib
+import json
+import math
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Set, TextIO, Tuple
+
+from . import config
+from . import data_manager
+from . import llm_service
+from . import tracing
+
+HISTORY_PROFILE = "profile"
+HISTORY_NONE = "none"
+HISTORY_MODES = (HISTORY_PROFILE, HISTORY_NONE)
+
+
+def parse_question(line: str, index: int) -> Dict[str, Any]:
+    """Parses one input line into a question record.
+
+    Args:
+        line (str): A JSON string or object (see the module docstring).
+        index (int): Zero-based position of the line among the questions.
+
+    Returns:
+        Dict[str, Any]: The question with "id" and "question" always set.
+
+    Raises:
+        ValueError: If the line is not valid JSON or has no question text.
+    """
+    try:
+        item = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON: {e}") from e
+    if isinstance(item, str):
+        item = {"question": item}
+    if not isinstance(item, dict) or not isinstance(item.get("question"), str) or not item["question"].strip():
+        raise ValueError("each line needs a non-empty \"question\"")
+    item.setdefault("id", str(index + 1))
+    return item
+
+
+def _resolve_scope(question: Dict[str, Any]) -> Optional[data_manager.PageScope]:
+    """Builds the PageScope a question asks for, if any.
+
+    Raises:
+        ValueError: If the notebook or page range cannot be resolved.
+    """
+    notebook = question.get("notebook")
+    pages = question.get("pages")
+    if not notebook and not pages:
+        return None
+    notebook_id = None
+    if notebook:
+        notebook_id = data_manager.resolve_notebook_id(str(notebook))
+        if notebook_id is None:
+            raise ValueError(f"no single notebook matches '{notebook}'")
+    first, last = 0, None
+    if pages:
+        page_range = data_manager.parse_page_range(str(pages))
+        if page_range is None:
+            raise ValueError(f"invalid page range '{pages}'")
+        first, last = page_range
+    return data_manager.PageScope(notebook_id, first, last)
+
+
+def answer_question(question: Dict[str, Any], profile: Dict[str, Any], default_history: str,
+                    model_name: str, two_stage: Optional[str]) -> Dict[str, Any]:
+    """Answers one question against a profile without changing it.
+
+    Args:
+        question (Dict[str, Any]): A record from `parse_question()`.
+        profile (Dict[str, Any]): The profile to answer as; only read.
+        default_history (str): HISTORY_PROFILE or HISTORY_NONE, unless the question overrides it.
+        model_name (str): The Gemini model to use.
+        two_stage (Optional[str]): Two-stage mode, or None for config.TWO_STAGE_MODE.
+
+    Returns:
+        Dict[str, Any]: The result line to write.
+    """
+    result: Dict[str, Any] = {"id": question["id"], "question": question["question"]}
+    start = time.perf_counter()
+    try:
+        history_mode = question.get("history", default_history)
+        if history_mode not in HISTORY_MODES:
+            raise ValueError(f"history must be one of: {', '.join(HISTORY_MODES)}")
+        scope = _resolve_scope(question)
+    except ValueError as e:
+        result.update(answer=None, error=str(e), latency_ms=0.0)
+        return result
+
+    # A private copy, so concurrent questions never see each other's turns.
+    history = list(profile.get("conversation_history") or []) if history_mode == HISTORY_PROFILE else []
+    with tracing.span("batch.question"):
+        response = llm_service.generate_response(
+            user_query=question["question"],
+            current_user=profile,
+            conversation_history=history,
+            full_transcribed_text="" if scope else data_manager.get_full_transcribed_text(),
+            notebook_pages=None if scope else data_manager.get_prompt_pages(),
+            scope=scope,
+            model_name=model_name,
+            two_stage=two_stage,
+        )
+    plan = response.plan
+    result.update(
+        answer=None if response.error else response.text,
+        error=response.error,
+        latency_ms=round((time.perf_counter() - start) * 1000, 1),
+        usage=response.usage,
+        scope=scope.describe() if scope else None,
+        estimated_prompt_tokens=plan.estimated_tokens if plan else None,
+        pages_included=plan.pages_included if plan else None,
+        pages_summarised=len(plan.summarised_pages) if plan else None,
+        pages_dropped=len(plan.dropped_pages) if plan else None,
+        notes=response.notes,
+    )
+    return result
+
+
+def _read_questions(source: TextIO) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str], str]]:
+    """Yields (index, question or None, parse error or None, raw line) for each non-blank line."""
+    index = 0
+    for line in source:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield index, parse_question(line, index), None, line
+        except ValueError as e:
+            yield index, None, str(e), line
+        index += 1
+
+
+def run_batch(source: TextIO, output: TextIO, profile: Dict[str, Any], concurrency: int = 4,
+              history: str = HISTORY_PROFILE, model_name: str = config.GEMINI_MODEL_NAME,
+              two_stage: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Answers every question from `source` and writes the results to `output`.
+
+    At most `concurrency` questions are in flight, and only a few more are
+    read ahead, so arbitrarily long inputs run in bounded memory. Results are
+    written as soon as every earlier question has finished, keeping input order.
+
+    Args:
+        source (TextIO): JSON lines of questions.
+        output (TextIO): Where to write JSON lines of results.
+        profile (Dict[str, Any]): The profile to answer as; only read.
+        concurrency (int): Maximum questions answered at once.
+        history (str): Default history mode for questions that do not set one.
+        model_name (str): The Gemini model to use.
+        two_stage (Optional[str]): Two-stage mode, or None for config.TWO_STAGE_MODE.
+
+    Returns:
+        List[Dict[str, Any]]: Per-question summaries (id, latency_ms, error, usage).
+    """
+    concurrency = max(1, concurrency)
+    finished: Dict[int, Dict[str, Any]] = {}
+    summaries: List[Dict[str, Any]] = []
+    next_to_write = 0
+
+    def write_ready() -> None:
+        nonlocal next_to_write
+        while next_to_write in finished:
+            result = finished.pop(next_to_write)
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            summaries.append({key: result.get(key) for key in ("id", "latency_ms", "error", "usage")})
+            next_to_write += 1
+
+    def collect(done: Set[Future]) -> None:
+        for future in done:
+            index, result = future.result()
+            finished[index] = result
+        write_ready()
+
+    def answer(index: int, question: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        try:
+            return index, answer_question(question, profile, history, model_name, two_stage)
+        except Exception as e:
+            return index, {"id": question["id"], "question": question["question"], "answer": None,
+                           "error": f"Unexpected error: {e}", "latency_ms": 0.0}
+
+    in_flight: Set[Future] = set()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as executor:
+        for index, question, parse_error, line in _read_questions(source):
+            if question is None:
+                finished[index] = {"id": str(index + 1), "input": line, "answer": None,
+                                   "error": parse_error, "latency_ms": 0.0}
+                write_ready()
+                continue
+            # Bound the questions read ahead while the pool catches up.
+            if len(in_flight) >= concurrency * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight.add(executor.submit(answer, index, question))
+        done, _ = wait(in_flight)
+        collect(done)
+    return summaries
+
+
+def format_summary(summaries: List[Dict[str, Any]], elapsed_s: float) -> str:
+    """Returns a short report of a batch run: counts, latency percentiles and tokens."""
+    latencies = sorted(item["latency_ms"] for item in summaries if not item.get("error"))
+    errors = sum(1 for item in summaries if item.get("error"))
+    total_tokens = sum((item.get("usage") or {}).get("total_tokens", 0) for item in summaries)
+
+    def percentile(fraction: float) -> float:
+        return latencies[max(0, math.ceil(fraction * len(latencies)) - 1)] if latencies else 0.0
+
+    return (f"{len(summaries)} question(s), {errors} error(s) in {elapsed_s:.1f}s; "
+            f"latency p50 {percentile(0.5):.0f} ms, p95 {percentile(0.95):.0f} ms; "
+            f"{total_tokens} total tokens.")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Parses arguments, loads the agent's data and runs the batch.
+
+    Returns:
+        int: Process exit status: 0 if every question was answered, 1 otherwise.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", help="JSONL file of questions, or - for stdin.")
+    parser.add_argument("--profile", default=config.DEFAULT_USER_PROFILE_FILENAME.replace(".json.enc", ""),
+                        help="Profile to answer as (default: %(default)s). It is never modified.")
+    parser.add_argument("--output", help="Write results to this file instead of stdout.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Questions answered at once (default: %(default)s).")
+    parser.add_argument("--history", choices=HISTORY_MODES, default=HISTORY_PROFILE,
+                        help="Start each question from the profile's history or from none (default: %(default)s).")
+    parser.add_argument("--two-stage", choices=("off", "local", "model"), help="Two-stage page selection mode.")
+    parser.add_argument("--model", default=config.GEMINI_MODEL_NAME, help="Gemini model (default: %(default)s).")
+    args = parser.parse_args(argv)
+
+    profile_filename = args.profile if args.profile.endswith(".json.enc") else f"{args.profile}.json.enc"
+    results_stream = sys.stdout
+    # Everything the agent prints goes to stderr; stdout is reserved for results.
+    with contextlib.redirect_stdout(sys.stderr):
+        config.ensure_api_key()
+        config.start_sdk_import()
+        if not data_manager.load_and_decrypt_system_prompt(config.SYSTEM_PROMPT_FILE_PATH):
+            print("Exiting due to system prompt loading error.")
+            return 1
+        try:
+            profile = data_manager.read_user_profile(config.USER_PROFILE_DIR, profile_filename)
+        except FileNotFoundError:
+            print(f"Error: Profile '{profile_filename}' not found in {config.USER_PROFILE_DIR}.")
+            return 1
+        except Exception as e:
+            print(f"Error loading or decrypting user profile '{profile_filename}': {e}")
+            return 1
+        if not data_manager.load_transcriptions(config.TRANSCRIPTION_DIR):
+            print("No notebook data loaded. Answers will not draw on any notebooks.")
+        config.configure_gemini_api()
+
+        start = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            source = sys.stdin if args.questions == "-" else stack.enter_context(
+                open(args.questions, 'r', encoding='utf-8'))
+            output = results_stream if not args.output else stack.enter_context(
+                open(args.output, 'w', encoding='utf-8'))
+            summaries = run_batch(source, output, profile, concurrency=args.concurrency, history=args.history,
+                                  model_name=args.model, two_stage=args.two_stage)
+        print(format_summary(summaries, time.perf_counter() - start))
+    return 1 if any(item.get("error") for item in summaries) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
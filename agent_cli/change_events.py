@@ -0,0 +1,246 @@
+'''Lightweight change notifications for the encrypted notebook pages.
+
+Writers (the admin interface, bulk imports, utilities/prepare_context.py)
+append one JSON line per changed page to a small event log inside the
+notebook directory. Readers such as a running CLI remember how far into the
+log they have read and, on each poll, pick up only the new events, so they
+can reload just the affected pages instead of re-decrypting the whole corpus.
+
+The log holds file names and timestamps only, never page content.
+
+Once the log grows past COMPACT_BYTES, the writer that notices rewrites it
+with only the latest event per page, so it stays small however many edits,
+imports and restores there have been. Writers hold a shared lock while they
+append and the compaction an exclusive one, so no event is lost to the
+rewrite. A reader that finds the log replaced reads it again from the start,
+skipping events much older than the newest one it had already seen.
+Compaction needs `fcntl` (not on Windows); without it the log only grows,
+and it is safe to delete whenever no CLI is running.
+'''
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError: # Windows: appends are not locked and the log is never compacted.
+    fcntl = None
+
+from . import file_io
+
+EVENT_LOG_FILENAME = ".changes.log"
+
+# Log size above which a writer compacts it to the latest event per page. The
+# compacted log is compacted again only once it has doubled.
+COMPACT_BYTES = 1 << 20
+# When the log was replaced, a reader skips events this many seconds older than
+# the newest event it had read. Replaying an event is harmless; the margin
+# covers writers whose events reach the log out of timestamp order.
+REPLAY_MARGIN = 60.0
+
+OP_UPDATE = "update"
+OP_DELETE = "delete"
+
+
+def event_log_path(directory: str) -> str:
+    """Returns the path of the event log for a notebook directory.
+
+    Args:
+        directory (str): The notebook context directory.
+
+    Returns:
+        str: Path of the event log file.
+    """
+    return os.path.join(directory, EVENT_LOG_FILENAME)
+
+
+def record_changes(directory: str, filenames: Iterable[str], op: str = OP_UPDATE) -> None:
+    """Appends change events for one or more pages.
+
+    All events are written with a single O_APPEND write, so concurrent
+    writers do not interleave partial lines.
+
+    Args:
+        directory (str): The notebook context directory.
+        filenames (Iterable[str]): Names of the pages that changed.
+        op (str): OP_UPDATE for created or modified pages, OP_DELETE for removed pages.
+    """
+    now = time.time()
+    payload = "".join(
+        json.dumps({"ts": now, "op": op, "file": os.path.basename(filename)}) + "\n"
+        for filename in filenames
+    ).encode('utf-8')
+    if not payload:
+        return
+    path = event_log_path(directory)
+    while True:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_SH)
+                if not _is_current(fd, path):
+                    continue # Compacted while we waited for the lock; append to the new log.
+            os.write(fd, payload)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        break
+    if fcntl is not None and size > COMPACT_BYTES:
+        compact_log(directory, COMPACT_BYTES)
+
+
+def _is_current(fd: int, path: str) -> bool:
+    """Checks that an open log file is still the one at `path`."""
+    try:
+        return os.fstat(fd).st_ino == os.stat(path).st_ino
+    except FileNotFoundError:
+        return False
+
+
+def _compacted_size(header: bytes) -> int:
+    """Returns the size recorded in a compacted log's first line, or 0."""
+    try:
+        entry = json.loads(header.split(b"\n", 1)[0])
+        return int(entry["compacted_bytes"])
+    except (ValueError, TypeError, KeyError):
+        return 0
+
+
+def compact_log(directory: str, min_bytes: int = COMPACT_BYTES) -> bool:
+    """Rewrites the event log keeping only the latest event per page.
+
+    Does nothing if the log is under `min_bytes`, has not doubled since it was
+    last compacted, or `fcntl` is not available.
+
+    Args:
+        directory (str): The notebook context directory.
+        min_bytes (int): Size below which the log is left alone.
+
+    Returns:
+        bool: True if the log was rewritten.
+    """
+    if fcntl is None:
+        return False
+    path = event_log_path(directory)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX) # Waits for appends in progress and holds off new ones.
+        size = os.fstat(fd).st_size
+        if not _is_current(fd, path) or size <= max(min_bytes, 2 * _compacted_size(os.pread(fd, 256, 0))):
+            return False
+        latest: Dict[str, bytes] = {}
+        with os.fdopen(os.dup(fd), 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(event, dict) and isinstance(event.get("file"), str):
+                    latest.pop(event["file"], None) # Keep the order of each page's latest event.
+                    latest[event["file"]] = line
+        events = b"".join(latest.values())
+        header = json.dumps({"compacted": time.time(), "compacted_bytes": len(events)}).encode('utf-8') + b"\n"
+        file_io.atomic_write(path, header + events)
+        return True
+    finally:
+        os.close(fd)
+
+
+def record_change(directory: str, filename: str, op: str = OP_UPDATE) -> None:
+    """Appends a change event for a single page.
+
+    Args:
+        directory (str): The notebook context directory.
+        filename (str): Name of the page that changed.
+        op (str): OP_UPDATE or OP_DELETE.
+    """
+    record_changes(directory, [filename], op)
+
+
+class ChangeEventReader:
+    """Reads change events appended since the previous read.
+
+    Args:
+        directory (str): The notebook context directory.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.path = event_log_path(directory)
+        self._offset = 0
+        self._inode: Optional[int] = None
+        self._newest_ts = 0.0
+        self._last_stat: Optional[Tuple[int, int, int]] = None
+
+    def skip_to_end(self) -> None:
+        """Ignores all events written so far, e.g. right before a full load."""
+        self._newest_ts = time.time()
+        try:
+            st = os.stat(self.path)
+            self._offset = st.st_size
+            self._inode = st.st_ino
+            self._last_stat = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            self._offset = 0
+            self._inode = None
+            self._last_stat = None
+
+    def has_new_events(self) -> bool:
+        """Cheaply checks (with a single stat) whether the log has changed.
+
+        Returns:
+            bool: True if `read_new()` may return events.
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return (st.st_ino, st.st_mtime_ns, st.st_size) != self._last_stat
+
+    def read_new(self) -> List[Dict[str, Any]]:
+        """Returns events appended since the last call.
+
+        If the log was truncated or replaced (e.g. compacted), it is re-read
+        from the start, skipping events more than REPLAY_MARGIN seconds older
+        than the newest event already read; replaying an event is harmless
+        because handling is idempotent.
+
+        Returns:
+            List[Dict[str, Any]]: Events with "ts", "op" and "file" keys, oldest first.
+        """
+        oldest = 0.0
+        try:
+            with open(self.path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                if st.st_size < self._offset or (self._inode is not None and st.st_ino != self._inode):
+                    self._offset = 0
+                    oldest = self._newest_ts - REPLAY_MARGIN
+                self._inode = st.st_ino
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        # Only consume complete lines; a concurrent writer may be mid-append.
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+        self._last_stat = (st.st_ino, st.st_mtime_ns, st.st_size) if end == len(data) else None
+        events = []
+        for line in data[:end].splitlines():
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(event, dict) or not isinstance(event.get("file"), str):
+                continue
+            ts = event.get("ts")
+            if isinstance(ts, (int, float)):
+                if ts < oldest:
+                    continue
+                self._newest_ts = max(self._newest_ts, ts)
+            events.append(event)
+        return events
@@ -1,9 +1,202 @@
-from typing import Optional
+import io
+import sys
+import threading
+from typing import Any, Optional, Tuple
 from . import config
 from . import data_manager
 from . import llm_service
+from . import profiler
+from . import tracing
+
+# --- Scope Commands ---
+SCOPE_HELP = ("Scope commands: /notebook [name] (list notebooks or ask about one), "
+              "/pages 10-40 (page range), /scope (show), /all (clear), "
+              "/two-stage [off|local|model] (select pages before answering), "
+              "/duplicates (near-duplicate pages).")
+TWO_STAGE_MODES = ("off", "local", "model")
+
+def _handle_scope_command(user_input: str, scope: Optional[data_manager.PageScope]
+                          ) -> Tuple[bool, Optional[data_manager.PageScope]]:
+    """Handles the /notebook, /pages, /scope and /all commands.
+
+    Args:
+        user_input (str): The line typed by the user.
+        scope (Optional[data_manager.PageScope]): The scope currently in effect.
+
+    Returns:
+        Tuple[bool, Optional[data_manager.PageScope]]: Whether the input was a scope
+            command, and the scope in effect afterwards.
+    """
+    command, _, argument = user_input.partition(" ")
+    command = command.lower()
+    argument = argument.strip()
+
+    if command == "/all":
+        print("Questions now use all notebooks.")
+        return True, None
+
+    if command == "/scope":
+        print(f"Current scope: {scope.describe() if scope else 'all notebooks'}.")
+        return True, scope
+
+    if command == "/notebook":
+        if not argument:
+            notebooks = data_manager.list_notebooks()
+            if not notebooks:
+                print("No notebooks are loaded.")
+            for notebook_id, page_count in notebooks:
+                print(f"  {notebook_id} ({page_count} page(s))")
+            return True, scope
+        notebook_id = data_manager.resolve_notebook_id(argument)
+        if notebook_id is None:
+            print(f"No single notebook matches '{argument}'. Type /notebook to list them.")
+            return True, scope
+        scope = data_manager.PageScope(notebook_id=notebook_id)
+        print(f"Questions now use {scope.describe()}.")
+        return True, scope
+
+    if command == "/pages":
+        page_range = data_manager.parse_page_range(argument)
+        if page_range is None:
+            print("Usage: /pages 10-40, /pages 12 or /pages 10- (from page 10 onwards).")
+            return True, scope
+        first, last = page_range
+        scope = data_manager.PageScope(scope.notebook_id if scope else None, first, last)
+        print(f"Questions now use {scope.describe()}.")
+        return True, scope
+
+    return False, scope
+
+def _print_duplicates() -> None:
+    """Prints the near-duplicate page clusters found at load time."""
+    report = data_manager.get_duplicate_report()
+    if report is None:
+        print("Duplicate detection is off (AGENT_G_DUPLICATE_PAGES=off).")
+        return
+    print(report.describe())
+    for cluster in report.clusters:
+        print(f"  {cluster.keep}")
+        for filename, score in cluster.duplicates:
+            print(f"    = {filename} ({score:.0%} similar)")
+
+# --- Background Start-up ---
+class _ThreadOutput:
+    """Stands in for sys.stdout, holding back what one thread prints.
+
+    Everything else, including `input()` prompts, goes to the real stream.
+    """
+
+    def __init__(self, stream: Any, thread: threading.Thread, buffer: io.StringIO) -> None:
+        self._stream = stream
+        self._thread = thread
+        self._buffer = buffer
+
+    def write(self, text: str) -> int:
+        if threading.current_thread() is self._thread:
+            return self._buffer.write(text)
+        return self._stream.write(text)
+
+    def __getattr__(self, name: str) -> Any:
+        # fileno(), isatty(), encoding and so on, so input() still uses readline.
+        return getattr(self._stream, name)
+
+
+class _StartupTasks:
+    """Loads the notebooks and configures the Gemini API on a background thread.
+
+    Runs while the profile prompt waits for the user, so decryption and the SDK
+    import cost nothing unless the user answers faster than they finish.
+    Messages the tasks print are held back until `wait()`, so they do not
+    interrupt the prompt.
+    """
+
+    def __init__(self) -> None:
+        self.notebooks_loaded = False
+        self.notebook_error: Optional[BaseException] = None
+        self.api_error: Optional[BaseException] = None
+        self._output = io.StringIO()
+        self._thread = threading.Thread(target=self._run, name="cli-startup", daemon=True)
+        self._stdout: Optional[Any] = None
+
+    def start(self) -> None:
+        """Starts the background thread."""
+        self._stdout = sys.stdout
+        sys.stdout = _ThreadOutput(self._stdout, self._thread, self._output)
+        self._thread.start()
+
+    def _run(self) -> None:
+        with tracing.span("cli.background_startup"):
+            try:
+                self.notebooks_loaded = data_manager.load_transcriptions(config.TRANSCRIPTION_DIR)
+            except Exception as e:
+                self.notebook_error = e
+            try:
+                config.get_genai().configure(api_key=config.API_KEY)
+            except Exception as e:
+                self.api_error = e
+
+    def wait(self) -> None:
+        """Waits for the tasks to finish, then prints what they held back."""
+        if self._stdout is None:
+            return
+        with tracing.span("cli.wait_for_startup", already_done=not self._thread.is_alive()):
+            self._thread.join()
+        self.discard()
+        print(self._output.getvalue(), end="")
+
+    def discard(self) -> None:
+        """Stops holding back output without waiting, e.g. when start-up is abandoned."""
+        if self._stdout is not None:
+            sys.stdout = self._stdout
+            self._stdout = None
+
+# --- Idle-Time Preparation ---
+class _TurnPreparer:
+    """Prepares the next request while the user types.
+
+    After each answer `llm_service.prepare_turn()` runs on a background thread,
+    so it does not delay the next question unless that is typed faster than it
+    finishes. Nothing else touches the conversation until `finish()` has joined
+    the thread. The profile is saved by the turn itself, before this starts, so
+    an interrupted prompt cannot lose an exchange; the thread only builds
+    something that can be rebuilt, and is a daemon for that reason.
+    """
+
+    def __init__(self) -> None:
+        self._thread: Optional[threading.Thread] = None
+        self._prepared: Optional[llm_service.PreparedTurn] = None
+
+    def start(self, scope: Optional[data_manager.PageScope], two_stage_mode: str) -> None:
+        """Starts preparing a turn for the given scope and mode."""
+        self._thread = threading.Thread(target=self._run, args=(scope, two_stage_mode),
+                                        name="cli-prepare-turn", daemon=True)
+        self._thread.start()
+
+    def _run(self, scope: Optional[data_manager.PageScope], two_stage_mode: str) -> None:
+        try:
+            self._prepared = llm_service.prepare_turn(
+                current_user=data_manager.get_current_user(),
+                conversation_history=data_manager.get_conversation_history(),
+                full_transcribed_text=data_manager.get_full_transcribed_text(),
+                notebook_pages=data_manager.get_prompt_pages(),
+                scope=scope,
+                two_stage=two_stage_mode,
+                model_name=config.GEMINI_MODEL_NAME,
+                previous=self._prepared,
+            )
+        except Exception:
+            self._prepared = None # The turn assembles its prompt as usual.
+
+    def finish(self) -> Optional[llm_service.PreparedTurn]:
+        """Waits for the background work and returns the prepared turn, if any."""
+        if self._thread is not None:
+            with tracing.span("cli.wait_for_prepare", already_done=not self._thread.is_alive()):
+                self._thread.join()
+            self._thread = None
+        return self._prepared
 
 # --- Main CLI Loop ---
+@profiler.profiled("cli")
 def main() -> None:
     """Runs the main command-line interface loop for Agent-G.
 
@@ -15,17 +208,63 @@ def main() -> None:
     print("Welcome to Agent-G (CLI Mode)!")
     print("Your AI assistant")
 
+    # The Gemini SDK is only needed for the first question, so import it in
+    # the background while the system prompt, profile and notebooks load.
+    config.ensure_api_key()
+    config.start_sdk_import()
+    startup = _StartupTasks()
+    try:
+        selected_profile_filename = _start_up(startup)
+    except BaseException: # Ctrl-C at the prompt: leave without waiting for the notebooks.
+        startup.discard()
+        raise
+    if selected_profile_filename is None:
+        startup.discard()
+        return
+    startup.wait()
+    current_user: Optional[dict] = data_manager.get_current_user()
+
+    if startup.api_error is not None:
+        print(f"Error configuring Gemini API: {startup.api_error}")
+        return
+    print("Gemini API configured successfully.")
+    if startup.notebook_error is not None:
+        print(f"Error loading notebooks: {startup.notebook_error}")
+    if not startup.notebooks_loaded:
+        print("No notebook data loaded. The agent may not have any information to work with.")
+    # Pages edited in the admin interface are reloaded in the background.
+    data_manager.start_notebook_watcher(config.NOTEBOOK_WATCH_INTERVAL)
+
+    print(f"\nHello {current_user.get('preferred_name', 'User')}! How can I help you today?")
+    print("Type 'exit' or 'quit' to end the conversation, or '/stats' for timings.")
+    print(SCOPE_HELP)
+    _chat(selected_profile_filename)
+
+
+def _start_up(startup: _StartupTasks) -> Optional[str]:
+    """Loads the system prompt, starts the background tasks and asks the user to pick a profile.
+
+    Args:
+        startup (_StartupTasks): The notebook and API tasks to run while the user chooses.
+
+    Returns:
+        Optional[str]: The selected profile filename, or None if start-up failed.
+    """
+
     # Load and decrypt system prompt using data_manager
-    if not data_manager.load_and_decrypt_system_prompt(config.SYSTEM_PROMPT_FILE_PATH):
+    with tracing.span("cli.load_system_prompt"):
+        system_prompt_loaded = data_manager.load_and_decrypt_system_prompt(config.SYSTEM_PROMPT_FILE_PATH)
+    if not system_prompt_loaded:
         print("Exiting due to system prompt loading error.")
-        return
+        return None
     
     system_prompt_base: Optional[str] = data_manager.get_decrypted_system_prompt()
     if system_prompt_base is None: # Should be redundant if load_and_decrypt_system_prompt handles exit
         print("Critical Error: System prompt not available after loading attempt. Exiting.")
-        return
+        return None
 
-    config.configure_gemini_api()
+    # Decrypt the notebooks and configure the API while the user picks a profile.
+    startup.start()
 
     # --- User Profile Selection ---
     available_profiles = data_manager.list_available_profiles(config.USER_PROFILE_DIR)
@@ -99,19 +338,26 @@ def main() -> None:
         # This print might be redundant or could state that a fallback in-memory profile is active.
         print(f"Note: There was an issue loading '{selected_profile_filename}'. A new or fallback profile state is active.")
     
-    current_user: Optional[dict] = data_manager.get_current_user()
-    if not current_user: # Should be handled by load_user_profile ensuring _current_user_profile is set
+    if not data_manager.get_current_user(): # Should be handled by load_user_profile ensuring _current_user_profile is set
         print("Critical Error: No user profile loaded (not even default). Exiting.")
-        return
+        return None
+    return selected_profile_filename
 
-    if not data_manager.load_transcriptions(config.TRANSCRIPTION_DIR):
-        print("No notebook data loaded. The agent may not have any information to work with.")
 
-    print(f"\nHello {current_user.get('preferred_name', 'User')}! How can I help you today?")
-    print("Type 'exit' or 'quit' to end the conversation.")
+def _chat(selected_profile_filename: str) -> None:
+    """Runs the question-and-answer loop until the user exits.
+
+    Args:
+        selected_profile_filename (str): The profile to save the conversation to.
+    """
+    scope: Optional[data_manager.PageScope] = None
+    two_stage_mode = config.TWO_STAGE_MODE if config.TWO_STAGE_MODE in TWO_STAGE_MODES else "off"
+    preparer = _TurnPreparer()
 
     while True:
+        preparer.start(scope, two_stage_mode)
         user_input: str = input("> ").strip()
+        prepared = preparer.finish()
         if user_input.lower() in ['exit', 'quit']:
             print("Goodbye!")
             data_manager.save_user_profile(config.USER_PROFILE_DIR, selected_profile_filename)
@@ -120,20 +366,49 @@ def main() -> None:
         if not user_input:
             continue
 
-        ai_response: str = llm_service.get_gemini_response(
-            user_query=user_input,
-            current_user=data_manager.get_current_user(), 
-            conversation_history=data_manager.get_conversation_history(),
-            full_transcribed_text=data_manager.get_full_transcribed_text(),
-            model_name=config.GEMINI_MODEL_NAME
-        )
-        
-        print(f"Agent-G: {ai_response}")
+        if user_input.lower() == "/stats":
+            print(tracing.format_stats())
+            continue
 
-        data_manager.add_to_conversation_history(role="user", text=user_input)
-        data_manager.add_to_conversation_history(role="model", text=ai_response)
-        
-        data_manager.save_user_profile(config.USER_PROFILE_DIR, selected_profile_filename)
+        if user_input.lower() == "/duplicates":
+            _print_duplicates()
+            continue
+
+        if user_input.lower().startswith("/two-stage"):
+            argument = user_input[len("/two-stage"):].strip().lower()
+            if argument in TWO_STAGE_MODES:
+                two_stage_mode = argument
+            elif argument:
+                print(f"Unknown two-stage mode '{argument}'. Use one of: {', '.join(TWO_STAGE_MODES)}.")
+                continue
+            print(f"Two-stage mode: {two_stage_mode}.")
+            continue
+
+        if user_input.startswith("/"):
+            handled, scope = _handle_scope_command(user_input, scope)
+            if not handled:
+                print(f"Unknown command. {SCOPE_HELP}")
+            continue
+
+        with tracing.span("cli.turn"):
+            ai_response: str = llm_service.get_gemini_response(
+                user_query=user_input,
+                current_user=data_manager.get_current_user(), 
+                conversation_history=data_manager.get_conversation_history(),
+                full_transcribed_text=data_manager.get_full_transcribed_text(),
+                notebook_pages=data_manager.get_prompt_pages(),
+                scope=scope,
+                two_stage=two_stage_mode,
+                model_name=config.GEMINI_MODEL_NAME,
+                prepared=prepared,
+            )
+            
+            print(f"Agent-G: {ai_response}")
+
+            data_manager.add_to_conversation_history(role="user", text=user_input)
+            data_manager.add_to_conversation_history(role="model", text=ai_response)
+
+            data_manager.save_user_profile(config.USER_PROFILE_DIR, selected_profile_filename)
 
 
 if __name__ == "__main__":
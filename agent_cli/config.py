@@ -1,6 +1,7 @@
 import os
-import google.generativeai as genai
+import threading
 from dotenv import load_dotenv
+from types import ModuleType
 from typing import Optional
 
 # --- Directory Setup ---
@@ -24,13 +25,100 @@ load_dotenv(ENV_FILE_PATH)
 API_KEY: Optional[str] = os.getenv("GOOGLE_API_KEY")
 GEMINI_MODEL_NAME = "gemini-2.5-flash"
 
+# Estimated input tokens allowed per request. The model accepts about 1M; the
+# default leaves headroom for estimation error. Lower it to keep turns fast.
+PROMPT_TOKEN_BUDGET = int(os.getenv("AGENT_G_PROMPT_TOKEN_BUDGET", "900000"))
+# Most recent history messages kept until no notebook pages are left to drop.
+PROMPT_MIN_HISTORY_MESSAGES = int(os.getenv("AGENT_G_PROMPT_MIN_HISTORY", "6"))
+
+# Two-stage answers: "off" sends every page, "local" ranks pages locally and
+# sends the best TWO_STAGE_TOP_K, "model" lets SELECTION_MODEL_NAME pick them
+# from the page summaries.
+TWO_STAGE_MODE = os.getenv("AGENT_G_TWO_STAGE", "off").lower()
+TWO_STAGE_TOP_K = int(os.getenv("AGENT_G_TWO_STAGE_TOP_K", "20"))
+SELECTION_MODEL_NAME = os.getenv("AGENT_G_SELECTION_MODEL", "gemini-2.0-flash-lite")
+
+# Ingest-time summaries (utilities/prepare_context.py). With no model set,
+# cheap extractive summaries are written instead of calling the API.
+SUMMARY_MODEL_NAME = os.getenv("AGENT_G_SUMMARY_MODEL", "")
+SUMMARY_WORKERS = int(os.getenv("AGENT_G_SUMMARY_WORKERS", "4"))
+SUMMARY_REQUESTS_PER_MINUTE = float(os.getenv("AGENT_G_SUMMARY_REQUESTS_PER_MINUTE", "60"))
+
+# Near-duplicate pages (see dedup.py): "flag" reports clusters but sends every
+# page, "collapse" sends only one page of each cluster, "off" skips detection.
+DUPLICATE_PAGES_MODE = os.getenv("AGENT_G_DUPLICATE_PAGES", "flag").lower()
+DUPLICATE_THRESHOLD = float(os.getenv("AGENT_G_DUPLICATE_THRESHOLD", "0.85"))
+
+# Shared read-only corpus (see shared_corpus.py): when set, processes map the
+# pages that `python -m agent_cli.shared_corpus` decrypted into this file
+# instead of decrypting them themselves. Empty decrypts in every process.
+SHARED_CORPUS_PATH = os.getenv("AGENT_G_SHARED_CORPUS", "")
+
+# Sharded retrieval service (see retrieval_service.py): worker processes to
+# split the pages between, and where their sockets go (empty: a new private
+# temporary directory). When set, two-stage selection also ranks pages through
+# the service running there (see page_selection.py).
+RETRIEVAL_SHARDS = int(os.getenv("AGENT_G_RETRIEVAL_SHARDS", "4"))
+RETRIEVAL_SOCKET_DIR = os.getenv("AGENT_G_RETRIEVAL_SOCKET_DIR", "")
+
 # --- Behaviour Configuration ---
 CLEAR_HISTORY_ON_STARTUP_STR = os.getenv("AGENT_G_CLEAR_HISTORY", "false").lower()
 CLEAR_HISTORY_ON_STARTUP = CLEAR_HISTORY_ON_STARTUP_STR == "true"
 
+# How often (seconds) the CLI checks for edited notebook pages; 0 disables hot reload.
+NOTEBOOK_WATCH_INTERVAL = float(os.getenv("AGENT_G_NOTEBOOK_WATCH_INTERVAL", "2"))
+
 # Ensure the user_profiles directory exists
 os.makedirs(USER_PROFILE_DIR, exist_ok=True)
 
+# --- Gemini SDK ---
+# The SDK is slow to import (it pulls in grpc and protobuf), so it is only
+# imported on first use. Tools that merely need paths from this module, such as
+# the admin interface, never pay for it.
+_genai_module: Optional[ModuleType] = None
+_genai_lock = threading.Lock()
+
+def get_genai() -> ModuleType:
+    """Imports `google.generativeai` on first use and returns it.
+
+    Safe to call from several threads; the import happens once.
+
+    Returns:
+        ModuleType: The `google.generativeai` module.
+    """
+    global _genai_module
+    if _genai_module is None:
+        with _genai_lock:
+            if _genai_module is None:
+                import google.generativeai as genai
+                _genai_module = genai
+    return _genai_module
+
+def start_sdk_import() -> threading.Thread:
+    """Starts importing the Gemini SDK in a background thread.
+
+    Lets the import overlap with other start-up work such as decrypting the
+    notebooks. A later `get_genai()` call waits for it to finish.
+
+    Returns:
+        threading.Thread: The (daemon) thread performing the import.
+    """
+    def _import() -> None:
+        try:
+            get_genai()
+        except Exception:
+            pass # The error resurfaces when get_genai() is called in the foreground.
+
+    thread = threading.Thread(target=_import, name="gemini-sdk-import", daemon=True)
+    thread.start()
+    return thread
+
+def ensure_api_key() -> None:
+    """Exits with an error message if GOOGLE_API_KEY is not set."""
+    if not API_KEY:
+        print("Error: GOOGLE_API_KEY not found. Please set it in your .env file or environment.")
+        exit(1)
+
 def configure_gemini_api() -> None:
     """Configures the Gemini API with the provided API key.
 
@@ -38,11 +126,9 @@ def configure_gemini_api() -> None:
     to configure the `google.generativeai` library. It prints status messages
     and exits if configuration fails or the key is missing.
     """
-    if not API_KEY:
-        print("Error: GOOGLE_API_KEY not found. Please set it in your .env file or environment.")
-        exit(1)
+    ensure_api_key()
     try:
-        genai.configure(api_key=API_KEY)
+        get_genai().configure(api_key=API_KEY)
         print("Gemini API configured successfully.")
     except Exception as e:
         print(f"Error configuring Gemini API: {e}")
@@ -58,6 +144,14 @@ if __name__ == '__main__':
     print(f"System Prompt File: {SYSTEM_PROMPT_FILE_PATH}")
     print(f".env Path: {ENV_FILE_PATH}")
     print(f"Clear history on startup: {CLEAR_HISTORY_ON_STARTUP}")
+    print(f"Notebook watch interval: {NOTEBOOK_WATCH_INTERVAL}s")
+    print(f"Prompt token budget: {PROMPT_TOKEN_BUDGET}")
+    print(f"Summary model: {SUMMARY_MODEL_NAME or 'none (extractive)'} "
+          f"({SUMMARY_WORKERS} workers, {SUMMARY_REQUESTS_PER_MINUTE:g} requests/min)")
+    print(f"Duplicate pages: {DUPLICATE_PAGES_MODE} (similarity >= {DUPLICATE_THRESHOLD:g})")
+    print(f"Shared corpus: {SHARED_CORPUS_PATH or 'off (each process decrypts)'}")
+    print(f"Retrieval service: {RETRIEVAL_SHARDS} shard(s), sockets in {RETRIEVAL_SOCKET_DIR or 'a temporary directory'}")
+    print(f"Two-stage mode: {TWO_STAGE_MODE} (top {TWO_STAGE_TOP_K}, selection model {SELECTION_MODEL_NAME})")
     if API_KEY:
         print("API Key loaded.")
     else:
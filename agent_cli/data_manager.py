@@ -4,13 +4,17 @@ Acts as a facade for more specific data handlers.
 import os
 import json
 import re
-from typing import Tuple, List, Dict, Any, Optional
+from typing import Tuple, List, Dict, Any, Optional, Sequence
 
+from . import dedup
 # Import from the new handler modules
 from .handlers import system_prompt_handler
 from .handlers import user_profile_handler
 from .handlers import notebook_handler
 
+# Re-exported so callers can build scopes without importing the handler.
+PageScope = notebook_handler.PageScope
+
 # --- System Prompt Loader ---
 def load_and_decrypt_system_prompt(filepath: str) -> bool:
     """Loads and decrypts the system prompt using the system_prompt_handler.
@@ -47,12 +51,13 @@ def list_available_profiles(profile_dir: str) -> List[str]:
     return user_profile_handler.list_available_profiles(profile_dir)
 
 # --- State Accessors and Mutators ---
-def get_notebook_data() -> List[Dict[str, Any]]:
+def get_notebook_data() -> notebook_handler.PageStore:
     """
     Retrieves the current notebook data from the notebook_handler.
 
     Returns:
-        List[Dict[str, Any]]: A list of dictionaries, where each dictionary represents a notebook entry.
+        notebook_handler.PageStore: A sequence of dict-like page records (notebook_id,
+            page_number, filename, content).
     """
     return notebook_handler.get_notebook_data()
 
@@ -94,6 +99,110 @@ def get_full_transcribed_text() -> str:
     """
     return notebook_handler.get_full_transcribed_text()
 
+def get_prompt_pages(scope: Optional[notebook_handler.PageScope] = None) -> Sequence[Tuple[str, str]]:
+    """
+    Returns notebook pages formatted for the prompt, using the notebook_handler.
+
+    Args:
+        scope (Optional[notebook_handler.PageScope]): Restricts the pages to one notebook
+            and/or page range. None returns every page.
+
+    Returns:
+        Sequence[Tuple[str, str]]: (filename, formatted page) pairs, which lets the prompt
+            builder drop individual pages when the prompt is over budget.
+    """
+    return notebook_handler.get_prompt_pages(scope)
+
+def resolve_notebook_id(name: str) -> Optional[str]:
+    """
+    Matches a user-typed notebook name to a loaded notebook id via the notebook_handler.
+
+    Args:
+        name (str): The name typed by the user.
+
+    Returns:
+        Optional[str]: The notebook id, or None if there is no unique match.
+    """
+    return notebook_handler.resolve_notebook_id(name)
+
+def parse_page_range(text: str) -> Optional[Tuple[int, Optional[int]]]:
+    """
+    Parses a page range such as "10-40", "12" or "10-" via the notebook_handler.
+
+    Args:
+        text (str): The range as typed.
+
+    Returns:
+        Optional[Tuple[int, Optional[int]]]: (first, last), or None if the text is not a page range.
+    """
+    return notebook_handler.parse_page_range(text)
+
+def get_page_summary(filename: str) -> Optional[str]:
+    """
+    Returns the stored summary of a notebook page via the notebook_handler.
+
+    Args:
+        filename (str): The page filename.
+
+    Returns:
+        Optional[str]: The summary, or None if the page has none.
+    """
+    return notebook_handler.get_page_summary(filename)
+
+def get_notebook_summary(notebook_id: str) -> Optional[str]:
+    """
+    Returns the stored summary of a notebook via the notebook_handler.
+
+    Args:
+        notebook_id (str): The notebook id.
+
+    Returns:
+        Optional[str]: The summary, or None if the notebook has none.
+    """
+    return notebook_handler.get_notebook_summary(notebook_id)
+
+def get_prompt_summary(filename: str) -> Optional[str]:
+    """
+    Returns a page's summary formatted for the prompt via the notebook_handler.
+
+    Args:
+        filename (str): The page filename.
+
+    Returns:
+        Optional[str]: The formatted summary, or None if the page has none.
+    """
+    return notebook_handler.get_prompt_summary(filename)
+
+def get_notebook_overview(notebook_ids: Optional[List[str]] = None) -> str:
+    """
+    Returns the notebook summaries formatted for the prompt via the notebook_handler.
+
+    Args:
+        notebook_ids (Optional[List[str]]): Notebooks to include; all if None.
+
+    Returns:
+        str: The formatted summaries, or "" if there are none.
+    """
+    return notebook_handler.get_notebook_overview(notebook_ids)
+
+def get_duplicate_report() -> Optional[dedup.DuplicateReport]:
+    """
+    Returns the near-duplicate clusters among the loaded pages via the notebook_handler.
+
+    Returns:
+        Optional[dedup.DuplicateReport]: The report, or None if detection is off.
+    """
+    return notebook_handler.get_duplicate_report()
+
+def list_notebooks() -> List[Tuple[str, int]]:
+    """
+    Lists loaded notebooks and their page counts via the notebook_handler.
+
+    Returns:
+        List[Tuple[str, int]]: (notebook_id, page count) pairs.
+    """
+    return notebook_handler.list_notebooks()
+
 # --- File Operations ---
 
 def load_transcriptions(transcription_dir: str) -> bool:
@@ -108,6 +217,15 @@ def load_transcriptions(transcription_dir: str) -> bool:
     """
     return notebook_handler.load_transcriptions(transcription_dir)
 
+def start_notebook_watcher(interval: float) -> None:
+    """
+    Starts hot-reloading notebook pages that change on disk, via the notebook_handler.
+
+    Args:
+        interval (float): Seconds between checks for changed pages. Values <= 0 disable it.
+    """
+    notebook_handler.start_change_watcher(interval)
+
 def load_user_profile(profile_dir: str, profile_filename: str) -> bool:
     """
     Loads a user profile and initialises conversation history using the user_profile_handler.
@@ -122,6 +240,19 @@ def load_user_profile(profile_dir: str, profile_filename: str) -> bool:
     """
     return user_profile_handler.load_user_profile(profile_dir, profile_filename)
 
+def read_user_profile(profile_dir: str, profile_filename: str) -> Dict[str, Any]:
+    """
+    Reads a user profile without making it current, using the user_profile_handler.
+
+    Args:
+        profile_dir (str): The directory where the profile file is located.
+        profile_filename (str): The name of the profile file.
+
+    Returns:
+        Dict[str, Any]: The profile, including its conversation history.
+    """
+    return user_profile_handler.read_user_profile(profile_dir, profile_filename)
+
 
 def save_user_profile(profile_dir: str, profile_filename: str) -> None:
     """
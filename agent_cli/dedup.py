@@ -0,0 +1,344 @@
+'''Near-duplicate notebook page detection with MinHash and LSH.
+
+The same page photographed twice, or transcribed again under a new name,
+produces two pages whose text is almost, but not exactly, the same. Each page
+is reduced to a MinHash signature over its word 3-grams; locality-sensitive
+hashing (LSH) groups signatures into buckets by bands, so only pages sharing
+a bucket are compared. The work is linear in the number of pages, apart from
+the comparisons between candidates, and each bucket is compared against its
+first member only.
+
+Signatures use one-permutation hashing: every shingle is hashed once, its
+hash picks one of NUM_BINS bins and the bin keeps the smallest value seen.
+Empty bins are filled from the next non-empty bin (rotation densification),
+so short pages still get a complete signature. This keeps the pure-Python
+cost at one operation per shingle instead of one per shingle and permutation.
+
+Pages with fewer than MIN_SHINGLES shingles (blank or nearly blank pages) are
+never reported, since they are alike without being copies of each other.
+Signatures are cached per page and only recomputed when its text changes.
+
+utilities/prepare_context.py writes the clusters to an encrypted report
+(REPORT_FILENAME) next to the pages, and the signatures it computed to
+SIGNATURES_FILENAME. The CLI reads those signatures back when it loads the
+pages and detects the clusters again from them, so only pages added or edited
+since are hashed and those edits are still taken into account. When no page
+changed at all, the stored report is used as it is.
+'''
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import zlib
+from array import array
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from . import encryption_service
+from .file_io import atomic_write
+
+MODE_OFF = "off"
+MODE_FLAG = "flag"
+MODE_COLLAPSE = "collapse"
+MODES = (MODE_OFF, MODE_FLAG, MODE_COLLAPSE)
+
+NUM_BINS = 128
+BANDS = 16
+ROWS_PER_BAND = NUM_BINS // BANDS
+SHINGLE_WORDS = 3
+MIN_SHINGLES = 8
+# Estimated Jaccard similarity at or above which two pages count as duplicates.
+DEFAULT_THRESHOLD = 0.85
+REPORT_FILENAME = "duplicate_pages.json.enc"
+SIGNATURES_FILENAME = "duplicate_signatures.bin.enc"
+
+_BIN_BITS = NUM_BINS.bit_length() - 1
+_BIN_MASK = NUM_BINS - 1
+_EMPTY = 1 << 32
+_WORD_RE = re.compile(r"\w+")
+
+# filename -> (text_key of page text, signature or None for pages too short to compare)
+_signature_cache: Dict[str, Tuple[int, Optional[Tuple[int, ...]]]] = {}
+_cache_changed = False
+_loaded_directories: Set[str] = set()
+
+
+def signature(text: str) -> Optional[Tuple[int, ...]]:
+    """Computes the MinHash signature of a page's text.
+
+    Args:
+        text (str): The page text.
+
+    Returns:
+        Optional[Tuple[int, ...]]: NUM_BINS values, or None if the page has fewer
+            than MIN_SHINGLES shingles.
+    """
+    words = _WORD_RE.findall(text.lower())
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    bins = [_EMPTY] * NUM_BINS
+    for shingle in shingles:
+        value = zlib.crc32(shingle.encode('utf-8'))
+        index = value & _BIN_MASK
+        value >>= _BIN_BITS
+        if value < bins[index]:
+            bins[index] = value
+    for index in range(NUM_BINS):
+        if bins[index] == _EMPTY:
+            # Borrow from the next originally non-empty bin, offset by the distance so
+            # a borrowed value never equals a real one.
+            step = 1
+            while bins[(index + step) % NUM_BINS] >= _EMPTY:
+                step += 1
+            bins[index] = bins[(index + step) % NUM_BINS] + step * _EMPTY
+    return tuple(bins)
+
+
+def text_key(text: str) -> int:
+    """Returns a checksum of a page's text that is the same in every process."""
+    encoded = text.encode('utf-8')
+    return len(encoded) << 32 | zlib.crc32(encoded)
+
+
+def pages_key(keys: Iterable[Tuple[str, int]]) -> str:
+    """Returns a digest of a set of pages from their (filename, text_key) pairs."""
+    digest = hashlib.sha256()
+    for filename, key in sorted(keys):
+        digest.update(f"{filename}\0{key}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _cached_signature(filename: str, key: int, text: str) -> Optional[Tuple[int, ...]]:
+    global _cache_changed
+    entry = _signature_cache.get(filename)
+    if entry is None or entry[0] != key:
+        entry = (key, signature(text))
+        _signature_cache[filename] = entry
+        _cache_changed = True
+    return entry[1]
+
+
+def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    """Estimates the Jaccard similarity of two pages from their signatures."""
+    return sum(1 for a, b in zip(first, second) if a == b) / NUM_BINS
+
+
+class DuplicateCluster(NamedTuple):
+    """A page kept as the original and the pages that duplicate it."""
+    keep: str
+    duplicates: List[Tuple[str, float]]
+
+    def to_dict(self) -> Dict[str, object]:
+        """Returns the cluster as a JSON-serialisable dict."""
+        return {"keep": self.keep,
+                "duplicates": [{"file": name, "similarity": round(score, 3)} for name, score in self.duplicates]}
+
+
+class DuplicateReport(NamedTuple):
+    """All near-duplicate clusters found among a set of pages."""
+    clusters: List[DuplicateCluster]
+    pages_scanned: int
+    threshold: float
+    elapsed_ms: float
+    # pages_key() of the pages scanned, to tell whether a stored report is still current.
+    pages_key: str = ""
+
+    def duplicate_of(self) -> Dict[str, str]:
+        """Returns a map from each duplicate page to the page kept in its place."""
+        return {name: cluster.keep for cluster in self.clusters for name, _ in cluster.duplicates}
+
+    def duplicate_count(self) -> int:
+        """Returns the number of pages that duplicate another page."""
+        return sum(len(cluster.duplicates) for cluster in self.clusters)
+
+    def describe(self) -> str:
+        """Returns a one-line summary."""
+        timing = f"{self.elapsed_ms:.0f} ms" if self.elapsed_ms else "stored report"
+        return (f"Near-duplicate pages: {self.duplicate_count()} duplicate(s) in {len(self.clusters)} cluster(s) "
+                f"among {self.pages_scanned} page(s) (similarity >= {self.threshold:.2f}, {timing}).")
+
+    def to_dict(self) -> Dict[str, object]:
+        """Returns the report as a JSON-serialisable dict. It holds filenames only, never page text."""
+        return {"pages_scanned": self.pages_scanned, "threshold": self.threshold, "pages_key": self.pages_key,
+                "duplicate_pages": self.duplicate_count(), "clusters": [c.to_dict() for c in self.clusters]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, object]) -> "DuplicateReport":
+        """Rebuilds a report from `to_dict()` output. The detection time is not kept, so it reads 0."""
+        clusters = [DuplicateCluster(cluster["keep"], [(entry["file"], entry["similarity"]) for entry in cluster["duplicates"]])
+                    for cluster in data["clusters"]]
+        return cls(clusters, data["pages_scanned"], data["threshold"], 0.0, data.get("pages_key", ""))
+
+
+def find_duplicates(pages: Iterable[Tuple[str, str]], threshold: float = DEFAULT_THRESHOLD) -> DuplicateReport:
+    """Finds clusters of near-duplicate pages.
+
+    Within a cluster the page with the smallest filename (the earliest
+    notebook and page number) is kept; every other member is estimated to be
+    at least `threshold` similar to that page. Pages that only resemble
+    another duplicate form a cluster of their own, or none.
+
+    Args:
+        pages (Iterable[Tuple[str, str]]): (filename, page text) pairs.
+        threshold (float): Minimum estimated Jaccard similarity of word 3-grams.
+
+    Returns:
+        DuplicateReport: The clusters, largest first.
+    """
+    start = time.perf_counter()
+    names: List[str] = []
+    signatures: List[Tuple[int, ...]] = []
+    keys: List[Tuple[str, int]] = []
+    for filename, text in pages:
+        key = text_key(text)
+        keys.append((filename, key))
+        page_signature = _cached_signature(filename, key, text)
+        if page_signature is not None:
+            names.append(filename)
+            signatures.append(page_signature)
+
+    # LSH only proposes candidates: pages connected through candidate pairs
+    # above the threshold are grouped here and split into clusters below.
+    parent = list(range(len(names)))
+
+    def find(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    matched: Set[int] = set()
+    for band in range(BANDS):
+        low = band * ROWS_PER_BAND
+        high = low + ROWS_PER_BAND
+        buckets: Dict[Tuple[int, ...], int] = {}
+        for index, page_signature in enumerate(signatures):
+            key = page_signature[low:high]
+            first = buckets.setdefault(key, index)
+            if first == index:
+                continue
+            if similarity(signatures[first], page_signature) >= threshold:
+                root_a, root_b = find(first), find(index)
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+                matched.update((first, index))
+
+    groups: Dict[int, List[int]] = {}
+    for index in matched:
+        groups.setdefault(find(index), []).append(index)
+    clusters = []
+    for members in groups.values():
+        # A page joins a cluster only if it is similar enough to the page kept,
+        # not merely to some other member: A ~ B and B ~ C does not make C a copy of A.
+        remaining = sorted(members, key=lambda index: names[index])
+        while len(remaining) >= 2:
+            keep = remaining[0]
+            duplicates: List[Tuple[str, float]] = []
+            rest: List[int] = []
+            for index in remaining[1:]:
+                score = similarity(signatures[keep], signatures[index])
+                if score >= threshold:
+                    duplicates.append((names[index], score))
+                else:
+                    rest.append(index)
+            if duplicates:
+                clusters.append(DuplicateCluster(keep=names[keep], duplicates=duplicates))
+            remaining = rest
+    clusters.sort(key=lambda cluster: (-len(cluster.duplicates), cluster.keep))
+    return DuplicateReport(clusters, len(keys), threshold, (time.perf_counter() - start) * 1000, pages_key(keys))
+
+
+def forget(filenames: Iterable[str]) -> None:
+    """Drops cached signatures, e.g. for pages that were deleted."""
+    for filename in filenames:
+        _signature_cache.pop(filename, None)
+
+
+def read_report(directory: str) -> Optional[DuplicateReport]:
+    """Reads the report written by `write_report()`, or returns None if it is missing or unreadable."""
+    try:
+        return DuplicateReport.from_dict(json.loads(
+            encryption_service.decrypt_file(os.path.join(directory, REPORT_FILENAME)).decode('utf-8')))
+    except Exception: # Missing, corrupt or encrypted with an unknown key.
+        return None
+
+
+def load_signatures(directory: str) -> int:
+    """Adds the signatures saved in `directory` by `save_signatures()` to the cache.
+
+    Each saved signature is only used for a page whose text still has the
+    saved text_key, so pages edited since are hashed again. A missing or
+    unreadable file leaves the cache as it is. A directory is only read the
+    first time; later calls return 0.
+
+    Returns:
+        int: The number of signatures added.
+    """
+    if directory in _loaded_directories:
+        return 0
+    _loaded_directories.add(directory)
+    try:
+        data = encryption_service.decrypt_file(os.path.join(directory, SIGNATURES_FILENAME))
+        header_end = data.index(b"\n")
+        header = json.loads(data[:header_end])
+        values = array('Q')
+        values.frombytes(data[header_end + 1:])
+    except Exception: # Missing, corrupt or encrypted with an unknown key.
+        return 0
+    if header.get("num_bins") != NUM_BINS:
+        return 0
+    if header.get("byteorder") != sys.byteorder:
+        values.byteswap()
+    added = 0
+    offset = 0
+    for filename, key, has_signature in header["pages"]:
+        page_signature = None
+        if has_signature:
+            page_signature = tuple(values[offset:offset + NUM_BINS])
+            offset += NUM_BINS
+        if filename not in _signature_cache:
+            _signature_cache[filename] = (key, page_signature)
+            added += 1
+    return added
+
+
+def save_signatures(directory: str, filenames: Iterable[str]) -> Optional[str]:
+    """Encrypts the cached signatures of `filenames` to SIGNATURES_FILENAME in `directory`.
+
+    Nothing is written if no signature was computed since the cache was last
+    saved or loaded.
+
+    Returns:
+        Optional[str]: The path written, or None if nothing changed.
+    """
+    global _cache_changed
+    if not _cache_changed:
+        return None
+    pages: List[Tuple[str, int, bool]] = []
+    values = array('Q')
+    for filename in sorted(filenames):
+        entry = _signature_cache.get(filename)
+        if entry is None:
+            continue
+        pages.append((filename, entry[0], entry[1] is not None))
+        if entry[1] is not None:
+            values.extend(entry[1])
+    header = json.dumps({"num_bins": NUM_BINS, "byteorder": sys.byteorder, "pages": pages}).encode('utf-8')
+    path = os.path.join(directory, SIGNATURES_FILENAME)
+    atomic_write(path, encryption_service.encrypt_data(header + b"\n" + values.tobytes()))
+    _cache_changed = False
+    return path
+
+
+def write_report(directory: str, report: DuplicateReport) -> str:
+    """Encrypts and writes the report to REPORT_FILENAME in `directory`.
+
+    Returns:
+        str: The path written.
+    """
+    path = os.path.join(directory, REPORT_FILENAME)
+    atomic_write(path, encryption_service.encrypt_data(json.dumps(report.to_dict(), indent=2).encode('utf-8')))
+    return path
+
@@ -1,6 +1,16 @@
 import os
-from cryptography.fernet import Fernet
-from typing import Optional
+import struct
+import hashlib
+import threading
+import zlib
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, List, Optional, Union
+from . import file_io
+
+if TYPE_CHECKING:
+    from cryptography.fernet import Fernet, MultiFernet
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+BytesLike = Union[bytes, bytearray, memoryview]
 
 # Load encryption key from environment variable
 ENCRYPTION_KEY: Optional[str] = os.getenv("ENCRYPTION_KEY")
@@ -8,31 +18,607 @@ ENCRYPTION_KEY: Optional[str] = os.getenv("ENCRYPTION_KEY")
 if not ENCRYPTION_KEY:
     raise ValueError("ENCRYPTION_KEY not found in environment variables. Please set it.")
 
-# Initialise Fernet cipher
-try:
-    cipher = Fernet(ENCRYPTION_KEY.encode())
-except ValueError as e:
-    raise ValueError(f"Invalid ENCRYPTION_KEY: {e}. Ensure it is a valid Fernet key.")
+# Retired keys that are still accepted for decryption, comma separated, newest
+# first. New data is always encrypted with ENCRYPTION_KEY; see
+# utilities/rotate_keys.py for re-encrypting existing files.
+PREVIOUS_ENCRYPTION_KEYS: List[str] = [
+    key.strip() for key in os.getenv("ENCRYPTION_KEYS_PREVIOUS", "").split(",") if key.strip()
+]
+
+# Cipher mode used for new writes: "fernet" (default, compatible with older
+# installs) or "aesgcm" (raw binary, chunked, no base64 inflation).
+# Reading always detects the format, so both modes can coexist on disk.
+CIPHER_MODE_FERNET = "fernet"
+CIPHER_MODE_AESGCM = "aesgcm"
+CIPHER_MODE: str = os.getenv("AGENT_G_CIPHER_MODE", CIPHER_MODE_FERNET).lower()
+if CIPHER_MODE not in (CIPHER_MODE_FERNET, CIPHER_MODE_AESGCM):
+    raise ValueError(f"Invalid AGENT_G_CIPHER_MODE '{CIPHER_MODE}'. Expected 'fernet' or 'aesgcm'.")
+
+# --- Raw AES-GCM format ---
+# Header (22 bytes, big-endian):
+#   magic (4) | version (1) | flags (1) | chunk size (4) | key id (4) | nonce prefix (8)
+# followed by one or more chunks, each `chunk size` plaintext bytes (the last
+# may be shorter, possibly empty) plus a 16-byte GCM tag. Each chunk's nonce is
+# the nonce prefix followed by a 32-bit chunk counter, and the header plus a
+# final-chunk marker are bound in as associated data, so chunks cannot be
+# reordered, dropped, or truncated without detection.
+RAW_MAGIC = b"\x00AGG"
+RAW_FORMAT_VERSION = 1
+DEFAULT_CHUNK_SIZE = 64 * 1024
+_HEADER_STRUCT = struct.Struct(">4sBBI4s8s")
+HEADER_SIZE = _HEADER_STRUCT.size
+_TAG_SIZE = 16
+_MAX_CHUNKS = 2 ** 32
+_FINAL_CHUNK = b"\x01"
+_NON_FINAL_CHUNK = b"\x00"
+
+# --- Compression envelope ---
+# Plaintext can be compressed before it is encrypted (in either cipher mode).
+# Compressed plaintext is wrapped in a small versioned envelope (big-endian):
+#   magic (4) | version (1) | codec (1) | original size (8)
+# followed by the compressed bytes. Profiles, pages and prompts are UTF-8 text,
+# which never starts with a NUL byte, so plaintext without the magic is read
+# as-is and existing files keep working. AGENT_G_COMPRESSION selects the codec
+# for new writes: "off" (default, readable by older installs), "zlib", "zstd"
+# (needs the optional `zstandard` package) or "auto" (zstd if installed,
+# otherwise zlib). Reading handles any codec, whatever the setting.
+COMPRESSION_OFF = "off"
+COMPRESSION_ZLIB = "zlib"
+COMPRESSION_ZSTD = "zstd"
+COMPRESSION_AUTO = "auto"
+COMPRESSION_MAGIC = b"\x00AGZ"
+COMPRESSION_FORMAT_VERSION = 1
+_COMPRESSION_STRUCT = struct.Struct(">4sBBQ")
+_CODEC_IDS = {COMPRESSION_ZLIB: 1, COMPRESSION_ZSTD: 2}
+_CODEC_NAMES = {codec_id: name for name, codec_id in _CODEC_IDS.items()}
+# Payloads smaller than this are stored uncompressed; the envelope would not pay for itself.
+MIN_COMPRESS_BYTES = 256
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def _load_zstd() -> Optional[Any]:
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+COMPRESSION: str = os.getenv("AGENT_G_COMPRESSION", COMPRESSION_OFF).lower()
+if COMPRESSION not in (COMPRESSION_OFF, COMPRESSION_ZLIB, COMPRESSION_ZSTD, COMPRESSION_AUTO):
+    raise ValueError(f"Invalid AGENT_G_COMPRESSION '{COMPRESSION}'. Expected 'off', 'zlib', 'zstd' or 'auto'.")
+_zstd: Optional[Any] = _load_zstd() if COMPRESSION in (COMPRESSION_ZSTD, COMPRESSION_AUTO) else None
+if COMPRESSION == COMPRESSION_ZSTD and _zstd is None:
+    raise ValueError("AGENT_G_COMPRESSION is 'zstd' but the 'zstandard' package is not installed.")
+if COMPRESSION == COMPRESSION_AUTO:
+    COMPRESSION = COMPRESSION_ZSTD if _zstd is not None else COMPRESSION_ZLIB
+
+
+def _derive_aes_key(fernet_key: str) -> bytes:
+    """Derives a 256-bit AES-GCM key from the configured Fernet key.
+
+    Args:
+        fernet_key (str): The urlsafe base64 encoded Fernet key.
+
+    Returns:
+        bytes: A 32-byte key dedicated to the raw AES-GCM format.
+    """
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+    hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b"agent-g raw aes-gcm v1")
+    return hkdf.derive(fernet_key.encode())
+
+
+def _build_fernet(key: str, label: str) -> "Fernet":
+    from cryptography.fernet import Fernet
+    try:
+        return Fernet(key.encode())
+    except ValueError as e:
+        raise ValueError(f"Invalid {label}: {e}. Ensure it is a valid Fernet key.")
+
+
+def key_fingerprint(key: str) -> str:
+    """Returns a short, non-secret identifier for a key.
+
+    The same identifier is stored in raw-format headers, so it can be used to
+    tell which key a file was written with.
+
+    Args:
+        key (str): The urlsafe base64 encoded Fernet key.
+
+    Returns:
+        str: An 8-character hex fingerprint.
+    """
+    return hashlib.sha256(_derive_aes_key(key)).digest()[:4].hex()
+
+
+class _Keyring:
+    """The primary key first, then retired keys.
+
+    Fernet decryption tries each key in turn (MultiFernet); raw-format files
+    name their key in the header, so the right key is looked up directly.
+    """
+
+    def __init__(self, primary_key: str, previous_keys: List[str]) -> None:
+        from cryptography.fernet import MultiFernet
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        fernet_keys = [_build_fernet(primary_key, "ENCRYPTION_KEY")] + [
+            _build_fernet(key, "key in ENCRYPTION_KEYS_PREVIOUS") for key in previous_keys
+        ]
+        self.cipher: "MultiFernet" = MultiFernet(fernet_keys)
+        self.primary_fernet: "Fernet" = fernet_keys[0]
+        self.key_id: bytes = bytes.fromhex(key_fingerprint(primary_key))
+        self.aesgcm: "AESGCM" = AESGCM(_derive_aes_key(primary_key))
+        self.raw_keys: Dict[bytes, "AESGCM"] = {}
+        for key in reversed([primary_key] + previous_keys):
+            self.raw_keys[bytes.fromhex(key_fingerprint(key))] = AESGCM(_derive_aes_key(key))
+
+
+# The keyring (and the cryptography package behind it) is only built on first
+# use, which keeps importing this module cheap for tools that never decrypt.
+_keyring: Optional[_Keyring] = None
+_keyring_lock = threading.Lock()
+
+
+def load_keyring() -> None:
+    """Builds the keyring if it has not been built yet.
+
+    Call this early to surface an invalid key before any work is done.
+
+    Raises:
+        ValueError: If ENCRYPTION_KEY or a key in ENCRYPTION_KEYS_PREVIOUS is invalid.
+    """
+    _get_keyring()
+
+
+def _get_keyring() -> _Keyring:
+    global _keyring
+    keyring = _keyring
+    if keyring is None:
+        with _keyring_lock:
+            if _keyring is None:
+                _keyring = _Keyring(ENCRYPTION_KEY, PREVIOUS_ENCRYPTION_KEYS)
+            keyring = _keyring
+    return keyring
+
+
+def get_cipher() -> "MultiFernet":
+    """Returns the Fernet cipher for the keyring.
+
+    Returns:
+        MultiFernet: Encrypts with the primary key and decrypts with any known key.
+    """
+    return _get_keyring().cipher
+
+
+def primary_key_fingerprint() -> str:
+    """Returns the fingerprint of the primary key.
+
+    Returns:
+        str: An 8-character hex fingerprint, as produced by `key_fingerprint`.
+    """
+    return _get_keyring().key_id.hex()
+
+
+def __getattr__(name: str) -> Any:
+    # Keeps `encryption_service.cipher` working now that the cipher is built lazily.
+    if name == "cipher":
+        return get_cipher()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class DecryptionError(ValueError):
+    """Raised when raw-format ciphertext is malformed or fails authentication."""
+
+
+def is_raw_format(encrypted_data: BytesLike) -> bool:
+    """Checks whether the given ciphertext uses the raw AES-GCM format.
+
+    Args:
+        encrypted_data (BytesLike): The ciphertext, or at least its first bytes.
+
+    Returns:
+        bool: True if the data starts with the raw format magic, False otherwise (e.g. Fernet tokens).
+    """
+    return bytes(memoryview(encrypted_data)[:len(RAW_MAGIC)]) == RAW_MAGIC
+
+
+def _chunk_nonce(nonce_prefix: bytes, index: int) -> bytes:
+    if index >= _MAX_CHUNKS:
+        raise ValueError("Too many chunks for a single raw-format payload.")
+    return nonce_prefix + index.to_bytes(4, "big")
+
+
+def _new_header(chunk_size: int) -> bytes:
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive.")
+    return _HEADER_STRUCT.pack(RAW_MAGIC, RAW_FORMAT_VERSION, 0, chunk_size, _get_keyring().key_id, os.urandom(8))
+
+
+def _parse_header(header: BytesLike) -> tuple:
+    if len(header) < HEADER_SIZE:
+        raise DecryptionError("Ciphertext is too short to contain a raw-format header.")
+    magic, version, flags, chunk_size, key_id, nonce_prefix = _HEADER_STRUCT.unpack(bytes(header[:HEADER_SIZE]))
+    if magic != RAW_MAGIC:
+        raise DecryptionError("Ciphertext does not start with the raw-format magic.")
+    if version != RAW_FORMAT_VERSION:
+        raise DecryptionError(f"Unsupported raw-format version: {version}.")
+    if chunk_size <= 0:
+        raise DecryptionError("Invalid chunk size in raw-format header.")
+    aead = _get_keyring().raw_keys.get(key_id)
+    if aead is None:
+        raise DecryptionError(f"Ciphertext was encrypted with an unknown key ({key_id.hex()}).")
+    return flags, chunk_size, nonce_prefix, aead
+
+
+def _encrypt_chunk(header: bytes, index: int, chunk: BytesLike, final: bool) -> bytes:
+    nonce = _chunk_nonce(header[-8:], index)
+    aad = header + (_FINAL_CHUNK if final else _NON_FINAL_CHUNK)
+    return _get_keyring().aesgcm.encrypt(nonce, chunk, aad)
+
+
+def _decrypt_chunk(aead: "AESGCM", header: bytes, nonce_prefix: bytes, index: int, chunk: BytesLike, final: bool) -> bytes:
+    nonce = _chunk_nonce(nonce_prefix, index)
+    aad = header + (_FINAL_CHUNK if final else _NON_FINAL_CHUNK)
+    try:
+        return aead.decrypt(nonce, chunk, aad)
+    except Exception as e:
+        raise DecryptionError(f"Raw-format chunk {index} failed authentication.") from e
+
+
+def _decrypt_chunk_into(aead: "AESGCM", header: bytes, nonce_prefix: bytes, index: int, chunk: BytesLike,
+                        final: bool, out: memoryview) -> None:
+    """Decrypts a chunk straight into `out`, which must be exactly its plaintext size."""
+    if not hasattr(aead, "decrypt_into"): # cryptography < 44
+        out[:] = _decrypt_chunk(aead, header, nonce_prefix, index, chunk, final)
+        return
+    nonce = _chunk_nonce(nonce_prefix, index)
+    aad = header + (_FINAL_CHUNK if final else _NON_FINAL_CHUNK)
+    try:
+        aead.decrypt_into(nonce, chunk, aad, out)
+    except Exception as e:
+        raise DecryptionError(f"Raw-format chunk {index} failed authentication.") from e
+
+
+def encrypt_raw(data: BytesLike, chunk_size: int = DEFAULT_CHUNK_SIZE) -> bytes:
+    """Encrypts data into the raw AES-GCM format.
+
+    Args:
+        data (BytesLike): The plaintext. memoryview inputs are sliced without copying.
+        chunk_size (int): Plaintext bytes per authenticated chunk.
+
+    Returns:
+        bytes: The header followed by the encrypted chunks.
+    """
+    header = _new_header(chunk_size)
+    view = memoryview(data)
+    total = len(view)
+    out = bytearray(header)
+    index = 0
+    offset = 0
+    while True:
+        end = offset + chunk_size
+        final = end >= total
+        out += _encrypt_chunk(header, index, view[offset:end], final)
+        if final:
+            break
+        offset = end
+        index += 1
+    return bytes(out)
+
+
+def decrypt_raw(encrypted_data: BytesLike) -> bytearray:
+    """Decrypts data produced by `encrypt_raw` or `encrypt_stream`.
+
+    The plaintext size follows from the header's chunk size and the
+    ciphertext length, so the output buffer is allocated once and each chunk
+    is decrypted straight into its place in it.
+
+    Args:
+        encrypted_data (BytesLike): The complete raw-format ciphertext.
+
+    Returns:
+        bytearray: The decrypted data.
+
+    Raises:
+        DecryptionError: If the header is invalid or any chunk fails authentication.
+    """
+    view = memoryview(encrypted_data)
+    header = bytes(view[:HEADER_SIZE])
+    _, chunk_size, nonce_prefix, aead = _parse_header(header)
+    sealed_size = chunk_size + _TAG_SIZE
+    total = len(view)
+    if total == HEADER_SIZE:
+        raise DecryptionError("Raw-format ciphertext has no chunks.")
+    chunks = -(-(total - HEADER_SIZE) // sealed_size)
+    size = total - HEADER_SIZE - chunks * _TAG_SIZE
+    if size < 0:
+        raise DecryptionError("Raw-format ciphertext is truncated.")
+    out = bytearray(size)
+    out_view = memoryview(out)
+    offset = HEADER_SIZE
+    for index in range(chunks):
+        end = offset + sealed_size
+        start = index * chunk_size
+        _decrypt_chunk_into(aead, header, nonce_prefix, index, view[offset:end], index == chunks - 1,
+                            out_view[start:start + min(chunk_size, size - start)])
+        offset = end
+    out_view.release()
+    return out
+
+
+def encrypt_stream(src: BinaryIO, dst: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """Encrypts a file object into the raw AES-GCM format chunk by chunk.
+
+    Only one chunk of plaintext is held in memory at a time.
+
+    Args:
+        src (BinaryIO): Readable binary file object with the plaintext.
+        dst (BinaryIO): Writable binary file object for the ciphertext.
+        chunk_size (int): Plaintext bytes per authenticated chunk.
+
+    Returns:
+        int: The number of plaintext bytes encrypted.
+    """
+    header = _new_header(chunk_size)
+    dst.write(header)
+    index = 0
+    total = 0
+    chunk = src.read(chunk_size)
+    while True:
+        # Read one chunk ahead so the last chunk can be marked as final.
+        next_chunk = src.read(chunk_size) if len(chunk) == chunk_size else b""
+        final = not next_chunk
+        dst.write(_encrypt_chunk(header, index, chunk, final))
+        total += len(chunk)
+        if final:
+            return total
+        chunk = next_chunk
+        index += 1
+
+
+def decrypt_stream(src: BinaryIO, dst: BinaryIO) -> int:
+    """Decrypts a raw-format file object chunk by chunk.
+
+    Plaintext is written to `dst` only after each chunk has been authenticated.
+    A truncated stream is detected because its last chunk is not marked as final.
+
+    Args:
+        src (BinaryIO): Readable binary file object with the ciphertext.
+        dst (BinaryIO): Writable binary file object for the plaintext.
+
+    Returns:
+        int: The number of plaintext bytes written.
+
+    Raises:
+        DecryptionError: If the header is invalid or any chunk fails authentication.
+    """
+    header = src.read(HEADER_SIZE)
+    _, chunk_size, nonce_prefix, aead = _parse_header(header)
+    sealed_size = chunk_size + _TAG_SIZE
+    chunk = src.read(sealed_size)
+    if not chunk:
+        raise DecryptionError("Raw-format ciphertext has no chunks.")
+    index = 0
+    total = 0
+    while chunk:
+        next_chunk = src.read(sealed_size) if len(chunk) == sealed_size else b""
+        plaintext = _decrypt_chunk(aead, header, nonce_prefix, index, chunk, final=not next_chunk)
+        dst.write(plaintext)
+        total += len(plaintext)
+        chunk = next_chunk
+        index += 1
+    return total
+
+
+def is_compressed(plaintext: BytesLike) -> bool:
+    """Checks whether decrypted data is a compression envelope.
+
+    Args:
+        plaintext (BytesLike): Decrypted data, or at least its first bytes.
+
+    Returns:
+        bool: True if the data starts with the compression envelope magic.
+    """
+    return bytes(memoryview(plaintext)[:len(COMPRESSION_MAGIC)]) == COMPRESSION_MAGIC
+
+
+def compress(data: BytesLike, codec: Optional[str] = None) -> BytesLike:
+    """Wraps data in a compression envelope, if that makes it smaller.
+
+    Args:
+        data (BytesLike): The plaintext.
+        codec (Optional[str]): "zlib", "zstd" or "off"; defaults to AGENT_G_COMPRESSION.
+
+    Returns:
+        BytesLike: The envelope, or `data` unchanged if compression is off, the
+            data is small, or compressing would not save space.
+    """
+    codec = COMPRESSION if codec is None else codec
+    if codec == COMPRESSION_OFF or len(data) < MIN_COMPRESS_BYTES:
+        return data
+    if codec == COMPRESSION_ZSTD:
+        zstd = _zstd if _zstd is not None else _load_zstd()
+        if zstd is None:
+            raise ValueError("zstd compression needs the 'zstandard' package.")
+        payload = zstd.ZstdCompressor(level=ZSTD_LEVEL).compress(bytes(data))
+    elif codec == COMPRESSION_ZLIB:
+        payload = zlib.compress(data, ZLIB_LEVEL)
+    else:
+        raise ValueError(f"Unknown compression codec '{codec}'.")
+    if len(payload) + _COMPRESSION_STRUCT.size >= len(data):
+        return data
+    header = _COMPRESSION_STRUCT.pack(COMPRESSION_MAGIC, COMPRESSION_FORMAT_VERSION, _CODEC_IDS[codec], len(data))
+    return header + payload
+
 
+def decompress(plaintext: BytesLike) -> BytesLike:
+    """Unwraps a compression envelope; other data is returned as it is, without a copy.
 
-def encrypt_data(data: bytes) -> bytes:
+    Args:
+        plaintext (BytesLike): Decrypted data.
+
+    Returns:
+        BytesLike: The original data: `plaintext` itself if it was not compressed.
+
+    Raises:
+        DecryptionError: If the envelope is malformed, uses an unknown version or
+            codec, or does not decompress to its recorded size.
+    """
+    if not is_compressed(plaintext):
+        return plaintext
+    view = memoryview(plaintext)
+    if len(view) < _COMPRESSION_STRUCT.size:
+        raise DecryptionError("Compressed data is too short to contain its header.")
+    _, version, codec_id, size = _COMPRESSION_STRUCT.unpack(bytes(view[:_COMPRESSION_STRUCT.size]))
+    if version != COMPRESSION_FORMAT_VERSION:
+        raise DecryptionError(f"Unsupported compression envelope version: {version}.")
+    payload = view[_COMPRESSION_STRUCT.size:]
+    codec = _CODEC_NAMES.get(codec_id)
+    try:
+        if codec == COMPRESSION_ZLIB:
+            # Bounded by the recorded size, so corrupt input cannot expand without limit.
+            decompressor = zlib.decompressobj()
+            data = decompressor.decompress(payload, size + 1)
+            if not decompressor.eof: # Also catches a stream cut off before its checksum.
+                raise DecryptionError("Compressed data is truncated.")
+        elif codec == COMPRESSION_ZSTD:
+            zstd = _zstd if _zstd is not None else _load_zstd()
+            if zstd is None:
+                raise DecryptionError("This data is zstd-compressed; install the 'zstandard' package to read it.")
+            data = zstd.ZstdDecompressor().decompress(bytes(payload), max_output_size=size)
+        else:
+            raise DecryptionError(f"Unknown compression codec id: {codec_id}.")
+    except DecryptionError:
+        raise
+    except Exception as e:
+        raise DecryptionError(f"Compressed data is corrupt: {e}") from e
+    if len(data) != size:
+        raise DecryptionError("Compressed data does not match its recorded size.")
+    return data
+
+
+def encrypt_data(data: BytesLike) -> bytes:
     """Encrypts the given data.
 
+    Uses the format selected by AGENT_G_CIPHER_MODE, after compressing the
+    data as selected by AGENT_G_COMPRESSION.
+
     Args:
-        data (bytes): The data to encrypt.
+        data (BytesLike): The data to encrypt.
 
     Returns:
         bytes: The encrypted data.
     """
-    return cipher.encrypt(data)
+    data = compress(data)
+    if CIPHER_MODE == CIPHER_MODE_AESGCM:
+        return encrypt_raw(data)
+    return _get_keyring().primary_fernet.encrypt(bytes(data))
 
-def decrypt_data(encrypted_data: bytes) -> bytes:
+def decrypt_data(encrypted_data: BytesLike) -> BytesLike:
     """Decrypts the given encrypted data.
 
+    Raw AES-GCM and Fernet ciphertexts are both accepted; the format is
+    detected from the leading bytes, as is compression of the plaintext. Any
+    key in the keyring can decrypt.
+
+    Args:
+        encrypted_data (BytesLike): The encrypted data to decrypt.
+
+    Returns:
+        BytesLike: The decrypted (and decompressed) data; a bytearray for raw-format
+            ciphertext that was not compressed.
+    """
+    if is_raw_format(encrypted_data):
+        return decompress(decrypt_raw(encrypted_data))
+    return decompress(get_cipher().decrypt(bytes(encrypted_data)))
+
+def is_encrypted_with_primary_key(encrypted_data: BytesLike) -> bool:
+    """Checks whether ciphertext is already in the current format and primary key.
+
+    Args:
+        encrypted_data (BytesLike): The encrypted data.
+
+    Returns:
+        bool: True if re-encrypting the data would not change its key or format.
+    """
+    if is_raw_format(encrypted_data):
+        if CIPHER_MODE != CIPHER_MODE_AESGCM or len(encrypted_data) < HEADER_SIZE:
+            return False
+        key_id = _HEADER_STRUCT.unpack(bytes(memoryview(encrypted_data)[:HEADER_SIZE]))[4]
+        return key_id == _get_keyring().key_id
+    if CIPHER_MODE != CIPHER_MODE_FERNET:
+        return False
+    try:
+        # Verifies the token's HMAC against the primary key without decrypting it.
+        _get_keyring().primary_fernet.extract_timestamp(bytes(encrypted_data))
+        return True
+    except Exception:
+        return False
+
+def verify_data(encrypted_data: BytesLike) -> bool:
+    """Checks that ciphertext is intact and was encrypted with a key in the keyring.
+
+    Fernet tokens are checked by their HMAC alone, without decrypting them.
+    Raw-format data can only be authenticated by decrypting its chunks; the
+    plaintext is discarded.
+
+    Args:
+        encrypted_data (BytesLike): The encrypted data.
+
+    Returns:
+        bool: True if `decrypt_data` would accept the ciphertext.
+    """
+    if is_raw_format(encrypted_data):
+        try:
+            decrypt_raw(encrypted_data)
+            return True
+        except DecryptionError:
+            return False
+    try:
+        get_cipher().extract_timestamp(bytes(encrypted_data))
+        return True
+    except Exception:
+        return False
+
+def rotate_data(encrypted_data: BytesLike) -> bytes:
+    """Re-encrypts data with the primary key in the current cipher mode.
+
+    Args:
+        encrypted_data (BytesLike): Data encrypted with any key in the keyring.
+
+    Returns:
+        bytes: The data encrypted with the primary key.
+    """
+    return encrypt_data(decrypt_data(encrypted_data))
+
+def decrypt_file(file_path: str) -> BytesLike:
+    """Reads and decrypts an encrypted file.
+
+    The file is read once into a buffer and raw-format chunks are decrypted
+    from memoryview slices of it, avoiding intermediate copies.
+
     Args:
-        encrypted_data (bytes): The encrypted data to decrypt.
+        file_path (str): Path to the encrypted file.
 
     Returns:
-        bytes: The decrypted data.
+        BytesLike: The decrypted data, as returned by `decrypt_data`.
+    """
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        buffer = bytearray(size)
+        read = f.readinto(buffer)
+    return decrypt_data(memoryview(buffer)[:read])
+
+def encrypt_file(file_path: str, data: BytesLike) -> None:
+    """Encrypts data and writes it to a file.
+
+    The write is atomic, so readers never see a partially written file.
+
+    Args:
+        file_path (str): Path of the file to write.
+        data (BytesLike): The plaintext to encrypt.
     """
-    return cipher.decrypt(encrypted_data)
\ No newline at end of file
+    file_io.atomic_write(file_path, encrypt_data(data))
@@ -0,0 +1,37 @@
+'''Small file-system helpers shared by the handlers and utilities.
+'''
+import os
+import tempfile
+from typing import Union
+
+
+def atomic_write(file_path: str, data: Union[bytes, bytearray, memoryview]) -> None:
+    """Writes data to a file atomically.
+
+    The data is written to a temporary file in the same directory, flushed to
+    disk, and then renamed over the destination, so readers see either the old
+    or the new content but never a partial write. An existing file's
+    permission bits are preserved.
+
+    Args:
+        file_path (str): Path of the file to write.
+        data (Union[bytes, bytearray, memoryview]): The content to write.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(temp_path, os.stat(file_path).st_mode & 0o777)
+        except FileNotFoundError:
+            pass
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
@@ -1,11 +1,355 @@
 '''Handles loading, parsing, and accessing notebook transcriptions.
+
+Pages edited while the CLI is running are picked up from the change event log
+(see change_events.py): only the changed pages are decrypted again, and the
+page store is replaced with a new one in a single assignment, so a chat turn
+that already holds the previous store is never blocked or left half-updated.
+
+Near-duplicate pages (see dedup.py) are detected whenever a store is built.
+The report and page signatures prepare_context saved are reused, so a load
+only hashes the pages that changed since.
+With config.DUPLICATE_PAGES_MODE set to "collapse", only the first page of
+each cluster is sent in the prompt.
+
+With config.SHARED_CORPUS_PATH set, the pages are mapped from a corpus that
+another process already decrypted into shared memory (see shared_corpus.py)
+instead of being decrypted here, and the watcher re-maps it when the loader
+republishes it.
 '''
 import os
 import re
-from typing import Tuple, List, Dict, Any
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+from typing import Tuple, List, Dict, Any, Optional, Iterable, Iterator, NamedTuple, Sequence
 from .. import encryption_service # Adjusted import for sub-package
+from .. import change_events
+from .. import config
+from .. import dedup
+from .. import prompt_builder
+from .. import shared_corpus
+from .. import summaries
+from .. import tracing
+
+# (notebook_id, page_number, filename, content)
+PageRow = Tuple[str, int, str, str]
+_PAGE_FIELDS = ("notebook_id", "page_number", "filename", "content")
+# Largest page number PageStore can hold (its page numbers are an array('I')).
+_MAX_PAGE_NUMBER = 2 ** (8 * array('I').itemsize) - 1
+
+
+class PageRecord(Mapping):
+    """Read-only, dict-like view of one page in a PageStore.
+
+    Supports `record["content"]`, `record.get(...)`, `dict(record)` and so on,
+    so code written against the old list of dicts keeps working.
+    """
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "PageStore", row: int) -> None:
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "notebook_id":
+            return self._store._notebook_ids[self._row]
+        if key == "page_number":
+            return self._store._page_numbers[self._row]
+        if key == "filename":
+            return self._store._filenames[self._row]
+        if key == "content":
+            return self._store._contents[self._row]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(_PAGE_FIELDS)
+
+    def __len__(self) -> int:
+        return len(_PAGE_FIELDS)
+
+    def __repr__(self) -> str:
+        return f"PageRecord({self['notebook_id']!r}, {self['page_number']}, {self['filename']!r})"
+
+
+class PageStore:
+    """Immutable, column-oriented store of decrypted notebook pages.
+
+    Pages are kept in parallel columns rather than one dict per page:
+    notebook ids are interned (so hundreds of pages share one string), page
+    numbers live in an `array('I')`, and each notebook has its page numbers
+    sorted alongside their row numbers for O(log n) lookups by
+    (notebook_id, page_number) and page ranges.
+
+    The store is a sequence of PageRecord views in load order. Changes
+    produce a new store (`with_changes`), so readers holding the old one are
+    never affected. Page and notebook summaries (see summaries.py), where
+    available, and the near-duplicate report are held alongside the pages.
+    Summaries not given up front are read from `summary_dir` the first time
+    they are asked for, and only if `summary_files` lists their file, so a
+    store costs nothing for summaries that are never needed.
+
+    A store built by `from_shared()` reads page text from a shared corpus
+    mapping and decodes it on access instead of holding it.
+
+    Args:
+        rows (Iterable[PageRow]): (notebook_id, page_number, filename, content) tuples.
+        page_summaries (Optional[Dict[str, str]]): Summaries keyed by page filename.
+        notebook_summaries (Optional[Dict[str, str]]): Summaries keyed by notebook id.
+        summary_dir (Optional[str]): Directory to read other summaries from on demand.
+        summary_files (Iterable[str]): Names of the summary files in `summary_dir`.
+    """
+
+    __slots__ = ("_notebook_ids", "_page_numbers", "_filenames", "_contents", "_index", "_summaries",
+                 "_notebook_summaries", "_duplicates", "_corpus", "_summary_dir", "_summary_files")
+
+    def __init__(self, rows: Iterable[PageRow] = (), page_summaries: Optional[Dict[str, str]] = None,
+                 notebook_summaries: Optional[Dict[str, str]] = None, summary_dir: Optional[str] = None,
+                 summary_files: Iterable[str] = ()) -> None:
+        self._notebook_ids: List[str] = []
+        self._page_numbers = array('I')
+        self._filenames: List[str] = []
+        self._contents: Sequence[str] = []
+        for notebook_id, page_number, filename, content in rows:
+            self._notebook_ids.append(sys.intern(notebook_id))
+            self._page_numbers.append(page_number)
+            self._filenames.append(filename)
+            self._contents.append(content)
+        self._index = self._build_index()
+        # Summaries read so far; None records that a page or notebook has none.
+        self._summaries: Dict[str, Optional[str]] = dict(page_summaries or {})
+        self._notebook_summaries: Dict[str, Optional[str]] = dict(notebook_summaries or {})
+        self._summary_dir = summary_dir
+        self._summary_files = frozenset(summary_files)
+        self._duplicates: Optional[dedup.DuplicateReport] = None
+        self._corpus: Optional[shared_corpus.SharedCorpus] = None
+
+    @classmethod
+    def from_shared(cls, corpus: shared_corpus.SharedCorpus) -> "PageStore":
+        """Builds a store over a mapped shared corpus, without copying its page text."""
+        store = cls()
+        store._notebook_ids = [sys.intern(notebook_id) for notebook_id in corpus.notebook_ids]
+        store._page_numbers = array('I', corpus.page_numbers)
+        store._filenames = corpus.filenames
+        store._contents = corpus.texts()
+        store._corpus = corpus
+        store._index = store._build_index()
+        store._summaries = dict(corpus.page_summaries)
+        store._notebook_summaries = dict(corpus.notebook_summaries)
+        if corpus.duplicates is not None:
+            store._duplicates = dedup.DuplicateReport.from_dict(corpus.duplicates)
+        return store
+
+    def _build_index(self) -> Dict[str, Tuple[array, array]]:
+        # notebook_id -> (sorted page numbers, matching row numbers)
+        groups: Dict[str, List[Tuple[int, int]]] = {}
+        for row, (notebook_id, page_number) in enumerate(zip(self._notebook_ids, self._page_numbers)):
+            groups.setdefault(notebook_id, []).append((page_number, row))
+        index = {}
+        for notebook_id, pairs in groups.items():
+            pairs.sort()
+            index[notebook_id] = (array('I', (p for p, _ in pairs)), array('I', (r for _, r in pairs)))
+        return index
+
+    def __len__(self) -> int:
+        return len(self._filenames)
+
+    def __bool__(self) -> bool:
+        return bool(self._filenames)
+
+    def __getitem__(self, row: int) -> PageRecord:
+        if row < 0:
+            row += len(self._filenames)
+        if not 0 <= row < len(self._filenames):
+            raise IndexError("page index out of range")
+        return PageRecord(self, row)
+
+    def __iter__(self) -> Iterator[PageRecord]:
+        return (PageRecord(self, row) for row in range(len(self._filenames)))
+
+    def rows(self) -> Iterator[PageRow]:
+        """Yields (notebook_id, page_number, filename, content) tuples in load order."""
+        return zip(self._notebook_ids, self._page_numbers, self._filenames, self._contents)
+
+    def notebook_ids(self) -> List[str]:
+        """Returns the ids of all notebooks in the store, sorted."""
+        return sorted(self._index)
+
+    def page_count(self, notebook_id: str) -> int:
+        """Returns the number of pages loaded for a notebook (0 if unknown)."""
+        entry = self._index.get(notebook_id)
+        return len(entry[0]) if entry else 0
+
+    def find(self, notebook_id: str, page_number: int) -> Optional[PageRecord]:
+        """Looks up a page by notebook id and page number in O(log n).
+
+        Returns:
+            Optional[PageRecord]: The page, or None if it is not loaded.
+        """
+        entry = self._index.get(notebook_id)
+        if entry is None:
+            return None
+        page_numbers, rows = entry
+        position = bisect_left(page_numbers, page_number)
+        if position < len(page_numbers) and page_numbers[position] == page_number:
+            return PageRecord(self, rows[position])
+        return None
+
+    def page_range(self, notebook_id: str, first: int = 0, last: Optional[int] = None) -> List[PageRecord]:
+        """Returns a notebook's pages numbered `first` to `last` (inclusive), in page order.
+
+        Args:
+            notebook_id (str): The notebook to read.
+            first (int): Lowest page number to include.
+            last (Optional[int]): Highest page number to include; None for no upper bound.
+
+        Returns:
+            List[PageRecord]: The matching pages; empty if the notebook is unknown.
+        """
+        entry = self._index.get(notebook_id)
+        if entry is None:
+            return []
+        page_numbers, rows = entry
+        start = bisect_left(page_numbers, first)
+        end = len(page_numbers) if last is None else bisect_right(page_numbers, last)
+        return [PageRecord(self, row) for row in rows[start:end]]
+
+    def summary(self, filename: str) -> Optional[str]:
+        """Returns the summary of a page, or None if it has none, reading it on first use."""
+        try:
+            return self._summaries[filename]
+        except KeyError:
+            pass
+        summary = None
+        if self._summary_dir is not None and summaries.summary_filename(filename) in self._summary_files:
+            record = self.find(*_parse_filename(filename))
+            if record is not None and record['filename'] == filename:
+                summary = summaries.read_summary(self._summary_dir, filename, record['content'])
+                tracing.add_counter("summaries_read", 1)
+        self._summaries[filename] = summary # The pages never change, so neither does the answer.
+        return summary
+
+    def summary_count(self) -> int:
+        """Returns how many pages have a summary. Reads every summary not read yet."""
+        return sum(1 for filename in self._filenames if self.summary(filename) is not None)
+
+    def notebook_summary(self, notebook_id: str) -> Optional[str]:
+        """Returns the summary of a notebook, or None if it has none, reading it on first use."""
+        try:
+            return self._notebook_summaries[notebook_id]
+        except KeyError:
+            pass
+        summary = None
+        if (self._summary_dir is not None and notebook_id in self._index
+                and summaries.notebook_summary_filename(notebook_id) in self._summary_files):
+            summary = _read_notebook_summary(self._summary_dir, self, notebook_id)
+            tracing.add_counter("summaries_read", 1)
+        self._notebook_summaries[notebook_id] = summary
+        return summary
+
+    def all_summaries(self) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Returns every page summary by filename and every notebook summary by id, reading any not read yet."""
+        page_summaries = {filename: self.summary(filename) for filename in self._filenames}
+        notebook_summaries = {notebook_id: self.notebook_summary(notebook_id) for notebook_id in self._index}
+        return ({filename: summary for filename, summary in page_summaries.items() if summary is not None},
+                {notebook_id: summary for notebook_id, summary in notebook_summaries.items() if summary is not None})
+
+    def duplicate_report(self) -> Optional[dedup.DuplicateReport]:
+        """Returns the near-duplicate clusters among the pages, or None if detection is off."""
+        return self._duplicates
+
+    def with_changes(self, updates: Dict[str, Optional[PageRow]],
+                     summary_updates: Optional[Dict[str, Optional[str]]] = None) -> "PageStore":
+        """Returns a new store with pages replaced, removed (None) or appended, keyed by filename.
+
+        Unchanged pages keep their position and share their strings with this store.
+        Summaries already read are carried over, except those of changed or
+        removed pages and of their notebooks, which are read again when next
+        needed; `summary_updates` sets (or, with None, removes) summaries by
+        filename. Duplicates are not carried over, as they depend on every page.
+        """
+        changed_notebooks = {_parse_filename(filename)[0] for filename in updates}
+        page_summaries = {filename: summary for filename, summary in self._summaries.items()
+                          if filename not in updates}
+        notebook_summaries = {notebook_id: summary for notebook_id, summary in self._notebook_summaries.items()
+                              if notebook_id not in changed_notebooks}
+        # A changed page may have a summary file the store was not told about; reading finds out.
+        summary_files = set(self._summary_files)
+        summary_files.update(summaries.summary_filename(filename) for filename in updates)
+        summary_files.update(summaries.notebook_summary_filename(notebook_id) for notebook_id in changed_notebooks)
+        for filename, summary in (summary_updates or {}).items():
+            page_summaries[filename] = summary
+        pending = dict(updates)
+        rows: List[PageRow] = []
+        for row in self.rows():
+            if row[2] in pending:
+                replacement = pending.pop(row[2])
+                if replacement is not None:
+                    rows.append(replacement)
+            else:
+                rows.append(row)
+        rows.extend(row for row in pending.values() if row is not None)
+        return PageStore(rows, page_summaries, notebook_summaries, self._summary_dir, summary_files)
+
+
+class PageScope(NamedTuple):
+    """Restricts the prompt to one notebook and/or a range of page numbers.
+
+    A scope without a notebook id applies the page range to every notebook.
+    """
+    notebook_id: Optional[str] = None
+    first_page: int = 0
+    last_page: Optional[int] = None
 
-_notebook_data: List[Dict[str, Any]] = []
+    def describe(self) -> str:
+        """Returns a short human-readable description, e.g. "Garden, pages 10-40"."""
+        where = self.notebook_id or "all notebooks"
+        if self.first_page <= 0 and self.last_page is None:
+            return where
+        if self.last_page is None:
+            return f"{where}, pages {self.first_page} onwards"
+        if self.first_page == self.last_page:
+            return f"{where}, page {self.first_page}"
+        return f"{where}, pages {self.first_page}-{self.last_page}"
+
+
+def parse_page_range(text: str) -> Optional[Tuple[int, Optional[int]]]:
+    """
+    Parses a page range such as "10-40", "12" or "10-" (page 10 onwards).
+
+    Args:
+        text (str): The range as typed.
+
+    Returns:
+        Optional[Tuple[int, Optional[int]]]: (first, last) with last None for no upper
+            bound, or None if the text is not a page range.
+    """
+    match = re.fullmatch(r"(\d+)\s*(?:-\s*(\d*))?", text.strip())
+    if not match:
+        return None
+    first = int(match.group(1))
+    if match.group(2) is None:
+        last: Optional[int] = first
+    else:
+        last = int(match.group(2)) if match.group(2) else None
+    if last is not None and last < first:
+        first, last = last, first
+    return first, last
+
+
+_notebook_data: PageStore = PageStore()
+# (store the value was built from, value); valid only while that store is current.
+_full_text_cache: Optional[Tuple[PageStore, str]] = None
+_prompt_pages_cache: Optional[Tuple[PageStore, Sequence[Tuple[str, str]]]] = None
+
+_transcription_dir: Optional[str] = None
+_change_reader: Optional[change_events.ChangeEventReader] = None
+_update_lock = threading.Lock() # Serialises loads and reloads; readers never take it.
+_watcher_thread: Optional[threading.Thread] = None
+_watcher_stop = threading.Event()
+_shared_corpus: Optional[shared_corpus.SharedCorpus] = None # The mapped corpus, when attached to one.
 
 def _parse_filename(filename: str) -> Tuple[str, int]:
     """
@@ -15,87 +359,544 @@ def _parse_filename(filename: str) -> Tuple[str, int]:
         filename (str): The filename to parse.
 
     Returns:
-        Tuple[str, int]: NotebookIdentifier and PageNumber. ("UnknownNotebook", 0) if parsing fails.
+        Tuple[str, int]: NotebookIdentifier and PageNumber. ("UnknownNotebook", 0) if parsing fails
+        or the page number does not fit the page store's `array('I')`.
     """
     match = re.match(r"(\w+)___Page(\d+)\.txt\.enc", filename)
-    if match:
+    if not match:
+        match = re.match(r"(\w+)___Page(\d+)\.txt", filename) # Fallback for .txt
+        if match:
+            print(f"Warning: Parsed a .txt file ({filename}) in a context expecting .txt.enc.")
+    if match and int(match.group(2)) <= _MAX_PAGE_NUMBER:
         return match.group(1), int(match.group(2))
-    match_txt = re.match(r"(\w+)___Page(\d+)\.txt", filename) # Fallback for .txt
-    if match_txt:
-        print(f"Warning: Parsed a .txt file ({filename}) in a context expecting .txt.enc.")
-        return match_txt.group(1), int(match_txt.group(2))
     return "UnknownNotebook", 0
 
+def _set_notebook_data(data: PageStore) -> None:
+    """Publishes a new page store; the old one is left untouched for any reader still using it.
+
+    Cached token estimates of pages that are no longer in the store are dropped.
+    """
+    global _notebook_data, _full_text_cache, _prompt_pages_cache
+    _notebook_data = data
+    _full_text_cache = None
+    _prompt_pages_cache = None
+    prompt_builder.retain_pages(data._filenames)
+
 def _clear_notebook_data() -> None:
     """Clears all loaded notebook data."""
-    global _notebook_data
-    _notebook_data = []
+    _set_notebook_data(PageStore())
+
+def _load_page(transcription_dir: str, filename: str) -> PageRow:
+    """
+    Decrypts one page and returns its row for the page store.
+
+    Raises:
+        ValueError: If the filename does not follow the page naming scheme.
+        Exception: Whatever reading or decrypting the file raises.
+    """
+    notebook_id, page_number = _parse_filename(filename)
+    if notebook_id == "UnknownNotebook":
+        raise ValueError(f"Could not parse notebook ID or page number from filename: {filename}")
+    decrypted_content_bytes = encryption_service.decrypt_file(os.path.join(transcription_dir, filename))
+    return notebook_id, page_number, filename, decrypted_content_bytes.decode('utf-8')
 
-def get_notebook_data() -> List[Dict[str, Any]]:
+def _read_notebook_summary(transcription_dir: str, store: PageStore, notebook_id: str) -> Optional[str]:
+    """Reads a notebook's summary, checked against the pages currently in `store`."""
+    pages = sorted(store.page_range(notebook_id), key=lambda record: record['filename'])
+    pages_hash = summaries.notebook_hash(summaries.page_hash(record['content']) for record in pages)
+    return summaries.read_notebook_summary(transcription_dir, notebook_id, pages_hash)
+
+def _find_duplicates(store: PageStore, transcription_dir: str) -> None:
+    """Records the near-duplicate clusters of a store that has not been published yet.
+
+    The report prepare_context stored is used if it covers exactly these pages;
+    otherwise the clusters are detected again, hashing only the pages whose
+    saved signature is missing or out of date.
+    """
+    if config.DUPLICATE_PAGES_MODE not in (dedup.MODE_FLAG, dedup.MODE_COLLAPSE):
+        return
+    with tracing.span("notebook.find_duplicates", pages=len(store)) as dedup_span:
+        stored = dedup.read_report(transcription_dir)
+        if (stored is not None and stored.threshold == config.DUPLICATE_THRESHOLD
+                and stored.pages_key == dedup.pages_key((row[2], dedup.text_key(row[3])) for row in store.rows())):
+            report = stored
+        else:
+            dedup_span.set(signatures_loaded=dedup.load_signatures(transcription_dir))
+            report = dedup.find_duplicates(((row[2], row[3]) for row in store.rows()), config.DUPLICATE_THRESHOLD)
+        dedup_span.set(stored=report is stored, clusters=len(report.clusters), duplicates=report.duplicate_count())
+    store._duplicates = report
+
+def get_notebook_data() -> PageStore:
     """
     Retrieves the current notebook data.
 
     Returns:
-        List[Dict[str, Any]]: A list of dictionaries, each representing a notebook entry.
+        PageStore: A sequence of dict-like page records (notebook_id, page_number,
+            filename, content), with indexed lookups by notebook and page.
     """
     return _notebook_data
 
-def load_transcriptions(transcription_dir: str) -> bool:
+def load_transcriptions(transcription_dir: str, use_shared: bool = True) -> bool:
     """
     Loads and decrypts all transcribed text files from the specified directory.
 
+    If config.SHARED_CORPUS_PATH is set and `use_shared` is True, the shared
+    corpus is mapped instead, when it exists; otherwise the pages are decrypted.
+
     Args:
         transcription_dir (str): Path to the directory containing encrypted transcription files.
+        use_shared (bool): Whether a shared corpus may be used instead of decrypting.
 
     Returns:
         bool: True if at least one transcription was successfully loaded, False otherwise.
     """
-    _clear_notebook_data()
-    if not os.path.exists(transcription_dir):
-        print(f"Error: Transcription directory not found: {transcription_dir}")
-        return False
-    
-    files_loaded_count = 0
-    global _notebook_data # Ensure we are modifying the module-level variable
-    for filename in os.listdir(transcription_dir):
-        if filename.endswith(".txt.enc"): 
-            file_path = os.path.join(transcription_dir, filename)
-            try:
-                with open(file_path, 'rb') as f:
-                    encrypted_content = f.read()
-                decrypted_content_bytes = encryption_service.decrypt_data(encrypted_content)
-                decrypted_content = decrypted_content_bytes.decode('utf-8')
-                
-                notebook_id, page_number = _parse_filename(filename)
-                if notebook_id != "UnknownNotebook":
-                    _notebook_data.append({
-                        "notebook_id": notebook_id,
-                        "page_number": page_number,
-                        "filename": filename,
-                        "content": decrypted_content
-                    })
-                    files_loaded_count += 1
-                else:
-                    print(f"Warning: Could not parse notebook ID or page number from filename: {filename}")
-            except Exception as e:
-                print(f"Error decrypting or processing file {filename}: {e}")
-    
-    if not _notebook_data:
+    global _transcription_dir, _change_reader, _shared_corpus
+    if use_shared and config.SHARED_CORPUS_PATH:
+        if attach_shared_corpus(config.SHARED_CORPUS_PATH):
+            return True
+        print("Decrypting the notebooks instead.")
+    with _update_lock, tracing.span("notebook.load_transcriptions") as load_span:
+        _clear_notebook_data()
+        _shared_corpus = None
+        if not os.path.exists(transcription_dir):
+            print(f"Error: Transcription directory not found: {transcription_dir}")
+            return False
+
+        # Mark the event log position before listing, so changes made during
+        # the load are replayed by the next refresh rather than lost.
+        _transcription_dir = transcription_dir
+        _change_reader = change_events.ChangeEventReader(transcription_dir)
+        _change_reader.skip_to_end()
+
+        loaded: List[PageRow] = []
+        filenames = os.listdir(transcription_dir)
+        summary_files = {filename for filename in filenames if filename.endswith(summaries.SUFFIXES)}
+        for filename in filenames:
+            if filename.endswith(".txt.enc"):
+                try:
+                    row = _load_page(transcription_dir, filename)
+                except ValueError as e:
+                    print(f"Warning: {e}")
+                    continue
+                except Exception as e:
+                    print(f"Error decrypting or processing file {filename}: {e}")
+                    continue
+                loaded.append(row)
+        # Summaries are read (and checked against their pages) only when a prompt needs them.
+        store = PageStore(loaded, summary_dir=transcription_dir, summary_files=summary_files)
+        _find_duplicates(store, transcription_dir)
+        _set_notebook_data(store)
+        load_span.set(pages=len(loaded), summary_files=len(summary_files))
+
+    if not loaded:
         print(f"No transcriptions found or loaded from {transcription_dir}")
         return False
     else:
-        print(f"Loaded and decrypted {files_loaded_count} transcription(s) from {transcription_dir}.")
+        print(f"Loaded and decrypted {len(loaded)} transcription(s) from {transcription_dir}.")
+        report = store.duplicate_report()
+        if report is not None and report.clusters:
+            action = "collapsed in prompts" if config.DUPLICATE_PAGES_MODE == dedup.MODE_COLLAPSE else "flagged"
+            print(f"{report.describe()} Duplicates are {action}; see /duplicates.")
         return True
 
+def attach_shared_corpus(path: str) -> bool:
+    """
+    Maps a shared corpus published by another process and uses its pages.
+
+    Nothing is decrypted: page text is read from the shared mapping, so every
+    process attached to the same corpus shares one copy of it.
+
+    Args:
+        path (str): The shared corpus file.
+
+    Returns:
+        bool: True if the corpus was mapped and has at least one page, False otherwise.
+    """
+    global _change_reader, _shared_corpus
+    with _update_lock, tracing.span("notebook.attach_shared_corpus") as attach_span:
+        try:
+            corpus = shared_corpus.SharedCorpus.open(path)
+        except FileNotFoundError:
+            print(f"No shared notebook corpus at {path}.")
+            return False
+        except Exception as e:
+            print(f"Warning: Could not map the shared notebook corpus {path}: {e}")
+            return False
+        store = PageStore.from_shared(corpus)
+        _change_reader = None # Changes arrive as a republished corpus instead.
+        _shared_corpus = corpus
+        _set_notebook_data(store)
+        attach_span.set(pages=len(store), bytes=corpus.size)
+    if not store:
+        print(f"The shared notebook corpus at {path} has no pages.")
+        return False
+    print(f"Mapped {len(store)} transcription(s) from the shared corpus at {path}.")
+    return True
+
+def publish_shared_corpus(path: str) -> int:
+    """
+    Writes the current pages to a shared corpus file for other processes to map.
+
+    Args:
+        path (str): Where to write the corpus; an existing file is replaced atomically.
+
+    Returns:
+        int: The size of the file in bytes.
+    """
+    data = _notebook_data
+    report = data.duplicate_report()
+    with tracing.span("notebook.publish_shared_corpus", pages=len(data)) as publish_span:
+        page_summaries, notebook_summaries = data.all_summaries()
+        size = shared_corpus.write_corpus(path, data.rows(), page_summaries, notebook_summaries,
+                                          report.to_dict() if report is not None else None)
+        publish_span.set(bytes=size)
+    return size
+
+def _reattach_shared_corpus() -> None:
+    """Maps the shared corpus again after the loader replaced it; keeps the current pages if that fails."""
+    global _shared_corpus
+    corpus = _shared_corpus
+    with _update_lock:
+        if corpus is None or corpus is not _shared_corpus:
+            return
+        try:
+            replacement = shared_corpus.SharedCorpus.open(corpus.path)
+        except FileNotFoundError:
+            return # The loader stopped; keep serving the pages already mapped.
+        # The previous mapping is not closed: a turn may still be reading it.
+        _shared_corpus = replacement
+        _set_notebook_data(PageStore.from_shared(replacement))
+        tracing.add_counter("shared_corpus_reattached", 1)
+
+def refresh_changed_pages() -> int:
+    """
+    Reloads only the pages named in new change events.
+
+    Changed pages are decrypted outside of any reader's path; the updated page
+    store is then published in one assignment. Pages that fail to decrypt keep
+    their previous content.
+
+    Returns:
+        int: The number of pages added, updated or removed.
+    """
+    with _update_lock:
+        if _change_reader is None or _transcription_dir is None:
+            return 0
+        events = _change_reader.read_new()
+        if not events:
+            return 0
+
+        # Only the latest event per file matters.
+        latest_ops: Dict[str, str] = {}
+        for event in events:
+            filename = os.path.basename(event["file"])
+            if filename.endswith(".txt.enc"):
+                latest_ops[filename] = event.get("op", change_events.OP_UPDATE)
+
+        updates: Dict[str, Optional[PageRow]] = {}
+        for filename, op in latest_ops.items():
+            if op == change_events.OP_DELETE or not os.path.exists(os.path.join(_transcription_dir, filename)):
+                updates[filename] = None
+                dedup.forget([filename])
+                continue
+            try:
+                updates[filename] = _load_page(_transcription_dir, filename)
+            except Exception as e:
+                print(f"Error reloading notebook page {filename}: {e}")
+        if not updates:
+            return 0
+        changed = len(updates)
+        tracing.add_counter("notebook_pages_reloaded", changed)
+
+        # Summaries of the changed pages and their notebooks are read again when needed.
+        store = _notebook_data.with_changes(updates)
+        # Signatures of unchanged pages are cached, so this only hashes the changed ones.
+        _find_duplicates(store, _transcription_dir)
+        _set_notebook_data(store)
+        return changed
+
+def _watch_for_changes(interval: float) -> None:
+    while not _watcher_stop.wait(interval):
+        reader = _change_reader
+        corpus = _shared_corpus
+        try:
+            if corpus is not None and corpus.is_replaced():
+                _reattach_shared_corpus()
+            elif reader is not None and reader.has_new_events():
+                refresh_changed_pages()
+        except Exception as e:
+            print(f"Error while reloading changed notebook pages: {e}")
+
+def start_change_watcher(interval: float = 2.0) -> Optional[threading.Thread]:
+    """
+    Starts a daemon thread that hot-reloads edited pages.
+
+    The thread checks the change event log with a single stat per interval
+    and calls `refresh_changed_pages()` when it has grown. When a shared
+    corpus is mapped, it checks that file instead and maps it again once the
+    loader has republished it. Call after `load_transcriptions()`.
+
+    Args:
+        interval (float): Seconds between checks. Values <= 0 disable the watcher.
+
+    Returns:
+        Optional[threading.Thread]: The watcher thread, or None if disabled.
+    """
+    global _watcher_thread
+    if interval <= 0:
+        return None
+    if _watcher_thread is not None and _watcher_thread.is_alive():
+        return _watcher_thread
+    _watcher_stop.clear()
+    _watcher_thread = threading.Thread(target=_watch_for_changes, args=(interval,),
+                                       name="notebook-watcher", daemon=True)
+    _watcher_thread.start()
+    return _watcher_thread
+
+def stop_change_watcher() -> None:
+    """Stops the watcher thread started by `start_change_watcher()`, if any."""
+    global _watcher_thread
+    _watcher_stop.set()
+    if _watcher_thread is not None:
+        _watcher_thread.join()
+        _watcher_thread = None
+
+def format_page_for_prompt(item: Mapping) -> str:
+    """
+    Formats one notebook entry the way it appears in the prompt.
+
+    Args:
+        item (Mapping): A page record from `get_notebook_data()`.
+
+    Returns:
+        str: The page text preceded by a source header.
+    """
+    return _format_row(item['notebook_id'], item['page_number'], item['filename'], item['content'])
+
+def _format_row(notebook_id: str, page_number: int, filename: str, content: str) -> str:
+    return f"{_page_header(notebook_id, page_number, filename)}{content}\n\n"
+
+def _page_header(notebook_id: str, page_number: int, filename: str) -> str:
+    return f"--- From: {notebook_id}, Page {page_number} ({filename}) ---\n"
+
+
+class _SharedPromptPages(Sequence):
+    """(filename, formatted page) pairs of a store mapped from a shared corpus.
+
+    Only row numbers are held; each page is decoded from the mapping and
+    formatted when it is read, so a process attached to a shared corpus does
+    not keep a private copy of the text between turns.
+    """
+
+    __slots__ = ("_store", "_rows")
+
+    def __init__(self, store: PageStore, rows: List[int]) -> None:
+        self._store = store
+        self._rows = rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        row = self._rows[index]
+        store = self._store
+        return store._filenames[row], _format_row(store._notebook_ids[row], store._page_numbers[row],
+                                                  store._filenames[row], store._contents[row])
+
+    def full_text(self) -> str:
+        """Returns the concatenated pages, joined from the mapping's memoryviews and decoded once."""
+        store = self._store
+        parts: List[Any] = []
+        for row in self._rows:
+            parts.append(_page_header(store._notebook_ids[row], store._page_numbers[row],
+                                      store._filenames[row]).encode('utf-8'))
+            parts.append(store._corpus.page(row))
+            parts.append(b"\n\n")
+        return b"".join(parts).decode('utf-8')
+
+
+def resolve_notebook_id(name: str) -> Optional[str]:
+    """
+    Finds the loaded notebook a user most likely means by `name`.
+
+    Tries an exact match, then a case-insensitive match, then a unique
+    case-insensitive substring match.
+
+    Args:
+        name (str): The notebook name as typed by the user.
+
+    Returns:
+        Optional[str]: The matching notebook id, or None if there is no unique match.
+    """
+    notebook_ids = _notebook_data.notebook_ids()
+    if name in notebook_ids:
+        return name
+    lowered = name.lower()
+    for notebook_id in notebook_ids:
+        if notebook_id.lower() == lowered:
+            return notebook_id
+    candidates = [notebook_id for notebook_id in notebook_ids if lowered in notebook_id.lower()]
+    return candidates[0] if len(candidates) == 1 else None
+
+def get_page_summary(filename: str) -> Optional[str]:
+    """
+    Returns the stored summary of a loaded page.
+
+    Args:
+        filename (str): The page filename.
+
+    Returns:
+        Optional[str]: The summary, or None if the page has no up-to-date summary.
+    """
+    return _notebook_data.summary(filename)
+
+def get_notebook_summary(notebook_id: str) -> Optional[str]:
+    """
+    Returns the stored summary of a loaded notebook.
+
+    Args:
+        notebook_id (str): The notebook id.
+
+    Returns:
+        Optional[str]: The summary, or None if the notebook has no up-to-date summary.
+    """
+    return _notebook_data.notebook_summary(notebook_id)
+
+def get_prompt_summary(filename: str) -> Optional[str]:
+    """
+    Returns a page's summary formatted to stand in for the page in the prompt.
+
+    Args:
+        filename (str): The page filename.
+
+    Returns:
+        Optional[str]: The formatted summary, or None if the page has none.
+    """
+    summary = _notebook_data.summary(filename)
+    if summary is None:
+        return None
+    notebook_id, page_number = _parse_filename(filename)
+    return f"--- From: {notebook_id}, Page {page_number} ({filename}), summary only ---\n{summary}\n\n"
+
+def get_notebook_overview(notebook_ids: Optional[List[str]] = None) -> str:
+    """
+    Returns the notebook summaries formatted for the prompt.
+
+    Args:
+        notebook_ids (Optional[List[str]]): Notebooks to include; all loaded notebooks if None.
+
+    Returns:
+        str: One paragraph per notebook with a summary, or "" if none has one.
+    """
+    data = _notebook_data
+    lines = []
+    for notebook_id in (notebook_ids if notebook_ids is not None else data.notebook_ids()):
+        summary = data.notebook_summary(notebook_id)
+        if summary is not None:
+            lines.append(f"--- Notebook overview: {notebook_id} ({data.page_count(notebook_id)} pages) ---\n{summary}\n\n")
+    return "".join(lines)
+
+def get_duplicate_report() -> Optional[dedup.DuplicateReport]:
+    """
+    Returns the near-duplicate clusters among the loaded pages.
+
+    Returns:
+        Optional[dedup.DuplicateReport]: The report, or None if detection is off.
+    """
+    return _notebook_data.duplicate_report()
+
+def _collapse_duplicates(data: PageStore, rows: List[int]) -> List[int]:
+    """Drops the rows of pages whose kept copy is also in `rows`, when duplicates are collapsed."""
+    report = data.duplicate_report()
+    if config.DUPLICATE_PAGES_MODE != dedup.MODE_COLLAPSE or report is None or not report.clusters:
+        return rows
+    duplicate_of = report.duplicate_of()
+    filenames = data._filenames
+    present = {filenames[row] for row in rows}
+    return [row for row in rows if duplicate_of.get(filenames[row]) not in present]
+
+def _prompt_pages(data: PageStore, rows: List[int]) -> Sequence[Tuple[str, str]]:
+    rows = _collapse_duplicates(data, rows)
+    if data._corpus is not None:
+        return _SharedPromptPages(data, rows)
+    return [(data._filenames[row], _format_row(data._notebook_ids[row], data._page_numbers[row],
+                                               data._filenames[row], data._contents[row]))
+            for row in rows]
+
+def list_notebooks() -> List[Tuple[str, int]]:
+    """
+    Lists the loaded notebooks.
+
+    Returns:
+        List[Tuple[str, int]]: (notebook_id, page count) pairs sorted by notebook id.
+    """
+    data = _notebook_data
+    return [(notebook_id, data.page_count(notebook_id)) for notebook_id in data.notebook_ids()]
+
+def get_prompt_pages(scope: Optional[PageScope] = None) -> Sequence[Tuple[str, str]]:
+    """
+    Returns loaded pages formatted for the prompt.
+
+    Without a scope, every page is returned in load order; that list is cached
+    until the page store changes and its formatted strings are shared with
+    `get_full_transcribed_text()`. With a scope, only the matching pages are
+    returned in notebook and page order, found through the store's index
+    without scanning the other pages.
+
+    When duplicates are collapsed, a duplicate page is left out if the page
+    kept in its place is among those returned.
+
+    For a store mapped from a shared corpus, the result formats each page
+    from the mapping when it is read, so no formatted copy is kept.
+
+    Args:
+        scope (Optional[PageScope]): Notebook and/or page range to restrict to.
+
+    Returns:
+        Sequence[Tuple[str, str]]: (filename, formatted page) pairs.
+    """
+    global _prompt_pages_cache
+    data = _notebook_data
+    if scope is not None:
+        notebook_ids = [scope.notebook_id] if scope.notebook_id else data.notebook_ids()
+        return _prompt_pages(data, [
+            record._row
+            for notebook_id in notebook_ids
+            for record in data.page_range(notebook_id, scope.first_page, scope.last_page)
+        ])
+    cached = _prompt_pages_cache
+    if cached is not None and cached[0] is data:
+        return cached[1]
+    pages = _prompt_pages(data, list(range(len(data))))
+    _prompt_pages_cache = (data, pages)
+    return pages
+
 def get_full_transcribed_text() -> str:
     """
     Concatenates all loaded notebook content for the prompt.
 
+    The result is cached until the page store changes, except for a store
+    mapped from a shared corpus: its text is joined from the mapping on every
+    call, so attached processes share the one copy instead of each caching
+    their own.
+
     Returns:
         str: A single string containing all transcribed text from loaded notebooks.
     """
-    full_text = ""
-    for item in _notebook_data:
-        full_text += f"--- From: {item['notebook_id']}, Page {item['page_number']} ({item['filename']}) ---\n"
-        full_text += item['content'] + "\n\n"
+    global _full_text_cache
+    data = _notebook_data
+    cached = _full_text_cache
+    if cached is not None and cached[0] is data:
+        return cached[1]
+    with tracing.span("notebook.build_full_text", pages=len(data)) as build_span:
+        pages = get_prompt_pages()
+        if isinstance(pages, _SharedPromptPages):
+            full_text = pages.full_text()
+            build_span.set(chars=len(full_text), shared=True)
+            return full_text
+        full_text = "".join(text for _, text in pages)
+        build_span.set(chars=len(full_text))
+    _full_text_cache = (data, full_text)
     return full_text
@@ -17,9 +17,7 @@ def load_and_decrypt_system_prompt(filepath: str) -> bool:
     """
     global _decrypted_system_prompt
     try:
-        with open(filepath, 'rb') as f:
-            encrypted_content: bytes = f.read()
-        decrypted_content: bytes = encryption_service.decrypt_data(encrypted_content)
+        decrypted_content: bytes = encryption_service.decrypt_file(filepath)
         _decrypted_system_prompt = decrypted_content.decode('utf-8')
         return True
     except FileNotFoundError:
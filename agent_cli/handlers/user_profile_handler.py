@@ -5,6 +5,7 @@ import json
 from typing import List, Dict, Any, Optional
 from .. import config
 from .. import encryption_service
+from .. import tracing
 
 _current_user_profile: Optional[Dict[str, Any]] = None
 _conversation_history: List[Dict[str, Any]] = []
@@ -84,6 +85,30 @@ def _set_conversation_history(history: List[Dict[str, Any]]) -> None:
     global _conversation_history
     _conversation_history = history
 
+def read_user_profile(profile_dir: str, profile_filename: str) -> Dict[str, Any]:
+    """
+    Reads a user profile without making it the current profile.
+
+    Used where the stored profile must not be touched, such as batch runs.
+
+    Args:
+        profile_dir (str): The directory where the profile file is located.
+        profile_filename (str): The name of the profile file.
+
+    Returns:
+        Dict[str, Any]: The profile, including its conversation history.
+
+    Raises:
+        FileNotFoundError: If the profile does not exist.
+        Exception: Whatever decrypting or parsing the file raises.
+    """
+    profile_path: str = os.path.join(profile_dir, profile_filename)
+    with tracing.span("profile.load"):
+        if profile_filename.endswith(".enc"):
+            return json.loads(encryption_service.decrypt_file(profile_path).decode('utf-8'))
+        with open(profile_path, "r", encoding='utf-8') as f:
+            return json.load(f)
+
 def load_user_profile(profile_dir: str, profile_filename: str) -> bool:
     """
     Loads a user profile and initialises conversation history.
@@ -114,14 +139,14 @@ def load_user_profile(profile_dir: str, profile_filename: str) -> bool:
         return True
 
     try:
-        if profile_filename.endswith(".enc"):
-            with open(profile_path, "rb") as f:
-                encrypted_data = f.read()
-            decrypted_data = encryption_service.decrypt_data(encrypted_data)
-            profile_data = json.loads(decrypted_data.decode('utf-8'))
-        else:
-            with open(profile_path, "r", encoding='utf-8') as f:
-                profile_data = json.load(f)
+        with tracing.span("profile.load") as load_span:
+            if profile_filename.endswith(".enc"):
+                decrypted_data = encryption_service.decrypt_file(profile_path)
+                profile_data = json.loads(decrypted_data.decode('utf-8'))
+                load_span.set(bytes=len(decrypted_data))
+            else:
+                with open(profile_path, "r", encoding='utf-8') as f:
+                    profile_data = json.load(f)
         
         _set_current_user_profile(profile_data)
         history = profile_data.get("conversation_history", [])
@@ -169,13 +194,15 @@ def save_user_profile(profile_dir: str, profile_filename: str) -> None:
         user["conversation_history"] = get_conversation_history()
         
         is_encrypted = profile_filename.endswith(".enc")
-        if is_encrypted:
-            profile_json_bytes = json.dumps(user, indent=4).encode('utf-8')
-            encrypted_profile_data = encryption_service.encrypt_data(profile_json_bytes)
-            with open(profile_path, 'wb') as f:
-                f.write(encrypted_profile_data)
-        else:
-            with open(profile_path, 'w', encoding='utf-8') as f:
-                json.dump(user, f, indent=4)
+        with tracing.span("profile.save", messages=len(user["conversation_history"])):
+            if is_encrypted:
+                with tracing.span("profile.serialize") as serialize_span:
+                    profile_json_bytes = json.dumps(user, indent=4).encode('utf-8')
+                    serialize_span.set(bytes=len(profile_json_bytes))
+                with tracing.span("profile.encrypt_write"):
+                    encryption_service.encrypt_file(profile_path, profile_json_bytes)
+            else:
+                with open(profile_path, 'w', encoding='utf-8') as f:
+                    json.dump(user, f, indent=4)
     except Exception as e:
         print(f"Error saving user profile to {profile_path}: {e}")
@@ -1,16 +1,152 @@
-import google.generativeai as genai
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple
+from . import config
 from . import data_manager
+from . import page_selection
+from . import prompt_builder
+from . import tracing
 
-def get_gemini_response(
+_last_prompt_plan: Optional[prompt_builder.PromptPlan] = None
+_last_selection: Optional[page_selection.PageSelection] = None
+# (history list, its messages converted for the API) for the most recently converted history.
+# Replaced as a whole, never modified in place; see `_convert_history()`.
+_converted_history: Optional[Tuple[List[Dict[str, Any]], Tuple[Dict[str, Any], ...]]] = None
+
+ERROR_RESPONSE = "I'm sorry, I encountered an error trying to process your request."
+
+class ResponseResult(NamedTuple):
+    """Everything one request produced, for callers that need more than the text."""
+    text: str
+    plan: Optional[prompt_builder.PromptPlan]
+    selection: Optional[page_selection.PageSelection]
+    usage: Dict[str, int]
+    notes: List[str]
+    error: Optional[str]
+
+class PreparedTurn(NamedTuple):
+    """The parts of the next request that do not depend on the query, built by `prepare_turn()`.
+
+    `plan` (and the `chat` session built from it) is None when the prompt had to
+    be trimmed or pages selected, since both depend on the query.
+    """
+    inputs: Tuple[Any, ...]
+    plan: Optional[prompt_builder.PromptPlan]
+    api_history: List[Dict[str, Any]]
+    chat: Any
+
+def _turn_inputs(current_user: Dict[str, Any], conversation_history: List[Dict[str, Any]],
+                 scope: Optional[data_manager.PageScope], mode: str, budget: int, model_name: str) -> Tuple[Any, ...]:
+    """Returns everything a prepared turn depends on, to check it is still valid when the query arrives."""
+    return (current_user, conversation_history, len(conversation_history), data_manager.get_notebook_data(),
+            data_manager.get_decrypted_system_prompt(), scope, mode, budget, model_name)
+
+def _same_inputs(first: Tuple[Any, ...], second: Tuple[Any, ...]) -> bool:
+    return len(first) == len(second) and all(a is b or a == b for a, b in zip(first, second))
+
+def _convert_history(conversation_history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Converts history messages to the API's format.
+
+    The result for the most recent history list is kept, so when messages have
+    only been appended to it since, just the new ones are converted. The cache
+    is replaced by assigning a new tuple, never changed in place, and callers
+    get their own list: a request running at the same time sees either the old
+    or the new cache, both correct for their history list.
+    """
+    global _converted_history
+    cached = _converted_history
+    if cached is not None and cached[0] is conversation_history and len(cached[1]) <= len(conversation_history):
+        converted = list(cached[1])
+    else:
+        converted = []
+    for entry in conversation_history[len(converted):]:
+        parts_for_api = []
+        if isinstance(entry.get('parts'), list):
+            for part_item in entry['parts']:
+                if isinstance(part_item, dict) and 'text' in part_item:
+                    parts_for_api.append(part_item['text'])
+                elif isinstance(part_item, str):
+                    parts_for_api.append(part_item)
+        converted.append({'role': entry['role'], 'parts': parts_for_api})
+    _converted_history = (conversation_history, tuple(converted))
+    return converted
+
+def _user_specific_prompt(current_user: Dict[str, Any], scope: Optional[data_manager.PageScope]) -> str:
+    user_specific_prompt = f"The user you are currently assisting is {current_user.get('preferred_name', 'the user')}. Address them by this name.\n"
+    user_specific_prompt += f"Their pronouns are {current_user.get('pronouns', 'they/them')}.\n"
+
+    user_context = current_user.get("context", "")
+    if user_context:
+        user_specific_prompt += f"\nSome background context about this user: {user_context}\n\n"
+    else:
+        user_specific_prompt += "\n"
+    if scope is not None:
+        user_specific_prompt += (f"The user has limited this question to {scope.describe()}; "
+                                 f"only those pages are included below.\n\n")
+    return user_specific_prompt
+
+def _system_instruction(full_system_prompt: str) -> Any:
+    genai = config.get_genai()
+    return genai.types.ContentDict(parts=[genai.types.PartDict(text=full_system_prompt)])
+
+def _record_usage(response: Any, api_span: tracing.Span) -> Dict[str, int]:
+    """Copies token counts from the response's usage metadata onto the span and session counters.
+
+    Returns:
+        Dict[str, int]: The token counts reported by the API (empty if none were).
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return {}
+    counts = {
+        "prompt_tokens": getattr(usage, "prompt_token_count", None),
+        "response_tokens": getattr(usage, "candidates_token_count", None),
+        "total_tokens": getattr(usage, "total_token_count", None),
+    }
+    counts = {name: int(value) for name, value in counts.items() if value is not None}
+    api_span.set(**counts)
+    for name, value in counts.items():
+        tracing.add_counter(name, value)
+    return counts
+
+def get_last_prompt_plan() -> Optional[prompt_builder.PromptPlan]:
+    """Returns the prompt plan of the most recent request, including anything trimmed from it.
+
+    Returns:
+        Optional[prompt_builder.PromptPlan]: The plan, or None before the first request.
+    """
+    return _last_prompt_plan
+
+def get_last_selection() -> Optional[page_selection.PageSelection]:
+    """Returns the page selection of the most recent two-stage request.
+
+    Returns:
+        Optional[page_selection.PageSelection]: The selection, or None if the most
+            recent request did not use two-stage mode.
+    """
+    return _last_selection
+
+def generate_response(
     user_query: str,
     current_user: Optional[Dict[str, Any]],
     conversation_history: List[Dict[str, Any]],
-    full_transcribed_text: str,
-    model_name: str
-) -> str:
+    full_transcribed_text: str = "",
+    model_name: str = config.GEMINI_MODEL_NAME,
+    notebook_pages: Optional[List[Tuple[str, str]]] = None,
+    token_budget: Optional[int] = None,
+    scope: Optional[data_manager.PageScope] = None,
+    two_stage: Optional[str] = None,
+    prepared: Optional[PreparedTurn] = None
+) -> ResponseResult:
     """Constructs the full prompt and gets a response from the Gemini API.
 
+    The prompt is kept within the token budget by prompt_builder, which first
+    swaps low-ranked pages for their stored summaries and then drops pages. In
+    two-stage mode a cheap selection pass (see page_selection) first picks the
+    pages to send. Nothing is printed, so several requests can run at once;
+    notes about trimming and selection are returned in the result. The only
+    module state touched is the converted-history cache, which is replaced
+    atomically (see `_convert_history()`), so concurrent requests never see it
+    half-updated.
+
     Args:
         user_query (str): The user's current query or message.
         current_user (Optional[Dict[str, Any]]): A dictionary containing the current user's profile information,
@@ -18,61 +154,226 @@ def get_gemini_response(
         conversation_history (List[Dict[str, Any]]): A list of past messages in the conversation,
             where each message is a dictionary with 'role' and 'parts'.
         full_transcribed_text (str): The full transcribed text from the user's notebook or input source.
+            When `notebook_pages` is also given, it must be their concatenation.
         model_name (str): The name of the Gemini model to use (e.g., "gemini-pro").
+        notebook_pages (Optional[List[Tuple[str, str]]]): (filename, formatted page) pairs, as returned
+            by `data_manager.get_prompt_pages()`. Lets individual pages be dropped when over budget.
+        token_budget (Optional[int]): Maximum estimated prompt tokens; defaults to config.PROMPT_TOKEN_BUDGET.
+        scope (Optional[data_manager.PageScope]): Restricts the notebook content to one notebook and/or
+            page range. When given, the pages are taken from the notebook index and
+            `full_transcribed_text`/`notebook_pages` are ignored.
+        two_stage (Optional[str]): "off", "local" or "model"; defaults to config.TWO_STAGE_MODE.
+        prepared (Optional[PreparedTurn]): Work done ahead of time by `prepare_turn()`. It is
+            used only if nothing it depends on has changed and the query still fits the budget.
 
     Returns:
-        str: The AI's response as a string, or an error message if an issue occurs.
+        ResponseResult: The response text (or an error message), the prompt plan,
+            the page selection, token usage, notes and any error.
     """
     if current_user is None:
-        return "Error: User profile not loaded for LLM service."
+        message = "Error: User profile not loaded for LLM service."
+        return ResponseResult(message, None, None, {}, [], message)
 
     system_prompt_base = data_manager.get_decrypted_system_prompt()
     if system_prompt_base is None:
-        return "Error: Could not load or decrypt the system prompt for LLM service."
+        message = "Error: Could not load or decrypt the system prompt for LLM service."
+        return ResponseResult(message, None, None, {}, [], message)
 
-    user_specific_prompt = f"The user you are currently assisting is {current_user.get('preferred_name', 'the user')}. Address them by this name.\n"
-    user_specific_prompt += f"Their pronouns are {current_user.get('pronouns', 'they/them')}.\n"
-    
-    user_context = current_user.get("context", "")
-    if user_context:
-        user_specific_prompt += f"\nSome background context about this user: {user_context}\n\n"
-    else:
-        user_specific_prompt += "\n"
+    mode = (two_stage if two_stage is not None else config.TWO_STAGE_MODE).lower()
+    budget = token_budget if token_budget is not None else config.PROMPT_TOKEN_BUDGET
+    selection: Optional[page_selection.PageSelection] = None
+    plan: Optional[prompt_builder.PromptPlan] = None
+    if prepared is not None and prepared.plan is not None and _same_inputs(
+            prepared.inputs, _turn_inputs(current_user, conversation_history, scope, mode, budget, model_name)):
+        query_tokens = prompt_builder.estimate_tokens(user_query)
+        if prepared.plan.estimated_tokens + query_tokens <= budget:
+            # Nothing was trimmed and the query still fits, so the prompt is the one prepared.
+            plan = prepared.plan._replace(
+                estimated_tokens=prepared.plan.estimated_tokens + query_tokens,
+                component_tokens=dict(prepared.plan.component_tokens,
+                                      fixed=prepared.plan.component_tokens["fixed"] + query_tokens),
+            )
+    if prepared is not None:
+        tracing.add_counter("prepared_turns_used" if plan is not None else "prepared_turns_discarded", 1)
 
-    full_system_prompt = (
-        f"{system_prompt_base}\n"
-        f"{user_specific_prompt}"
-        f"The transcribed notebook content is provided below:\n{full_transcribed_text}\n\n"
-        f"Conversation History:\n"
-    )
+    with tracing.span("llm.assemble_prompt", prepared=plan is not None) as assemble_span:
+        if plan is None:
+            plan, selection = _assemble_prompt(user_query, current_user, conversation_history, full_transcribed_text,
+                                               notebook_pages, budget, scope, mode)
+        full_system_prompt = plan.system_prompt
+        assemble_span.set(
+            scoped=scope is not None,
+            two_stage=selection is not None,
+            system_prompt_chars=len(full_system_prompt),
+            estimated_tokens=plan.estimated_tokens,
+            dropped_pages=len(plan.dropped_pages),
+            summarised_pages=len(plan.summarised_pages),
+            dropped_history_messages=plan.dropped_history_messages,
+        )
 
-    api_chat_history: List[Dict[str, Any]] = []
-    for entry in conversation_history:
-        parts_for_api = []
-        if isinstance(entry.get('parts'), list):
-            for part_item in entry['parts']:
-                if isinstance(part_item, dict) and 'text' in part_item:
-                    parts_for_api.append(part_item['text'])
-                elif isinstance(part_item, str):
-                    parts_for_api.append(part_item)
-        api_chat_history.append({'role': entry['role'], 'parts': parts_for_api})
-    
-    system_instruction_content = genai.types.ContentDict(
-        parts=[genai.types.PartDict(text=full_system_prompt)]
-    )
+    notes: List[str] = []
+    if selection is not None:
+        notes.append(selection.describe())
+    trimming_note = plan.describe_trimming()
+    if trimming_note:
+        notes.append(trimming_note)
+
+    with tracing.span("llm.convert_history", messages=len(plan.history)):
+        api_chat_history = _convert_history(conversation_history)[len(conversation_history) - len(plan.history):]
 
     try:
-        model = genai.GenerativeModel(
-            model_name,
-            system_instruction=system_instruction_content
-        )
-        
-        chat = model.start_chat(history=api_chat_history)
-        response = chat.send_message(user_query)
-        
-        ai_response_text: str = response.text
-        return ai_response_text
+        # A separate stage name lets /stats compare two-stage latency with full-context calls.
+        api_stage = "llm.api_call.two_stage" if selection is not None else "llm.api_call"
+        with tracing.span(api_stage, model=model_name, query_chars=len(user_query)) as api_span:
+            if prepared is not None and prepared.plan is not None and plan.system_prompt is prepared.plan.system_prompt:
+                chat = prepared.chat
+            else:
+                model = config.get_genai().GenerativeModel(
+                    model_name,
+                    system_instruction=_system_instruction(full_system_prompt)
+                )
+                chat = model.start_chat(history=api_chat_history)
+            response = chat.send_message(user_query)
+            
+            ai_response_text: str = response.text
+            api_span.set(response_chars=len(ai_response_text))
+            usage = _record_usage(response, api_span)
+        return ResponseResult(ai_response_text, plan, selection, usage, notes, None)
     except Exception as e:
-        print(f"Error communicating with Gemini API: {e}")
-        return "I'm sorry, I encountered an error trying to process your request."
+        return ResponseResult(ERROR_RESPONSE, plan, selection, {}, notes, f"Error communicating with Gemini API: {e}")
 
+def _assemble_prompt(
+    user_query: str,
+    current_user: Dict[str, Any],
+    conversation_history: List[Dict[str, Any]],
+    full_transcribed_text: str,
+    notebook_pages: Optional[List[Tuple[str, str]]],
+    budget: int,
+    scope: Optional[data_manager.PageScope],
+    mode: str,
+) -> Tuple[prompt_builder.PromptPlan, Optional[page_selection.PageSelection]]:
+    """Selects pages (in two-stage mode) and builds the prompt plan; see `generate_response()`."""
+    if scope is not None:
+        notebook_pages = data_manager.get_prompt_pages(scope)
+        full_transcribed_text = ""
+
+    selection: Optional[page_selection.PageSelection] = None
+    if mode in page_selection.SELECTORS:
+        if notebook_pages is None and full_transcribed_text:
+            notebook_pages = data_manager.get_prompt_pages()
+        if notebook_pages and len(notebook_pages) > config.TWO_STAGE_TOP_K:
+            selection = page_selection.select_pages(
+                user_query, notebook_pages, config.TWO_STAGE_TOP_K, selector=mode,
+                summary_lookup=data_manager.get_page_summary,
+            )
+            notebook_pages = selection.pages
+            full_transcribed_text = ""
+            tracing.add_counter("two_stage_tokens_saved",
+                                selection.full_context_tokens - selection.selected_tokens)
+
+    plan = prompt_builder.build_prompt(
+        system_prompt_base=data_manager.get_decrypted_system_prompt() or "",
+        user_specific_prompt=_user_specific_prompt(current_user, scope),
+        user_query=user_query,
+        conversation_history=conversation_history,
+        budget=budget,
+        notebook_pages=notebook_pages,
+        full_transcribed_text=full_transcribed_text,
+        min_history_messages=config.PROMPT_MIN_HISTORY_MESSAGES,
+        summary_lookup=data_manager.get_prompt_summary,
+        notebook_overview=lambda: data_manager.get_notebook_overview(
+            [scope.notebook_id] if scope is not None and scope.notebook_id else None),
+    )
+    return plan, selection
+
+def prepare_turn(
+    current_user: Optional[Dict[str, Any]],
+    conversation_history: List[Dict[str, Any]],
+    full_transcribed_text: str = "",
+    model_name: str = config.GEMINI_MODEL_NAME,
+    notebook_pages: Optional[List[Tuple[str, str]]] = None,
+    token_budget: Optional[int] = None,
+    scope: Optional[data_manager.PageScope] = None,
+    two_stage: Optional[str] = None,
+    previous: Optional[PreparedTurn] = None
+) -> Optional[PreparedTurn]:
+    """Builds everything the next request needs that does not depend on the query.
+
+    Meant to run while the user is still typing. Converts the history, builds
+    the system instruction as it would be for a query that fits the budget
+    (nothing trimmed, no page selection) and creates the model and chat
+    session for it. Pass the result to `generate_response()`, which checks it
+    is still valid and falls back to the usual assembly if not.
+
+    Takes the same arguments as `generate_response()`, less the query.
+
+    Args:
+        previous (Optional[PreparedTurn]): An earlier result, returned as-is if it is still valid.
+
+    Returns:
+        Optional[PreparedTurn]: The prepared turn, or None without a user or system prompt.
+    """
+    if current_user is None or data_manager.get_decrypted_system_prompt() is None:
+        return None
+    mode = (two_stage if two_stage is not None else config.TWO_STAGE_MODE).lower()
+    budget = token_budget if token_budget is not None else config.PROMPT_TOKEN_BUDGET
+    inputs = _turn_inputs(current_user, conversation_history, scope, mode, budget, model_name)
+    if previous is not None and _same_inputs(previous.inputs, inputs):
+        return previous
+
+    with tracing.span("llm.prepare_turn", messages=len(conversation_history)) as prepare_span:
+        api_history = _convert_history(conversation_history)
+        if mode in page_selection.SELECTORS and scope is None and notebook_pages is None and full_transcribed_text:
+            notebook_pages = data_manager.get_prompt_pages()
+        selecting = mode in page_selection.SELECTORS and len(
+            data_manager.get_prompt_pages(scope) if scope is not None else notebook_pages or ()
+        ) > config.TWO_STAGE_TOP_K
+        plan: Optional[prompt_builder.PromptPlan] = None
+        chat = None
+        if not selecting:
+            plan, _ = _assemble_prompt("", current_user, conversation_history, full_transcribed_text,
+                                       notebook_pages, budget, scope, mode)
+            if plan.describe_trimming() is not None:
+                plan = None # Which pages and messages to trim depends on the query.
+        if plan is not None:
+            model = config.get_genai().GenerativeModel(
+                model_name, system_instruction=_system_instruction(plan.system_prompt))
+            chat = model.start_chat(history=api_history)
+        prepare_span.set(planned=plan is not None)
+    return PreparedTurn(inputs, plan, api_history, chat)
+
+def get_gemini_response(
+    user_query: str,
+    current_user: Optional[Dict[str, Any]],
+    conversation_history: List[Dict[str, Any]],
+    full_transcribed_text: str = "",
+    model_name: str = config.GEMINI_MODEL_NAME,
+    notebook_pages: Optional[List[Tuple[str, str]]] = None,
+    token_budget: Optional[int] = None,
+    scope: Optional[data_manager.PageScope] = None,
+    two_stage: Optional[str] = None,
+    prepared: Optional[PreparedTurn] = None
+) -> str:
+    """Gets a response via `generate_response()`, printing its notes and errors.
+
+    Takes the same arguments as `generate_response()`. The prompt plan and
+    page selection are kept for `get_last_prompt_plan()` and `get_last_selection()`.
+
+    Returns:
+        str: The AI's response as a string, or an error message if an issue occurs.
+    """
+    global _last_prompt_plan, _last_selection
+    result = generate_response(
+        user_query, current_user, conversation_history,
+        full_transcribed_text=full_transcribed_text, model_name=model_name,
+        notebook_pages=notebook_pages, token_budget=token_budget, scope=scope, two_stage=two_stage,
+        prepared=prepared,
+    )
+    if result.plan is not None:
+        _last_prompt_plan = result.plan
+        _last_selection = result.selection
+    for note in result.notes:
+        print(f"Note: {note}")
+    if result.error and result.plan is not None:
+        print(result.error)
+    return result.text
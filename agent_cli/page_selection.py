@@ -0,0 +1,228 @@
+'''First stage of the two-stage answer pipeline: choosing which pages to send.
+
+Instead of sending the whole archive with every question, a cheap pass picks
+the pages most likely to hold the answer and only those go to the main model.
+Two selectors are available:
+
+    local   BM25-style ranking of the pages against the question, using the
+            term counts prompt_builder already caches per page. No API call.
+    model   The local ranking shortlists candidates, then a small, fast model
+            reads their compact summaries (see summaries.py) and picks the
+            pages to use. Falls back to the local ranking if the call fails,
+            which the selection's description reports.
+
+When AGENT_G_RETRIEVAL_SOCKET_DIR names the socket directory of a running
+retrieval service (see retrieval_service.py), both selectors take their local
+ranking from the service instead of ranking every page in this process. If the
+service cannot be reached, or its best pages are not among the pages offered
+(for example when the question is scoped to one notebook), the pages are
+ranked here as usual.
+
+Selected pages keep their original prompt order.
+'''
+import re
+import threading
+import time
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from . import config
+from . import prompt_builder
+from . import summaries
+from . import tracing
+
+SELECTOR_LOCAL = "local"
+SELECTOR_MODEL = "model"
+SELECTORS = (SELECTOR_LOCAL, SELECTOR_MODEL)
+
+# Candidates shortlisted locally before the model selector reads their summaries.
+MODEL_CANDIDATE_POOL = 100
+
+# Seconds to rank pages locally after the retrieval service failed, before trying it again.
+RETRIEVAL_RETRY_SECONDS = 60.0
+
+# One retrieval client per thread, since a client runs one query at a time.
+_retrieval = threading.local()
+# (monotonic time before which the service is not tried again, why it failed).
+_retrieval_backoff: Tuple[float, str] = (0.0, "")
+
+
+class PageSelection(NamedTuple):
+    """The pages chosen for the main answer, and what choosing them cost."""
+    pages: List[Tuple[str, str]]
+    total_pages: int
+    selector: str
+    elapsed_ms: float
+    full_context_tokens: int
+    selected_tokens: int
+    selection_call_tokens: int
+
+    def describe(self) -> str:
+        """Returns a one-line report of the selection and its estimated token savings."""
+        saved = self.full_context_tokens - self.selected_tokens
+        share = (saved / self.full_context_tokens * 100) if self.full_context_tokens else 0.0
+        cost = f", {self.selection_call_tokens} selection tokens" if self.selection_call_tokens else ""
+        return (f"Two-stage ({self.selector}): answered from {len(self.pages)} of {self.total_pages} pages, "
+                f"selected in {self.elapsed_ms:.0f} ms{cost}; notebook text ~{self.selected_tokens} tokens "
+                f"instead of ~{self.full_context_tokens} ({share:.0f}% fewer).")
+
+
+def _local_ranking(query: str, pages: List[Tuple[str, str]]) -> Tuple[List[int], List[float]]:
+    term_counts = [prompt_builder.page_terms(filename, text) for filename, text in pages]
+    scores = prompt_builder.score_pages(query, term_counts)
+    ranking = sorted(range(len(pages)), key=lambda index: -scores[index])
+    return ranking, scores
+
+
+def _retrieval_client():
+    client = getattr(_retrieval, "client", None)
+    if client is None:
+        from . import retrieval_service # Imported only when the service is configured.
+        client = _retrieval.client = retrieval_service.RetrievalClient(config.RETRIEVAL_SOCKET_DIR)
+    return client
+
+
+def _service_ranking(query: str, pages: List[Tuple[str, str]], wanted: int) -> Tuple[Optional[List[int]], str]:
+    """Returns the best `wanted` page indexes according to the retrieval service.
+
+    Returns:
+        Tuple[Optional[List[int]], str]: Page indexes, best first (empty if no page
+            shares a term with the query), or None if the service is not configured
+            or cannot say which of `pages` rank best; and why the service failed, if it did.
+            After a failure the service is not asked again for RETRIEVAL_RETRY_SECONDS.
+    """
+    global _retrieval_backoff
+    if not config.RETRIEVAL_SOCKET_DIR:
+        return None, ""
+    retry_after, last_error = _retrieval_backoff
+    if time.monotonic() < retry_after:
+        return None, last_error
+    try:
+        hits = _retrieval_client().search(query, wanted)
+    except Exception as e:
+        client = getattr(_retrieval, "client", None)
+        _retrieval.client = None
+        if client is not None:
+            client.close()
+        error = str(e) or type(e).__name__
+        _retrieval_backoff = (time.monotonic() + RETRIEVAL_RETRY_SECONDS,
+                              f"{error} (retrying in {RETRIEVAL_RETRY_SECONDS:g}s)")
+        return None, error
+    index_of = {filename: index for index, (filename, _) in enumerate(pages)}
+    ranking = [index_of[filename] for filename, _ in hits if filename in index_of]
+    if len(ranking) < len(hits) and len(hits) == wanted:
+        return None, "" # Pages outside `pages` pushed some of theirs out of the service's top `wanted`.
+    return ranking, ""
+
+
+def _model_choice(query: str, pages: List[Tuple[str, str]], candidates: List[int], top_k: int,
+                  summary_lookup: Callable[[str], Optional[str]], model_name: str) -> Tuple[List[int], int]:
+    """Asks a small model to pick pages from the candidates' summaries.
+
+    Returns:
+        Tuple[List[int], int]: Chosen page indexes and the tokens the call used.
+    """
+    lines = []
+    for number, index in enumerate(candidates, start=1):
+        filename, text = pages[index]
+        summary = summary_lookup(filename) or summaries.extractive_summary(text)
+        lines.append(f"[{number}] {filename}: {summary}")
+    prompt = (
+        "You select notebook pages for answering a question. Below are numbered page summaries.\n"
+        f"Question: {query}\n\n" + "\n".join(lines) + "\n\n"
+        f"Reply with the numbers of up to {top_k} pages most likely to help answer the question, "
+        "most useful first, separated by commas. Reply with numbers only."
+    )
+    genai = config.get_genai()
+    with tracing.span("llm.select_pages.model_call", model=model_name, candidates=len(candidates)) as call_span:
+        response = genai.GenerativeModel(model_name).generate_content(prompt)
+        usage = getattr(response, "usage_metadata", None)
+        used_tokens = int(getattr(usage, "total_token_count", 0) or 0) if usage is not None else 0
+        call_span.set(total_tokens=used_tokens)
+    chosen: List[int] = []
+    for match in re.findall(r"\d+", response.text or ""):
+        number = int(match)
+        if 1 <= number <= len(candidates) and candidates[number - 1] not in chosen:
+            chosen.append(candidates[number - 1])
+        if len(chosen) >= top_k:
+            break
+    if not chosen:
+        raise ValueError("the selection model did not name any page")
+    return chosen, used_tokens
+
+
+def select_pages(
+    query: str,
+    pages: List[Tuple[str, str]],
+    top_k: int,
+    selector: str = SELECTOR_LOCAL,
+    summary_lookup: Optional[Callable[[str], Optional[str]]] = None,
+    model_name: Optional[str] = None,
+) -> PageSelection:
+    """Chooses up to `top_k` pages for answering `query`.
+
+    If no page shares a term with the question (so the local ranking carries
+    no signal) and the local selector is in use, all pages are kept. The local
+    ranking comes from the retrieval service when config.RETRIEVAL_SOCKET_DIR
+    is set and it can answer for these pages.
+
+    Args:
+        query (str): The user's question.
+        pages (List[Tuple[str, str]]): (filename, formatted page) pairs in prompt order.
+        top_k (int): Maximum number of pages to keep.
+        selector (str): SELECTOR_LOCAL or SELECTOR_MODEL.
+        summary_lookup (Optional[Callable[[str], Optional[str]]]): Returns a page's summary
+            by filename; used by the model selector.
+        model_name (Optional[str]): Model for the model selector; defaults to config.SELECTION_MODEL_NAME.
+
+    Returns:
+        PageSelection: The chosen pages and the cost and savings of choosing them.
+    """
+    start = time.perf_counter()
+    with tracing.span("llm.select_pages", selector=selector, pages=len(pages)) as select_span:
+        full_tokens = sum(prompt_builder.estimate_page_tokens(filename, text) for filename, text in pages)
+        wanted = max(top_k, MODEL_CANDIDATE_POOL) if selector == SELECTOR_MODEL else top_k
+        ranking, service_error = _service_ranking(query, pages, wanted)
+        used_selector = SELECTOR_LOCAL
+        if ranking is not None:
+            scores = [1.0] * len(ranking) # Only whether any page matched is used below.
+            ranked = set(ranking) # Pages matching no term follow in prompt order, as in _local_ranking.
+            ranking.extend(index for index in range(len(pages)) if index not in ranked)
+            used_selector = "local, retrieval service"
+            select_span.set(ranking="service")
+        else:
+            ranking, scores = _local_ranking(query, pages)
+            if service_error:
+                used_selector = f"local, retrieval service failed: {service_error}"
+        call_tokens = 0
+
+        chosen: List[int]
+        if selector == SELECTOR_MODEL and len(pages) > top_k:
+            candidates = ranking[:wanted]
+            try:
+                chosen, call_tokens = _model_choice(query, pages, candidates, top_k,
+                                                    summary_lookup or (lambda _: None),
+                                                    model_name or config.SELECTION_MODEL_NAME)
+                used_selector = model_name or config.SELECTION_MODEL_NAME
+            except Exception as e:
+                used_selector = f"local, selection model failed: {e}"
+                chosen = ranking[:top_k]
+        elif not any(scores):
+            chosen = list(range(len(pages)))
+            used_selector = "local, no matching terms"
+        else:
+            chosen = ranking[:top_k]
+
+        keep = set(chosen)
+        selected = [page for index, page in enumerate(pages) if index in keep]
+        selected_tokens = sum(prompt_builder.estimate_page_tokens(filename, text) for filename, text in selected)
+        select_span.set(selected=len(selected), full_context_tokens=full_tokens, selected_tokens=selected_tokens)
+
+    return PageSelection(
+        pages=selected,
+        total_pages=len(pages),
+        selector=used_selector,
+        elapsed_ms=(time.perf_counter() - start) * 1000,
+        full_context_tokens=full_tokens,
+        selected_tokens=selected_tokens,
+        selection_call_tokens=call_tokens,
+    )
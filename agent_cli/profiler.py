@@ -0,0 +1,228 @@
+'''Opt-in sampling profiler for CLI sessions, transcription runs and prepare_context.
+
+Tracing (tracing.py) times the stages we thought to instrument; when a session
+is slow somewhere else, this shows where. A background thread samples the
+stack of every thread at a fixed interval, which costs little enough to leave
+on for a whole session. Turn it on with an environment variable:
+
+    AGENT_G_PROFILE=profiles python -m agent_cli.cli
+
+which profiles `cli.main`, `transcribe.process_images` and
+`prepare_context.prepare_context`, or run any entry point under it:
+
+    python -m agent_cli.profiler [-o DIR] [-i MS] -m agent_cli.cli
+    python -m agent_cli.profiler transcription_service/transcribe.py
+
+AGENT_G_PROFILE_INTERVAL_MS sets the sampling interval (default 10). When the
+profiled run ends, two files are written to the output directory:
+
+    <name>-<time>.collapsed   one line per distinct stack, "frame;frame;... count",
+                              outermost frame first: the input format of
+                              flamegraph.pl, inferno and speedscope
+    <name>-<time>.top.txt     the functions with the most samples, by time spent
+                              in the function itself (self) and including the
+                              functions it called (total)
+
+Time spent waiting (for input, the network or a lock) counts as self time of
+the Python function that waits.
+
+Only each frame's file name (without directories) and function name are
+recorded, prefixed by the thread name. Frame locals, arguments and source
+lines are never read, so notebook text, profiles and keys cannot reach the
+output through them. Frames of code compiled at run time (file names such as
+"<string>"), whose names may be derived from data, are recorded as
+"<dynamic>". The output directory is created private (0700) and the files
+owner-only (0600).
+'''
+import argparse
+import contextlib
+import os
+import runpy
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+PROFILE_DIR: str = os.getenv("AGENT_G_PROFILE", "")
+PROFILE_INTERVAL_MS = float(os.getenv("AGENT_G_PROFILE_INTERVAL_MS", "10"))
+# Functions listed in the top-functions summary.
+TOP_FUNCTIONS = 30
+
+DYNAMIC_FRAME = "<dynamic>"
+
+_active: Optional["SamplingProfiler"] = None
+_active_lock = threading.Lock()
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    if filename.startswith("<frozen "):
+        module = filename[len("<frozen "):-1]
+    elif filename.startswith("<"):
+        return DYNAMIC_FRAME
+    else:
+        module = os.path.splitext(os.path.basename(filename))[0]
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class SamplingProfiler:
+    """Samples every thread's stack from a background thread."""
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS) -> None:
+        self.interval = max(interval_ms, 0.1) / 1000
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self._started
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        labels: Dict[object, str] = {} # Code objects live as long as their functions, so this stays small.
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _frame_label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, "thread"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            frame = None # Do not keep the last sampled frame alive until the next sample.
+
+    def top_functions(self, limit: int = TOP_FUNCTIONS) -> List[Tuple[str, int, int]]:
+        """Returns (function, self samples, total samples), most self samples first."""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:] # Without the thread name.
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for label in set(frames):
+                total[label] += count
+        ranked = sorted(total, key=lambda label: (-own[label], -total[label], label))
+        return [(label, own[label], total[label]) for label in ranked[:limit]]
+
+    def write(self, output_dir: str, name: str) -> Tuple[str, str]:
+        """Writes the collapsed stacks and the summary; returns their paths."""
+        os.makedirs(output_dir, mode=0o700, exist_ok=True)
+        base = os.path.join(output_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+        collapsed_path = base + ".collapsed"
+        summary_path = base + ".top.txt"
+        lines = [f"{stack} {count}\n" for stack, count in sorted(self.stacks.items())]
+        _write_private(collapsed_path, "".join(lines))
+
+        stack_samples = sum(self.stacks.values()) or 1
+        summary = [
+            f"{name}: {self.samples} samples over {self.elapsed:.1f}s every {self.interval * 1000:g} ms, "
+            f"{stack_samples} thread stacks\n",
+            f"{'self %':>7} {'self':>7} {'total %':>8} {'total':>7}  function\n",
+        ]
+        for label, own, total in self.top_functions():
+            summary.append(f"{own / stack_samples * 100:>6.1f}% {own:>7} {total / stack_samples * 100:>7.1f}% "
+                           f"{total:>7}  {label}\n")
+        _write_private(summary_path, "".join(summary))
+        return collapsed_path, summary_path
+
+
+def _write_private(path: str, text: str) -> None:
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+@contextlib.contextmanager
+def profiled(name: str, output_dir: Optional[str] = None,
+             interval_ms: Optional[float] = None) -> Iterator[Optional[SamplingProfiler]]:
+    """Profiles the enclosed block (or decorated function) when profiling is on.
+
+    Profiling is on when `output_dir` or AGENT_G_PROFILE is set. Inside a run
+    that is already being profiled this does nothing, so entry points that
+    call each other produce one profile.
+
+    Args:
+        name (str): Prefix of the output files, e.g. "cli".
+        output_dir (Optional[str]): Where to write them; defaults to AGENT_G_PROFILE.
+        interval_ms (Optional[float]): Sampling interval; defaults to AGENT_G_PROFILE_INTERVAL_MS.
+
+    Yields:
+        Optional[SamplingProfiler]: The running profiler, or None if not profiling here.
+    """
+    global _active
+    output_dir = output_dir or PROFILE_DIR
+    with _active_lock:
+        owner = bool(output_dir) and _active is None
+        if owner:
+            _active = SamplingProfiler(interval_ms if interval_ms is not None else PROFILE_INTERVAL_MS)
+            _active.start()
+    if not owner:
+        yield None
+        return
+    profiler = _active
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        with _active_lock:
+            _active = None
+        try:
+            collapsed_path, summary_path = profiler.write(output_dir, name)
+            print(f"Profile written to {collapsed_path} and {summary_path}.", file=sys.stderr)
+        except OSError as e:
+            print(f"Warning: Could not write the profile: {e}", file=sys.stderr)
+
+
+def main() -> None:
+    """Runs a script or module under the profiler, like `python -m cProfile`."""
+    parser = argparse.ArgumentParser(
+        description="Run a script or module with the sampling profiler.",
+        usage="%(prog)s [-o DIR] [-i MS] (-m module | script) [args ...]")
+    parser.add_argument("-o", "--output", default=PROFILE_DIR or "profiles",
+                        help="Directory for the profile (default: AGENT_G_PROFILE or %(default)s).")
+    parser.add_argument("-i", "--interval", type=float, default=PROFILE_INTERVAL_MS,
+                        help="Sampling interval in milliseconds (default: %(default)s).")
+    parser.add_argument("-m", dest="module", action="store_true", help="Run a module, as `python -m` does.")
+    parser.add_argument("target", nargs=argparse.REMAINDER, help="The script (or module) and its arguments.")
+    args = parser.parse_args()
+    if not args.target:
+        parser.error("give a script or -m module to run")
+
+    sys.argv = args.target
+    if args.module:
+        name = args.target[0].rsplit(".", 1)[-1]
+    else:
+        name = os.path.splitext(os.path.basename(args.target[0]))[0]
+        sys.path.insert(0, os.path.dirname(os.path.abspath(args.target[0])))
+    with profiled(name, args.output, args.interval):
+        if args.module:
+            runpy.run_module(args.target[0], run_name="__main__", alter_sys=True)
+        else:
+            runpy.run_path(args.target[0], run_name="__main__")
+
+
+if __name__ == "__main__":
+    # Run the copy of this module that the profiled code imports, so its
+    # `profiled()` calls see the profiler already running.
+    from agent_cli import profiler
+    profiler.main()
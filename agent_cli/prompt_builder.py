@@ -0,0 +1,346 @@
+'''Builds the Gemini prompt within a token budget.
+
+Each prompt component (system prompt, user details, notebook pages,
+conversation history, the query) gets a local token estimate. Page estimates
+are cached per page, only recomputed when the page's content changes and
+dropped once the page is no longer loaded (`retain_pages`).
+When the total exceeds the budget, components are trimmed in this order:
+
+    1. the oldest conversation history, down to the most recent
+       `min_history_messages` messages,
+    2. notebook pages, lowest-ranked for the current query first: each is
+       first replaced by its summary where one is available (and a notebook
+       overview is added), and only dropped if that is still not enough,
+    3. the remaining history.
+
+The system prompt, user details and query are never trimmed. The returned
+PromptPlan records what was summarised and dropped, so the caller can report it.
+'''
+import math
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+# Gemini tokenises English prose at roughly four characters per token. The
+# estimate only has to be good enough to stay clear of the context limit.
+CHARS_PER_TOKEN = 4
+# Fixed allowance for the per-message structure of the chat history.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_TERM_RE = re.compile(r"\w{3,}")
+
+SUMMARY_NOTE = ("Some pages below are given as summaries only, to fit the prompt; "
+                "say so if the user needs their full text.\n")
+
+# filename -> [hash of formatted page, token estimate, term counts (computed on first ranking)]
+_page_cache: Dict[str, list] = {}
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimates the number of tokens in a piece of text without calling the API.
+
+    Args:
+        text (str): The text to estimate.
+
+    Returns:
+        int: The estimated token count.
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def count_terms(text: str) -> Counter:
+    """Counts the terms of a text the way pages and queries are ranked.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        Counter: Lower-cased terms of three or more characters and their counts.
+    """
+    return Counter(match.lower() for match in _TERM_RE.findall(text))
+
+
+def _page_entry(filename: str, formatted: str) -> list:
+    """Returns the cache entry for a page, recomputing it only when the page text changed."""
+    key = hash(formatted) # str hashes are memoised, so this is cheap on repeat turns.
+    entry = _page_cache.get(filename)
+    if entry is None or entry[0] != key:
+        entry = [key, math.ceil(len(formatted) / CHARS_PER_TOKEN), None]
+        _page_cache[filename] = entry
+    return entry
+
+
+def retain_pages(filenames: Iterable[str]) -> None:
+    """Drops cached page estimates for every page not in `filenames`, e.g. after pages were deleted.
+
+    Args:
+        filenames (Iterable[str]): The pages that can still appear in a prompt.
+    """
+    keep = set(filenames)
+    for filename in list(_page_cache): # Copied in one step, so turns may add entries meanwhile.
+        if filename not in keep:
+            _page_cache.pop(filename, None)
+
+
+def _page_terms(entry: list, formatted: str) -> Counter:
+    if entry[2] is None:
+        entry[2] = count_terms(formatted)
+    return entry[2]
+
+
+def estimate_page_tokens(filename: str, formatted: str) -> int:
+    """Returns the cached token estimate of a formatted page.
+
+    Args:
+        filename (str): The page filename, used as the cache key.
+        formatted (str): The page as it appears in the prompt.
+
+    Returns:
+        int: The estimated token count.
+    """
+    return _page_entry(filename, formatted)[1]
+
+
+def page_terms(filename: str, formatted: str) -> Counter:
+    """Returns the cached term counts of a formatted page, used for ranking.
+
+    Args:
+        filename (str): The page filename, used as the cache key.
+        formatted (str): The page as it appears in the prompt.
+
+    Returns:
+        Counter: Lower-cased terms of three or more characters and their counts.
+    """
+    entry = _page_entry(filename, formatted)
+    return _page_terms(entry, formatted)
+
+
+def _message_tokens(entry: Dict[str, Any]) -> int:
+    total = MESSAGE_OVERHEAD_TOKENS
+    for part in entry.get('parts') or []:
+        if isinstance(part, dict) and 'text' in part:
+            total += estimate_tokens(part['text'])
+        elif isinstance(part, str):
+            total += estimate_tokens(part)
+    return total
+
+
+def inverse_document_frequency(total: int, doc_freq: int) -> float:
+    """Returns the BM25 weight of a term found in `doc_freq` of `total` pages."""
+    return math.log(1 + (total - doc_freq + 0.5) / (doc_freq + 0.5))
+
+
+def score_pages(query: str, term_counts: List[Counter]) -> List[float]:
+    """Scores pages by relevance to the query (BM25-style term weighting).
+
+    Args:
+        query (str): The user's query.
+        term_counts (List[Counter]): Term counts of each page.
+
+    Returns:
+        List[float]: One score per page; 0.0 for pages sharing no term with the query.
+    """
+    query_terms = set(count_terms(query))
+    if not query_terms or not term_counts:
+        return [0.0] * len(term_counts)
+    total = len(term_counts)
+    doc_freq = {term: sum(1 for terms in term_counts if term in terms) for term in query_terms}
+    idf = {term: inverse_document_frequency(total, df) for term, df in doc_freq.items() if df}
+    scores = []
+    for terms in term_counts:
+        score = 0.0
+        for term, weight in idf.items():
+            tf = terms.get(term, 0)
+            if tf:
+                score += weight * tf * 2.2 / (tf + 1.2)
+        scores.append(score)
+    return scores
+
+
+def rank_pages(query: str, term_counts: List[Counter]) -> List[int]:
+    """Ranks pages by relevance to the query.
+
+    Args:
+        query (str): The user's query.
+        term_counts (List[Counter]): Term counts of each page.
+
+    Returns:
+        List[int]: Page indexes, most relevant first. Ties keep the original order.
+    """
+    scores = score_pages(query, term_counts)
+    return sorted(range(len(scores)), key=lambda index: -scores[index])
+
+
+def _list_pages(filenames: List[str]) -> str:
+    more = f" and {len(filenames) - 5} more" if len(filenames) > 5 else ""
+    return ", ".join(filenames[:5]) + more
+
+
+class PromptPlan(NamedTuple):
+    """The prompt to send, plus what the budgeter did to it."""
+    system_prompt: str
+    history: List[Dict[str, Any]]
+    estimated_tokens: int
+    budget: int
+    component_tokens: Dict[str, int]
+    pages_included: int
+    dropped_pages: List[str]
+    dropped_history_messages: int
+    summarised_pages: List[str]
+
+    @property
+    def over_budget(self) -> bool:
+        """True if the prompt is still larger than the budget after trimming."""
+        return self.estimated_tokens > self.budget
+
+    def describe_trimming(self) -> Optional[str]:
+        """Returns a one-line summary of what was dropped, or None if nothing was."""
+        if (not self.dropped_pages and not self.dropped_history_messages and not self.summarised_pages
+                and not self.over_budget):
+            return None
+        parts = []
+        if self.dropped_history_messages:
+            parts.append(f"{self.dropped_history_messages} oldest history message(s)")
+        if self.dropped_pages:
+            parts.append(f"{len(self.dropped_pages)} notebook page(s) ({_list_pages(self.dropped_pages)})")
+        summary = f"Prompt trimmed to ~{self.estimated_tokens} of {self.budget} tokens"
+        if self.summarised_pages:
+            summary += (f": {len(self.summarised_pages)} notebook page(s) replaced by summaries "
+                        f"({_list_pages(self.summarised_pages)})")
+        if parts:
+            summary += (";" if self.summarised_pages else ":") + " dropped " + " and ".join(parts)
+        if self.over_budget:
+            summary += "; still over budget"
+        return summary + "."
+
+
+def build_prompt(
+    system_prompt_base: str,
+    user_specific_prompt: str,
+    user_query: str,
+    conversation_history: List[Dict[str, Any]],
+    budget: int,
+    notebook_pages: Optional[List[Tuple[str, str]]] = None,
+    full_transcribed_text: str = "",
+    min_history_messages: int = 6,
+    summary_lookup: Optional[Callable[[str], Optional[str]]] = None,
+    notebook_overview: Union[str, Callable[[], str]] = "",
+) -> PromptPlan:
+    """Assembles the system prompt and history, trimming them to fit the budget.
+
+    Args:
+        system_prompt_base (str): The decrypted system prompt.
+        user_specific_prompt (str): Name, pronouns and context of the current user.
+        user_query (str): The user's current message.
+        conversation_history (List[Dict[str, Any]]): Past messages, oldest first.
+        budget (int): Maximum estimated input tokens.
+        notebook_pages (Optional[List[Tuple[str, str]]]): (filename, formatted page) pairs in
+            prompt order. When given, pages can be dropped individually.
+        full_transcribed_text (str): Pre-joined notebook text. Without `notebook_pages` it is
+            kept or dropped as a whole; with them it must be their concatenation and is
+            reused as-is when no page is dropped.
+        min_history_messages (int): Recent messages kept until no pages are left to drop.
+        summary_lookup (Optional[Callable[[str], Optional[str]]]): Returns a page's summary,
+            formatted for the prompt, by filename. Only called when pages must be trimmed.
+        notebook_overview (Union[str, Callable[[], str]]): Notebook summaries, or a function
+            returning them, added (and called) only when pages are trimmed.
+
+    Returns:
+        PromptPlan: The system prompt and history to send, and what was dropped.
+    """
+    fixed_tokens = (estimate_tokens(system_prompt_base) + estimate_tokens(user_specific_prompt)
+                    + estimate_tokens(user_query) + MESSAGE_OVERHEAD_TOKENS)
+
+    pages_given = notebook_pages is not None
+    if notebook_pages is None:
+        notebook_pages = [("notebook text", full_transcribed_text)] if full_transcribed_text else []
+    page_entries = [_page_entry(filename, text) for filename, text in notebook_pages]
+    page_tokens = [entry[1] for entry in page_entries]
+    history_tokens = [_message_tokens(entry) for entry in conversation_history]
+
+    total = fixed_tokens + sum(page_tokens) + sum(history_tokens)
+    history_start = 0
+    kept_pages = [True] * len(notebook_pages)
+    dropped_pages: List[str] = []
+    summarised_pages: List[str] = []
+    page_texts = [text for _, text in notebook_pages]
+    overview = ""
+
+    # 1. Oldest history, down to the protected recent messages.
+    history_floor = max(0, len(conversation_history) - max(0, min_history_messages))
+    while total > budget and history_start < history_floor:
+        total -= history_tokens[history_start]
+        history_start += 1
+
+    # 2. Lowest-ranked pages: summarise them where possible, then drop them.
+    if total > budget and notebook_pages:
+        term_counts = [_page_terms(entry, text) for entry, (_, text) in zip(page_entries, notebook_pages)]
+        least_relevant_first = list(reversed(rank_pages(user_query, term_counts)))
+        if summary_lookup is not None:
+            overview = notebook_overview() if callable(notebook_overview) else notebook_overview
+            if overview:
+                total += estimate_tokens(overview)
+            for index in least_relevant_first:
+                if total <= budget:
+                    break
+                summary = summary_lookup(notebook_pages[index][0])
+                if summary is None:
+                    continue
+                summary_tokens = estimate_tokens(summary)
+                if summary_tokens < page_tokens[index]:
+                    if not summarised_pages:
+                        total += estimate_tokens(SUMMARY_NOTE)
+                    total -= page_tokens[index] - summary_tokens
+                    page_tokens[index] = summary_tokens
+                    page_texts[index] = summary
+                    summarised_pages.append(notebook_pages[index][0])
+        for index in least_relevant_first:
+            if total <= budget:
+                break
+            kept_pages[index] = False
+            dropped_pages.append(notebook_pages[index][0])
+            total -= page_tokens[index]
+        dropped = set(dropped_pages)
+        had_summaries = bool(summarised_pages)
+        summarised_pages = [filename for filename in summarised_pages if filename not in dropped]
+        if had_summaries and not summarised_pages:
+            total -= estimate_tokens(SUMMARY_NOTE) # Every summarised page was dropped, so the note is left out.
+
+    # 3. Whatever history is left.
+    while total > budget and history_start < len(conversation_history):
+        total -= history_tokens[history_start]
+        history_start += 1
+
+    # Don't leave a model reply at the start of trimmed history; its question was dropped.
+    while 0 < history_start < len(conversation_history) and conversation_history[history_start].get('role') == 'model':
+        total -= history_tokens[history_start]
+        history_start += 1
+
+    if pages_given and full_transcribed_text and not dropped_pages and not summarised_pages:
+        included_text = full_transcribed_text
+    else:
+        included_text = "".join(text for text, kept in zip(page_texts, kept_pages) if kept)
+    if summarised_pages:
+        included_text = SUMMARY_NOTE + included_text
+    full_system_prompt = (
+        f"{system_prompt_base}\n"
+        f"{user_specific_prompt}"
+        f"{overview}"
+        f"The transcribed notebook content is provided below:\n{included_text}\n\n"
+        f"Conversation History:\n"
+    )
+    return PromptPlan(
+        system_prompt=full_system_prompt,
+        history=conversation_history[history_start:],
+        estimated_tokens=total,
+        budget=budget,
+        component_tokens={
+            "fixed": fixed_tokens,
+            "notebook": sum(t for t, kept in zip(page_tokens, kept_pages) if kept),
+            "history": sum(history_tokens[history_start:]),
+        },
+        pages_included=sum(kept_pages),
+        dropped_pages=dropped_pages,
+        dropped_history_messages=history_start,
+        summarised_pages=summarised_pages,
+    )
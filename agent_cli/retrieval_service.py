@@ -0,0 +1,436 @@
+'''Sharded page retrieval for archives too large for one process to rank.
+
+The two-stage selector (page_selection.py) ranks every loaded page in the
+asking process, which stops scaling once several families' archives are
+hosted together. This service splits the pages into shards by a stable hash of
+their notebook id and serves each shard from its own worker process, which
+keeps an inverted index of its pages and listens on a Unix socket in a private
+directory. A query takes two round trips to every shard:
+
+    scatter   the query's terms go to all shards, which report how many of
+              their pages contain each term
+    gather    with the combined counts, each shard scores its pages exactly
+              as prompt_builder.score_pages would over the whole archive and
+              returns its best `top_k`; these are merged into the overall top-k
+
+Because document frequencies are combined before scoring, the results do not
+depend on the shard count. Shards are rebuilt independently: `rebuild()` only
+re-indexes the shards whose pages changed, and a shard keeps answering from
+its previous index until the new one is ready.
+
+Run the service next to the CLI or the admin workers:
+
+    python -m agent_cli.retrieval_service [--shards 4] [--socket-dir DIR]
+
+It loads the notebooks as the CLI does, re-indexes the affected shards when
+pages are edited and prints the socket directory, which other processes pass
+to `RetrievalClient`. `--query "text"` asks a running service from the
+command line. Ctrl-C (SIGINT), SIGTERM and SIGHUP stop the workers and remove
+their sockets; after SIGKILL the workers exit on their own and the next start
+replaces the sockets left behind.
+
+The workers hold decrypted page text. The socket directory is created with
+owner-only permissions (0700) and `RetrievalClient` refuses a directory that
+another user owns or that others can enter.
+'''
+import argparse
+import glob
+import heapq
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from array import array
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from . import config
+from . import prompt_builder
+from . import tracing
+from .handlers import notebook_handler
+
+SOCKET_PATTERN = "shard-{:03d}.sock"
+# Seconds to wait for a new worker to start listening.
+START_TIMEOUT = 60.0
+
+
+def shard_for(notebook_id: str, shards: int) -> int:
+    """Returns the shard holding a notebook's pages; stable across processes and runs."""
+    return zlib.crc32(notebook_id.encode("utf-8")) % shards
+
+
+def partition_pages(store: notebook_handler.PageStore, shards: int) -> List[List[Tuple[str, str]]]:
+    """Splits a page store into (filename, formatted page) lists, one per shard.
+
+    Pages are formatted as they appear in the prompt, so they rank as they do
+    in page_selection. Duplicates are not collapsed; that is left to the prompt.
+    """
+    partitions: List[List[Tuple[str, str]]] = [[] for _ in range(shards)]
+    for record in store:
+        partitions[shard_for(record['notebook_id'], shards)].append(
+            (record['filename'], notebook_handler.format_page_for_prompt(record)))
+    return partitions
+
+
+# --- Shard worker ---
+class _ShardIndex:
+    """An inverted index over one shard's pages."""
+
+    def __init__(self, pages: List[Tuple[str, str]]) -> None:
+        self.filenames = [filename for filename, _ in pages]
+        # term -> (page numbers, term counts), both in page order.
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        for page, (_, text) in enumerate(pages):
+            for term, count in prompt_builder.count_terms(text).items():
+                entry = self.postings.get(term)
+                if entry is None:
+                    entry = self.postings[term] = (array("I"), array("I"))
+                entry[0].append(page)
+                entry[1].append(count)
+
+    def doc_freq(self, terms: List[str]) -> Dict[str, int]:
+        return {term: len(self.postings[term][0]) for term in terms if term in self.postings}
+
+    def search(self, idf: Dict[str, float], top_k: int) -> List[Tuple[str, float]]:
+        scores: Dict[int, float] = {}
+        for term, weight in idf.items(): # Same order and weighting as prompt_builder.score_pages.
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            for page, tf in zip(*entry):
+                scores[page] = scores.get(page, 0.0) + weight * tf * 2.2 / (tf + 1.2)
+        filenames = self.filenames
+        best = heapq.nsmallest(top_k, scores.items(), key=lambda item: (-item[1], filenames[item[0]]))
+        return [(self.filenames[page], score) for page, score in best]
+
+
+class _ShardState:
+    def __init__(self) -> None:
+        self.index = _ShardIndex([])
+        self.build_lock = threading.Lock()
+
+
+def _serve_connection(connection: Connection, state: _ShardState) -> None:
+    """Answers one client's requests until it disconnects."""
+    pinned = state.index # A query's two round trips use the same index, even across a rebuild.
+    with connection:
+        while True:
+            try:
+                request = connection.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                command = request[0]
+                if command == "build":
+                    with state.build_lock:
+                        state.index = _ShardIndex(request[1])
+                    reply: Any = len(state.index.filenames)
+                elif command == "doc_freq":
+                    pinned = state.index
+                    reply = (len(pinned.filenames), pinned.doc_freq(request[1]))
+                elif command == "search":
+                    reply = pinned.search(request[1], request[2])
+                else:
+                    raise ValueError(f"unknown request {command!r}")
+                connection.send(("ok", reply))
+            except Exception as e:
+                connection.send(("error", str(e)))
+
+
+def _serve_shard(socket_path: str, parent_pid: int) -> None:
+    """Worker process: serves one shard on a Unix socket until the parent goes away."""
+    state = _ShardState()
+    listener = Listener(socket_path, family="AF_UNIX")
+
+    def _watch_parent() -> None:
+        while os.getppid() == parent_pid:
+            time.sleep(1.0)
+        os._exit(0) # Orphaned, e.g. the service was killed; do not keep page text around.
+
+    threading.Thread(target=_watch_parent, daemon=True).start()
+    while True:
+        connection = listener.accept()
+        threading.Thread(target=_serve_connection, args=(connection, state), daemon=True).start()
+
+
+# --- Client side ---
+def _check_private_dir(path: str) -> None:
+    st = os.stat(path)
+    if hasattr(os, "getuid") and (st.st_uid != os.getuid() or st.st_mode & 0o077):
+        raise PermissionError(f"Refusing to use {path}: it must be owned by this user with mode 0700.")
+
+
+def _connect(path: str, process: Optional[multiprocessing.process.BaseProcess] = None) -> Connection:
+    """Connects to a shard's socket.
+
+    Given the `process` of a worker that is still starting up, waits up to
+    START_TIMEOUT for it to listen. Without one, fails at once: a socket file
+    nobody listens on is most likely left over from a service that was killed.
+    """
+    deadline = time.monotonic() + START_TIMEOUT
+    while True:
+        try:
+            return Client(path, family="AF_UNIX")
+        except (FileNotFoundError, ConnectionRefusedError):
+            if process is None or not process.is_alive() or time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def _scatter(connections: List[Connection], request: Tuple[Any, ...]) -> List[Any]:
+    """Sends a request to every shard before reading any reply, so the shards work in parallel."""
+    for connection in connections:
+        connection.send(request)
+    replies = []
+    for shard, connection in enumerate(connections):
+        status, reply = connection.recv()
+        if status != "ok":
+            raise RuntimeError(f"Retrieval shard {shard}: {reply}")
+        replies.append(reply)
+    return replies
+
+
+class RetrievalClient:
+    """Queries the shards of a running retrieval service.
+
+    One query runs at a time per client; threads that query concurrently
+    should each open their own.
+    """
+
+    def __init__(self, socket_dir: str) -> None:
+        """Connects to every shard socket in `socket_dir`.
+
+        Raises:
+            FileNotFoundError: If the directory has no shard sockets.
+            PermissionError: If the directory is not private to this user.
+            ConnectionRefusedError: If a shard is not listening, e.g. the service was killed.
+        """
+        _check_private_dir(socket_dir)
+        paths = sorted(glob.glob(os.path.join(socket_dir, "shard-*.sock")))
+        if not paths:
+            raise FileNotFoundError(f"No retrieval shards in {socket_dir}.")
+        self._connections: List[Connection] = []
+        try:
+            for path in paths:
+                self._connections.append(_connect(path))
+        except OSError:
+            self.close()
+            raise
+        self._lock = threading.Lock()
+
+    @property
+    def shards(self) -> int:
+        return len(self._connections)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """Returns the `top_k` pages that best match `query` across all shards.
+
+        Args:
+            query (str): The question.
+            top_k (int): Maximum number of pages to return.
+
+        Returns:
+            List[Tuple[str, float]]: (filename, score) pairs, best first and then by
+                filename. Pages sharing no term with the query are not returned.
+
+        Raises:
+            RuntimeError: If a shard reports an error.
+            OSError, EOFError: If a shard is unreachable.
+        """
+        terms = list(set(prompt_builder.count_terms(query)))
+        if not terms or top_k <= 0:
+            return []
+        with self._lock, tracing.span("retrieval.search", shards=self.shards, top_k=top_k) as search_span:
+            stats = _scatter(self._connections, ("doc_freq", terms))
+            total = sum(pages for pages, _ in stats)
+            idf = {}
+            for term in terms:
+                df = sum(freqs.get(term, 0) for _, freqs in stats)
+                if df:
+                    idf[term] = prompt_builder.inverse_document_frequency(total, df)
+            if not idf:
+                return []
+            shard_hits = _scatter(self._connections, ("search", idf, top_k))
+            hits = heapq.nsmallest(top_k, (hit for hits in shard_hits for hit in hits),
+                                   key=lambda hit: (-hit[1], hit[0]))
+            search_span.set(pages=total, hits=len(hits))
+        return hits
+
+    def close(self) -> None:
+        for connection in self._connections:
+            connection.close()
+
+
+class RetrievalService:
+    """Runs one worker process per shard and keeps their indexes up to date.
+
+    Use as a context manager, or call `start()` and `close()`.
+    """
+
+    def __init__(self, shards: int = config.RETRIEVAL_SHARDS, socket_dir: Optional[str] = None) -> None:
+        """
+        Args:
+            shards (int): Number of shards (worker processes).
+            socket_dir (Optional[str]): Directory for the shard sockets; a private
+                temporary directory is created (and removed on close) if not given.
+        """
+        if shards < 1:
+            raise ValueError("A retrieval service needs at least one shard.")
+        self.shards = shards
+        self.socket_dir = socket_dir or ""
+        self._owns_dir = not socket_dir
+        self._processes: List[multiprocessing.process.BaseProcess] = []
+        self._control: List[Connection] = [] # Used for rebuilds, so they do not wait behind queries.
+        self._fingerprints: List[Optional[int]] = [None] * shards
+        self._client: Optional[RetrievalClient] = None
+
+    def start(self, store: Optional[notebook_handler.PageStore] = None) -> None:
+        """Starts the workers and indexes `store` (default: the loaded notebooks)."""
+        if self._owns_dir:
+            self.socket_dir = tempfile.mkdtemp(prefix="agent_g_retrieval_")
+        else:
+            os.makedirs(self.socket_dir, mode=0o700, exist_ok=True)
+            _check_private_dir(self.socket_dir)
+        context = multiprocessing.get_context("spawn") # Workers must not inherit the parent's threads.
+        for shard in range(self.shards):
+            path = os.path.join(self.socket_dir, SOCKET_PATTERN.format(shard))
+            if os.path.exists(path):
+                os.unlink(path) # Left behind by a service that was killed.
+            process = context.Process(target=_serve_shard, args=(path, os.getpid()),
+                                      name=f"retrieval-shard-{shard}", daemon=True)
+            process.start()
+            self._processes.append(process)
+        for shard, process in enumerate(self._processes):
+            self._control.append(_connect(os.path.join(self.socket_dir, SOCKET_PATTERN.format(shard)), process))
+        self.rebuild(store)
+        self._client = RetrievalClient(self.socket_dir)
+
+    def rebuild(self, store: Optional[notebook_handler.PageStore] = None,
+                shards: Optional[Iterable[int]] = None) -> List[int]:
+        """Re-indexes shards from `store` (default: the loaded notebooks).
+
+        Args:
+            store (Optional[notebook_handler.PageStore]): The pages to index.
+            shards (Optional[Iterable[int]]): Shards to rebuild. By default only
+                those whose pages changed since they were last built.
+
+        Returns:
+            List[int]: The shards that were rebuilt.
+        """
+        store = store if store is not None else notebook_handler.get_notebook_data()
+        partitions = partition_pages(store, self.shards)
+        fingerprints = [hash(tuple((filename, hash(text)) for filename, text in pages)) for pages in partitions]
+        if shards is None:
+            rebuilt = [shard for shard in range(self.shards) if fingerprints[shard] != self._fingerprints[shard]]
+        else:
+            rebuilt = sorted(set(shards))
+        with tracing.span("retrieval.rebuild", shards=len(rebuilt),
+                          pages=sum(len(partitions[shard]) for shard in rebuilt)):
+            for shard in rebuilt: # Every shard gets its pages before any reply is read, so they build in parallel.
+                self._control[shard].send(("build", partitions[shard]))
+            for shard in rebuilt:
+                status, reply = self._control[shard].recv()
+                if status != "ok":
+                    raise RuntimeError(f"Retrieval shard {shard}: {reply}")
+                self._fingerprints[shard] = fingerprints[shard]
+        return rebuilt
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """Returns the `top_k` best-matching pages; see `RetrievalClient.search()`."""
+        if self._client is None:
+            raise RuntimeError("The retrieval service has not been started.")
+        return self._client.search(query, top_k)
+
+    def close(self) -> None:
+        """Stops the workers and removes their sockets."""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+        for connection in self._control:
+            connection.close()
+        self._control = []
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            process.join()
+        self._processes = []
+        if self._owns_dir and self.socket_dir:
+            shutil.rmtree(self.socket_dir, ignore_errors=True)
+        elif self.socket_dir:
+            for path in glob.glob(os.path.join(self.socket_dir, "shard-*.sock")):
+                os.unlink(path)
+
+    def __enter__(self) -> "RetrievalService":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def main() -> None:
+    """Serves the loaded notebooks from sharded workers, or queries a running service."""
+    from .encryption_service import load_keyring
+
+    parser = argparse.ArgumentParser(description="Serve notebook page retrieval from sharded worker processes.")
+    parser.add_argument("--shards", type=int, default=config.RETRIEVAL_SHARDS,
+                        help="Number of shard worker processes (default: AGENT_G_RETRIEVAL_SHARDS or %(default)s).")
+    parser.add_argument("--socket-dir", default=config.RETRIEVAL_SOCKET_DIR or None,
+                        help="Directory for the shard sockets (default: AGENT_G_RETRIEVAL_SOCKET_DIR, "
+                             "or a new private temporary directory).")
+    parser.add_argument("--query", help="Ask the service running in --socket-dir and print the best pages.")
+    parser.add_argument("--top-k", type=int, default=config.TWO_STAGE_TOP_K, help="Pages to return for --query.")
+    args = parser.parse_args()
+
+    if args.query is not None:
+        if not args.socket_dir:
+            parser.error("--query needs --socket-dir (or AGENT_G_RETRIEVAL_SOCKET_DIR).")
+        client = RetrievalClient(args.socket_dir)
+        try:
+            for filename, score in client.search(args.query, args.top_k):
+                print(f"{score:8.3f}  {filename}")
+        finally:
+            client.close()
+        return
+
+    try:
+        load_keyring()
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if not notebook_handler.load_transcriptions(config.TRANSCRIPTION_DIR):
+        sys.exit(1)
+    # Make `kill` and a closing terminal stop the service like Ctrl-C, so the sockets are removed.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, signal.default_int_handler)
+    service = RetrievalService(args.shards, args.socket_dir)
+    try:
+        start = time.perf_counter()
+        service.start()
+        print(f"Indexed {len(notebook_handler.get_notebook_data())} page(s) in {args.shards} shard(s) "
+              f"in {time.perf_counter() - start:.1f}s. Sockets are in {service.socket_dir}.")
+        interval = config.NOTEBOOK_WATCH_INTERVAL if config.NOTEBOOK_WATCH_INTERVAL > 0 else 2.0
+        notebook_handler.start_change_watcher(interval)
+        print("Watching for changed pages. Press Ctrl-C (or send SIGTERM) to stop.")
+        store = notebook_handler.get_notebook_data()
+        while True:
+            time.sleep(interval)
+            if notebook_handler.get_notebook_data() is not store:
+                store = notebook_handler.get_notebook_data()
+                rebuilt = service.rebuild(store)
+                if rebuilt:
+                    print(f"Rebuilt shard(s) {', '.join(map(str, rebuilt))}.")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
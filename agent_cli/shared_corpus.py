@@ -0,0 +1,336 @@
+'''A decrypted notebook corpus shared read-only between processes.
+
+Each process that calls `notebook_handler.load_transcriptions()` decrypts
+every page and keeps its own copy of the text. When several processes serve
+the same notebooks, one loader can instead decrypt the corpus once and write
+it to a single file in shared memory (tmpfs, /dev/shm on Linux). The other
+processes map that file read-only: the pages are read straight from the
+shared mapping, so memory use does not grow with the number of processes,
+and start-up costs a few system calls instead of a full decrypt.
+
+File layout (integers in native byte order; the file never leaves the machine):
+
+    header    MAGIC, format version, page count, and the offset and length
+              of the sections below
+    metadata  UTF-8 JSON: (notebook_id, page_number, filename) per page,
+              page and notebook summaries and the near-duplicate report
+    offsets   page_count + 1 unsigned 64-bit offsets into the text section,
+              8-byte aligned
+    text      the UTF-8 text of every page, back to back
+
+Page i is text[offsets[i]:offsets[i + 1]], returned by `page()` as a
+memoryview over the mapping without copying it.
+
+The file holds decrypted notebook text. It is created with owner-only
+permissions (0600) and `SharedCorpus.open()` refuses a file that another user
+owns or that others can read. tmpfs lives in memory, so the text is never
+written to disk unless the system swaps. Without tmpfs there is no default
+location: the loader only writes elsewhere when given an explicit path, and
+warns that the decrypted text then persists on disk. The loader replaces the file
+atomically when it republishes; processes that mapped the old file keep
+reading it until they re-attach.
+
+Run `python -m agent_cli.shared_corpus --watch` to act as the loader and keep
+the shared copy up to date as pages change, and set AGENT_G_SHARED_CORPUS to
+the same path in the processes that should map it. The watching loader
+removes the file when it is stopped by Ctrl-C (SIGINT), SIGTERM (`kill`, a
+service manager) or SIGHUP (its terminal closing). SIGKILL cannot be caught:
+after one, remove the file with `--remove`.
+'''
+import argparse
+import getpass
+import json
+import mmap
+import os
+import signal
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+MAGIC = b"AGCORPUS"
+FORMAT_VERSION = 1
+
+# magic, version, page count, metadata offset, metadata length, offsets offset, text offset
+_HEADER = struct.Struct("=8sIIQQQQ")
+
+
+MEMORY_FILESYSTEMS = ("tmpfs", "ramfs")
+
+
+def is_memory_backed(path: str) -> Optional[bool]:
+    """Checks whether `path` is on a filesystem held in memory (tmpfs or ramfs).
+
+    Returns:
+        Optional[bool]: The answer, or None where mounts cannot be read (outside Linux).
+    """
+    try:
+        with open("/proc/mounts", encoding="utf-8") as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return None
+    directory = os.path.realpath(os.path.dirname(os.path.abspath(path)))
+    best, fstype = "", ""
+    for mount_point, mount_type in mounts:
+        mount_point = mount_point.replace("\\040", " ")
+        inside = directory == mount_point or directory.startswith(mount_point.rstrip("/") + "/")
+        if inside and len(mount_point) > len(best):
+            best, fstype = mount_point, mount_type
+    return fstype in MEMORY_FILESYSTEMS
+
+
+def default_path() -> Optional[str]:
+    """Returns the default location of the shared corpus in /dev/shm, or None if that is not a usable tmpfs."""
+    directory = "/dev/shm"
+    if not (os.path.isdir(directory) and os.access(directory, os.W_OK) and is_memory_backed(directory + "/x")):
+        return None
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = str(os.getpid())
+    return os.path.join(directory, f"agent_g_corpus_{user}.bin")
+
+
+def write_corpus(path: str, rows: Iterable[Tuple[str, int, str, str]],
+                 page_summaries: Optional[Dict[str, str]] = None,
+                 notebook_summaries: Optional[Dict[str, str]] = None,
+                 duplicates: Optional[Dict[str, Any]] = None) -> int:
+    """Writes a shared corpus file, replacing any existing one atomically.
+
+    Args:
+        path (str): Where to write the corpus.
+        rows (Iterable[Tuple[str, int, str, str]]): (notebook_id, page_number, filename, content) per page.
+        page_summaries (Optional[Dict[str, str]]): Page summaries by filename.
+        notebook_summaries (Optional[Dict[str, str]]): Notebook summaries by notebook id.
+        duplicates (Optional[Dict[str, Any]]): The near-duplicate report as `DuplicateReport.to_dict()`.
+
+    Returns:
+        int: The size of the file in bytes.
+    """
+    pages: List[Tuple[str, int, str]] = []
+    texts: List[bytes] = []
+    offsets = array('Q', [0])
+    for notebook_id, page_number, filename, content in rows:
+        pages.append((notebook_id, page_number, filename))
+        texts.append(content.encode('utf-8'))
+        offsets.append(offsets[-1] + len(texts[-1]))
+    metadata = json.dumps({
+        "created": time.time(),
+        "pages": pages,
+        "summaries": page_summaries or {},
+        "notebook_summaries": notebook_summaries or {},
+        "duplicates": duplicates,
+    }).encode('utf-8')
+    metadata_offset = _HEADER.size
+    offsets_offset = (metadata_offset + len(metadata) + 7) // 8 * 8
+    text_offset = offsets_offset + offsets.itemsize * len(offsets)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, len(pages), metadata_offset, len(metadata),
+                          offsets_offset, text_offset)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".agent_g_corpus.", suffix=".tmp") # Created 0600.
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write(metadata)
+            f.write(b"\0" * (offsets_offset - metadata_offset - len(metadata)))
+            f.write(offsets.tobytes())
+            for text in texts:
+                f.write(text)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return text_offset + offsets[-1]
+
+
+def remove_corpus(path: str) -> bool:
+    """Deletes a shared corpus file. Processes that have it mapped can still read it.
+
+    Returns:
+        bool: True if a file was removed.
+    """
+    try:
+        os.unlink(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+class PageTexts(Sequence):
+    """The page texts of a SharedCorpus as a sequence of str, decoded on access."""
+
+    __slots__ = ("_corpus",)
+
+    def __init__(self, corpus: "SharedCorpus") -> None:
+        self._corpus = corpus
+
+    def __len__(self) -> int:
+        return self._corpus.page_count
+
+    def __getitem__(self, row: int) -> str:
+        return self._corpus.text(row)
+
+
+class SharedCorpus:
+    """A shared corpus file mapped read-only. Use `SharedCorpus.open()`.
+
+    Attributes:
+        path (str): The file that was mapped.
+        page_count (int): Number of pages.
+        notebook_ids, page_numbers, filenames (List): One entry per page, in load order.
+        page_summaries (Dict[str, str]): Page summaries by filename.
+        notebook_summaries (Dict[str, str]): Notebook summaries by notebook id.
+        duplicates (Optional[Dict[str, Any]]): The near-duplicate report as a dict, if one was stored.
+        created (float): When the loader wrote the file (seconds since the epoch).
+        size (int): Size of the mapping in bytes.
+    """
+
+    def __init__(self, path: str, mapping: mmap.mmap, identity: Tuple[int, int]) -> None:
+        self.path = path
+        self._mapping = mapping
+        self._identity = identity
+        self.size = len(mapping)
+        magic, version, page_count, metadata_offset, metadata_length, offsets_offset, text_offset = \
+            _HEADER.unpack_from(mapping, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an Agent-G shared corpus.")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path} has shared corpus format {version}; expected {FORMAT_VERSION}.")
+        view = memoryview(mapping)
+        self._offsets = view[offsets_offset:text_offset].cast('Q')
+        self._text = view[text_offset:]
+        if len(self._offsets) != page_count + 1 or self._offsets[-1] > len(self._text):
+            raise ValueError(f"{path} is truncated or corrupt.")
+        metadata = json.loads(bytes(view[metadata_offset:metadata_offset + metadata_length]))
+        self.page_count = page_count
+        self.notebook_ids: List[str] = [page[0] for page in metadata["pages"]]
+        self.page_numbers: List[int] = [page[1] for page in metadata["pages"]]
+        self.filenames: List[str] = [page[2] for page in metadata["pages"]]
+        self.page_summaries: Dict[str, str] = metadata["summaries"]
+        self.notebook_summaries: Dict[str, str] = metadata["notebook_summaries"]
+        self.duplicates: Optional[Dict[str, Any]] = metadata["duplicates"]
+        self.created: float = metadata["created"]
+
+    @classmethod
+    def open(cls, path: str) -> "SharedCorpus":
+        """Maps a shared corpus file.
+
+        Raises:
+            FileNotFoundError: If there is no file at `path`.
+            PermissionError: If the file belongs to another user or others can read it.
+            ValueError: If the file is not a shared corpus or is corrupt.
+        """
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+        try:
+            st = os.fstat(fd)
+            if hasattr(os, "getuid") and (st.st_uid != os.getuid() or st.st_mode & 0o077):
+                raise PermissionError(f"Refusing to map {path}: it must be owned by this user with mode 0600.")
+            if st.st_size < _HEADER.size:
+                raise ValueError(f"{path} is not an Agent-G shared corpus.")
+            mapping = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        return cls(path, mapping, (st.st_dev, st.st_ino))
+
+    def page(self, row: int) -> memoryview:
+        """Returns the UTF-8 text of a page as a memoryview into the mapping, without copying it."""
+        if not 0 <= row < self.page_count:
+            raise IndexError("page index out of range")
+        return self._text[self._offsets[row]:self._offsets[row + 1]]
+
+    def text(self, row: int) -> str:
+        """Returns the text of a page, decoded into a new str."""
+        return str(self.page(row), 'utf-8')
+
+    def texts(self) -> PageTexts:
+        """Returns all page texts as a sequence that decodes each page when it is read."""
+        return PageTexts(self)
+
+    def is_replaced(self) -> bool:
+        """Checks (with a single stat) whether the loader has since replaced or removed the file."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        return (st.st_dev, st.st_ino) != self._identity
+
+    def close(self) -> None:
+        """Unmaps the file. Does nothing while page views handed out by `page()` are still alive."""
+        try:
+            self._offsets.release()
+            self._text.release()
+            self._mapping.close()
+        except BufferError:
+            pass
+
+
+def main() -> None:
+    """Decrypts the notebooks and publishes them as a shared corpus, optionally keeping it up to date."""
+    from . import config
+    from .encryption_service import load_keyring
+    from .handlers import notebook_handler
+
+    parser = argparse.ArgumentParser(
+        description="Decrypt the notebooks once into shared memory for other Agent-G processes to map.")
+    parser.add_argument("--path", default=config.SHARED_CORPUS_PATH or default_path(),
+                        help="Where to write the shared corpus (default: AGENT_G_SHARED_CORPUS or %(default)s). "
+                             "Required where /dev/shm is not a tmpfs.")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running, republish when pages change and remove the corpus on exit.")
+    parser.add_argument("--remove", action="store_true", help="Remove the shared corpus and exit.")
+    args = parser.parse_args()
+    if args.path is None:
+        parser.error("/dev/shm is not available as a tmpfs, so there is no default location that keeps the "
+                     "decrypted text off disk. Pass --path (or set AGENT_G_SHARED_CORPUS) to publish elsewhere.")
+
+    if args.remove:
+        print(f"Removed {args.path}." if remove_corpus(args.path) else f"No shared corpus at {args.path}.")
+        return
+    if args.watch:
+        # Make `kill` and a closing terminal stop the loader like Ctrl-C, so the corpus is removed.
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, signal.default_int_handler)
+    try:
+        load_keyring()
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    in_memory = is_memory_backed(args.path) is not False
+    if not in_memory:
+        print(f"Warning: {args.path} is not on a tmpfs. The decrypted notebook text will be written to disk "
+              f"and persist there, possibly beyond removal of the file, e.g. in backups or free blocks.")
+    try:
+        if not notebook_handler.load_transcriptions(config.TRANSCRIPTION_DIR, use_shared=False):
+            sys.exit(1)
+        size = notebook_handler.publish_shared_corpus(args.path)
+        print(f"Published {len(notebook_handler.get_notebook_data())} page(s) ({size / 1e6:.1f} MB) to {args.path}.")
+        if not args.watch:
+            if in_memory:
+                print("The decrypted text stays in memory until the file is removed (--remove) or the machine restarts.")
+            else:
+                print("The decrypted text stays on disk until the file is removed (--remove).")
+            return
+        interval = config.NOTEBOOK_WATCH_INTERVAL if config.NOTEBOOK_WATCH_INTERVAL > 0 else 2.0
+        print("Watching for changed pages. Press Ctrl-C (or send SIGTERM) to stop and remove the shared corpus.")
+        while True:
+            time.sleep(interval)
+            if notebook_handler.refresh_changed_pages():
+                notebook_handler.publish_shared_corpus(args.path)
+                print(f"Republished {len(notebook_handler.get_notebook_data())} page(s) to {args.path}.")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.watch and remove_corpus(args.path):
+            print(f"Removed {args.path}.")
+
+
+if __name__ == "__main__":
+    main()
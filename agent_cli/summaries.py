@@ -0,0 +1,404 @@
+'''Encrypted page and notebook summaries stored alongside the notebook pages.
+
+A page `Garden___Page001.txt.enc` may have a summary file
+`Garden___Page001.summary.enc` next to it, and the notebook a summary file
+`Garden.notebook.enc`. Each is an encrypted JSON document recording the
+summary text, how it was produced and a SHA-256 of the text it describes
+(the page text, or for a notebook the hashes of all its pages in filename
+order). A summary whose hash no longer matches is treated as missing, so
+editing a page never leaves a stale summary in use.
+
+Summaries are generated at ingest time by `summarise_directory()`: with a
+model configured, pages are summarised in parallel under a request rate
+limit; otherwise cheap extractive summaries are written. Only pages whose
+hash changed (or whose summary is extractive while a model is configured)
+are summarised again.
+
+Summary files do not end in `.txt.enc`, so page listings ignore them, while
+key rotation (which handles every `.enc` file) re-encrypts them too.
+'''
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from . import config
+from . import encryption_service
+
+PAGE_SUFFIX = ".txt.enc"
+SUMMARY_SUFFIX = ".summary.enc"
+NOTEBOOK_SUMMARY_SUFFIX = ".notebook.enc"
+SUFFIXES = (SUMMARY_SUFFIX, NOTEBOOK_SUMMARY_SUFFIX)
+# Length of the extractive summaries written when no model is used.
+EXTRACTIVE_SUMMARY_CHARS = 300
+EXTRACTIVE_NOTEBOOK_SUMMARY_CHARS = 2000
+
+SOURCE_EXTRACTIVE = "extractive"
+
+PAGE_SUMMARY_PROMPT = (
+    "Summarise this handwritten notebook page transcription in at most three sentences. "
+    "Name the people, places, dates and tasks it mentions so the page can be found again later. "
+    "Reply with the summary only.\n\n"
+)
+NOTEBOOK_SUMMARY_PROMPT = (
+    "Below are summaries of the pages of one notebook, in page order. Write a short overview "
+    "(at most ten sentences) of what the notebook contains and which pages cover what. "
+    "Reply with the overview only.\n\n"
+)
+
+_PAGE_NAME_RE = re.compile(r"(\w+)___Page(\d+)\.txt\.enc$")
+
+
+def summary_filename(page_filename: str) -> str:
+    """Returns the summary filename for a page filename.
+
+    Args:
+        page_filename (str): e.g. "Garden___Page001.txt.enc".
+
+    Returns:
+        str: e.g. "Garden___Page001.summary.enc".
+    """
+    if page_filename.endswith(PAGE_SUFFIX):
+        return page_filename[:-len(PAGE_SUFFIX)] + SUMMARY_SUFFIX
+    return page_filename + SUMMARY_SUFFIX
+
+
+def page_hash(text: str) -> str:
+    """Returns the SHA-256 hex digest of a page's decrypted text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def extractive_summary(text: str, max_chars: int = EXTRACTIVE_SUMMARY_CHARS) -> str:
+    """Returns a cheap summary: the start of the page with whitespace collapsed.
+
+    Transcriptions tend to open with the page's topic (a heading, a name or a
+    date), which is what page selection needs most.
+
+    Args:
+        text (str): The page text.
+        max_chars (int): Maximum summary length.
+
+    Returns:
+        str: The summary.
+    """
+    collapsed = re.sub(r"\s+", " ", text).strip()
+    if len(collapsed) <= max_chars:
+        return collapsed
+    cut = collapsed.rfind(" ", 0, max_chars)
+    return collapsed[:cut if cut > 0 else max_chars] + " ..."
+
+
+def write_summary(directory: str, page_filename: str, page_text: str, summary: str,
+                  source: str = SOURCE_EXTRACTIVE) -> str:
+    """Encrypts and atomically writes the summary of a page.
+
+    Args:
+        directory (str): The notebook context directory.
+        page_filename (str): The page the summary describes.
+        page_text (str): The page's decrypted text, used for the staleness hash.
+        summary (str): The summary text.
+        source (str): How the summary was produced, e.g. "extractive" or a model name.
+
+    Returns:
+        str: Path of the summary file.
+    """
+    document = {"page_sha256": page_hash(page_text), "source": source, "summary": summary}
+    path = os.path.join(directory, summary_filename(page_filename))
+    encryption_service.encrypt_file(path, json.dumps(document).encode('utf-8'))
+    return path
+
+
+def read_summary_document(path: str) -> Optional[Dict[str, Any]]:
+    """Reads and decrypts a summary file.
+
+    Returns:
+        Optional[Dict[str, Any]]: The summary document, or None if it is missing or unreadable.
+    """
+    try:
+        document = json.loads(encryption_service.decrypt_file(path).decode('utf-8'))
+    except Exception: # Missing, corrupt or encrypted with an unknown key.
+        return None
+    return document if isinstance(document, dict) and isinstance(document.get("summary"), str) else None
+
+
+def read_summary(directory: str, page_filename: str, page_text: str) -> Optional[str]:
+    """Returns the summary of a page if one exists and matches the page's current text.
+
+    Args:
+        directory (str): The notebook context directory.
+        page_filename (str): The page filename.
+        page_text (str): The page's decrypted text.
+
+    Returns:
+        Optional[str]: The summary, or None if missing, unreadable or stale.
+    """
+    document = read_summary_document(os.path.join(directory, summary_filename(page_filename)))
+    if document is None or document.get("page_sha256") != page_hash(page_text):
+        return None
+    return document["summary"]
+
+
+def notebook_summary_filename(notebook_id: str) -> str:
+    """Returns the summary filename of a notebook, e.g. "Garden.notebook.enc"."""
+    return notebook_id + NOTEBOOK_SUMMARY_SUFFIX
+
+
+def notebook_hash(page_hashes: Iterable[str]) -> str:
+    """Returns the hash a notebook summary is checked against.
+
+    Args:
+        page_hashes (Iterable[str]): `page_hash()` of each page, in filename order.
+
+    Returns:
+        str: SHA-256 hex digest over the page hashes.
+    """
+    return hashlib.sha256("\n".join(page_hashes).encode('ascii')).hexdigest()
+
+
+def write_notebook_summary(directory: str, notebook_id: str, pages_hash: str, summary: str,
+                           source: str = SOURCE_EXTRACTIVE) -> str:
+    """Encrypts and atomically writes the summary of a notebook.
+
+    Args:
+        directory (str): The notebook context directory.
+        notebook_id (str): The notebook the summary describes.
+        pages_hash (str): `notebook_hash()` of the notebook's pages.
+        summary (str): The summary text.
+        source (str): How the summary was produced.
+
+    Returns:
+        str: Path of the summary file.
+    """
+    document = {"pages_sha256": pages_hash, "source": source, "summary": summary}
+    path = os.path.join(directory, notebook_summary_filename(notebook_id))
+    encryption_service.encrypt_file(path, json.dumps(document).encode('utf-8'))
+    return path
+
+
+def read_notebook_summary(directory: str, notebook_id: str, pages_hash: str) -> Optional[str]:
+    """Returns the summary of a notebook if one exists and matches its current pages.
+
+    Args:
+        directory (str): The notebook context directory.
+        notebook_id (str): The notebook id.
+        pages_hash (str): `notebook_hash()` of the notebook's current pages.
+
+    Returns:
+        Optional[str]: The summary, or None if missing, unreadable or stale.
+    """
+    document = read_summary_document(os.path.join(directory, notebook_summary_filename(notebook_id)))
+    if document is None or document.get("pages_sha256") != pages_hash:
+        return None
+    return document["summary"]
+
+
+def extractive_notebook_summary(page_summaries: List[Tuple[int, str]],
+                                max_chars: int = EXTRACTIVE_NOTEBOOK_SUMMARY_CHARS) -> str:
+    """Returns a cheap notebook summary: its page summaries, one line each, truncated.
+
+    Args:
+        page_summaries (List[Tuple[int, str]]): (page number, summary) pairs in page order.
+        max_chars (int): Maximum summary length.
+
+    Returns:
+        str: The summary.
+    """
+    text = f"{len(page_summaries)} page(s). " + " ".join(
+        f"Page {number}: {summary}" for number, summary in page_summaries)
+    return extractive_summary(text, max_chars)
+
+
+class RateLimiter:
+    """Spaces out calls so that no more than `per_minute` start in any minute.
+
+    Safe to share between threads; `wait()` blocks the caller until its slot.
+    A rate of 0 or less disables limiting.
+    """
+
+    def __init__(self, per_minute: float) -> None:
+        self._interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Blocks until the caller may make its call."""
+        if not self._interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def model_summariser(model_name: str) -> Callable[[str, str], str]:
+    """Returns a function that sends a summary prompt and text to `model_name`.
+
+    The returned function takes (prompt, text) and returns the model's reply,
+    raising ValueError if the reply is empty.
+    """
+    def summarise(prompt: str, text: str) -> str:
+        response = config.get_genai().GenerativeModel(model_name).generate_content(prompt + text)
+        summary = (response.text or "").strip()
+        if not summary:
+            raise ValueError("the model returned an empty summary")
+        return summary
+    return summarise
+
+
+class SummaryReport(NamedTuple):
+    """Outcome of one `summarise_directory()` run."""
+    pages_generated: int
+    pages_unchanged: int
+    pages_failed: int
+    notebooks_generated: int
+    notebooks_unchanged: int
+    changed_pages: List[str]
+    errors: List[str]
+    elapsed_s: float
+
+    def describe(self) -> str:
+        """Returns a one-line summary of the run."""
+        failed = f", {self.pages_failed} fell back to extractive" if self.pages_failed else ""
+        return (f"Summaries: {self.pages_generated} page(s) generated, {self.pages_unchanged} unchanged{failed}; "
+                f"{self.notebooks_generated} notebook(s) generated, {self.notebooks_unchanged} unchanged "
+                f"({self.elapsed_s:.1f}s).")
+
+
+def _needs_refresh(document: Optional[Dict[str, Any]], hash_key: str, current_hash: str,
+                   model_name: Optional[str]) -> bool:
+    if document is None or document.get(hash_key) != current_hash:
+        return True
+    # Upgrade extractive summaries once a model is configured; never downgrade.
+    return bool(model_name) and document.get("source") == SOURCE_EXTRACTIVE
+
+
+def summarise_directory(
+    directory: str,
+    known_texts: Optional[Dict[str, str]] = None,
+    model_name: Optional[str] = None,
+    workers: int = 4,
+    requests_per_minute: float = 60.0,
+    summariser: Optional[Callable[[str, str], str]] = None,
+) -> SummaryReport:
+    """Brings the page and notebook summaries of a directory up to date.
+
+    Pages whose summary matches their current hash are skipped. The rest are
+    summarised by `workers` threads, with model calls spaced by a shared
+    RateLimiter. A page whose model call fails gets an extractive summary, so
+    page selection and prompt trimming always have something to use. Each
+    notebook's summary is rebuilt from its page summaries when any of its
+    pages changed.
+
+    Args:
+        directory (str): The notebook context directory.
+        known_texts (Optional[Dict[str, str]]): Decrypted page texts already at hand, by
+            filename; other pages are decrypted from disk.
+        model_name (Optional[str]): Model to summarise with; None or "" writes extractive summaries.
+        workers (int): Parallel summarisation threads.
+        requests_per_minute (float): Maximum model calls started per minute (0 for no limit).
+        summariser (Optional[Callable[[str, str], str]]): Replaces the model call; takes
+            (prompt, text). Defaults to `model_summariser(model_name)`.
+
+    Returns:
+        SummaryReport: What was generated, skipped or failed.
+    """
+    start = time.perf_counter()
+    known_texts = known_texts or {}
+    if model_name and summariser is None:
+        summariser = model_summariser(model_name)
+    source = model_name if model_name else SOURCE_EXTRACTIVE
+    limiter = RateLimiter(requests_per_minute if model_name else 0)
+    errors: List[str] = []
+
+    # notebook_id -> [(page_number, filename, text)]
+    notebooks: Dict[str, List[Tuple[int, str, str]]] = {}
+    for filename in sorted(os.listdir(directory)):
+        match = _PAGE_NAME_RE.match(filename)
+        if not match:
+            continue
+        text = known_texts.get(filename)
+        if text is None:
+            try:
+                text = encryption_service.decrypt_file(os.path.join(directory, filename)).decode('utf-8')
+            except Exception as e:
+                errors.append(f"{filename}: could not decrypt ({e})")
+                continue
+        notebooks.setdefault(match.group(1), []).append((int(match.group(2)), filename, text))
+
+    def summarise_page(filename: str, text: str) -> Tuple[str, bool]:
+        if summariser is not None:
+            try:
+                limiter.wait()
+                summary = summariser(PAGE_SUMMARY_PROMPT, text)
+                write_summary(directory, filename, text, summary, source)
+                return summary, True
+            except Exception as e:
+                errors.append(f"{filename}: {e}")
+        summary = extractive_summary(text)
+        write_summary(directory, filename, text, summary, SOURCE_EXTRACTIVE)
+        return summary, summariser is None
+
+    page_summaries: Dict[str, str] = {}
+    changed_pages: List[str] = []
+    generated = failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {}
+        for pages in notebooks.values():
+            for _, filename, text in pages:
+                document = read_summary_document(os.path.join(directory, summary_filename(filename)))
+                if _needs_refresh(document, "page_sha256", page_hash(text), model_name):
+                    futures[filename] = executor.submit(summarise_page, filename, text)
+                else:
+                    page_summaries[filename] = document["summary"]
+        for filename, future in futures.items():
+            try:
+                page_summaries[filename], succeeded = future.result()
+            except Exception as e: # Writing the summary failed.
+                errors.append(f"{filename}: could not write summary ({e})")
+                failed += 1
+                continue
+            changed_pages.append(filename)
+            if succeeded:
+                generated += 1
+            else:
+                failed += 1
+
+    notebooks_generated = notebooks_unchanged = 0
+    for notebook_id, pages in sorted(notebooks.items()):
+        pages.sort()
+        pages_hash = notebook_hash(page_hash(text) for _, _, text in sorted(pages, key=lambda page: page[1]))
+        document = read_summary_document(os.path.join(directory, notebook_summary_filename(notebook_id)))
+        if not _needs_refresh(document, "pages_sha256", pages_hash, model_name):
+            notebooks_unchanged += 1
+            continue
+        numbered = [(number, page_summaries[filename]) for number, filename, _ in pages if filename in page_summaries]
+        summary, notebook_source = extractive_notebook_summary(numbered), SOURCE_EXTRACTIVE
+        if summariser is not None:
+            try:
+                limiter.wait()
+                summary = summariser(NOTEBOOK_SUMMARY_PROMPT, "\n".join(f"Page {n}: {s}" for n, s in numbered))
+                notebook_source = source
+            except Exception as e:
+                errors.append(f"{notebook_summary_filename(notebook_id)}: {e}")
+        try:
+            write_notebook_summary(directory, notebook_id, pages_hash, summary, notebook_source)
+            notebooks_generated += 1
+        except Exception as e:
+            errors.append(f"{notebook_summary_filename(notebook_id)}: could not write summary ({e})")
+
+    return SummaryReport(
+        pages_generated=generated,
+        pages_unchanged=sum(len(pages) for pages in notebooks.values()) - len(futures),
+        pages_failed=failed,
+        notebooks_generated=notebooks_generated,
+        notebooks_unchanged=notebooks_unchanged,
+        changed_pages=changed_pages,
+        errors=errors,
+        elapsed_s=time.perf_counter() - start,
+    )
@@ -0,0 +1,179 @@
+'''Lightweight tracing for Agent-G.
+
+`span("stage.name")` times a block of code. Finished spans are kept in memory
+for per-session percentiles (shown by the CLI's `/stats` command) and, when
+AGENT_G_TRACE_FILE is set, appended to that file as JSON lines:
+
+    {"type": "span", "name": "llm.api_call", "trace_id": "...", "span_id": "...",
+     "parent_id": "...", "start": 1718000000.12, "duration_ms": 812.4,
+     "attrs": {"prompt_tokens": 10234, "response_tokens": 87}}
+
+Spans nest per thread; the outermost span's id becomes the trace id of every
+span inside it, so one chat turn can be followed across modules. Attributes
+carry sizes and counts only, never prompt or notebook text.
+'''
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+TRACE_FILE: Optional[str] = os.getenv("AGENT_G_TRACE_FILE") or None
+# Durations kept per stage for percentiles; older samples are dropped.
+MAX_SAMPLES_PER_STAGE = 10000
+
+_lock = threading.Lock()
+_durations: Dict[str, List[float]] = {}
+_counters: Dict[str, float] = {}
+_local = threading.local()
+
+
+class Span:
+    """One timed operation. Use `set()` to attach attributes while it runs."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "duration_ms", "attrs")
+
+    def __init__(self, name: str, parent: Optional["Span"], attrs: Dict[str, Any]) -> None:
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.start = time.time()
+        self.duration_ms = 0.0
+        self.attrs = attrs
+
+    def set(self, **attrs: Any) -> None:
+        """Adds or replaces attributes on the span."""
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the span as a JSON-serialisable record."""
+        return {
+            "type": "span",
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration_ms, 3),
+            "attrs": self.attrs,
+        }
+
+
+def _stack() -> List[Span]:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _emit(record: Dict[str, Any]) -> None:
+    if not TRACE_FILE:
+        return
+    line = json.dumps(record, default=str) + "\n"
+    try:
+        with _lock, open(TRACE_FILE, 'a', encoding='utf-8') as f:
+            f.write(line)
+    except OSError:
+        pass # Tracing must never break the application.
+
+
+def current_span() -> Optional[Span]:
+    """Returns the innermost active span on this thread, if any."""
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span]:
+    """Times the enclosed block as a span named `name`.
+
+    The span is recorded even if the block raises; the exception type is
+    added as the "error" attribute and the exception propagates.
+
+    Args:
+        name (str): Stage name, e.g. "llm.api_call".
+        **attrs: Initial attributes (sizes, counts, flags).
+
+    Yields:
+        Span: The running span.
+    """
+    stack = _stack()
+    current = Span(name, stack[-1] if stack else None, dict(attrs))
+    stack.append(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        current.duration_ms = (time.perf_counter() - start) * 1000
+        stack.pop()
+        with _lock:
+            samples = _durations.setdefault(name, [])
+            samples.append(current.duration_ms)
+            if len(samples) > MAX_SAMPLES_PER_STAGE:
+                del samples[:len(samples) - MAX_SAMPLES_PER_STAGE]
+        _emit(current.to_dict())
+
+
+def add_counter(name: str, value: float) -> None:
+    """Adds to a session-wide counter, e.g. tokens used."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    # Nearest-rank percentile on already sorted data.
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(1, rank)) - 1]
+
+
+def stats() -> Dict[str, Any]:
+    """Summarises the spans and counters recorded in this session.
+
+    Returns:
+        Dict[str, Any]: {"stages": {name: {count, p50_ms, p95_ms, max_ms, total_ms}}, "counters": {...}}
+    """
+    with _lock:
+        durations = {name: sorted(values) for name, values in _durations.items()}
+        counters = dict(_counters)
+    stages = {
+        name: {
+            "count": len(values),
+            "p50_ms": _percentile(values, 0.50),
+            "p95_ms": _percentile(values, 0.95),
+            "max_ms": values[-1],
+            "total_ms": sum(values),
+        }
+        for name, values in durations.items() if values
+    }
+    return {"stages": stages, "counters": counters}
+
+
+def format_stats() -> str:
+    """Returns the session statistics as a printable table."""
+    summary = stats()
+    if not summary["stages"]:
+        return "No timings recorded yet."
+    header = f"{'stage':<32} {'count':>6} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}"
+    lines = [header, "-" * len(header)]
+    for name in sorted(summary["stages"]):
+        s = summary["stages"][name]
+        lines.append(f"{name:<32} {s['count']:>6} {s['p50_ms']:>10.1f} {s['p95_ms']:>10.1f} {s['max_ms']:>10.1f}")
+    if summary["counters"]:
+        lines.append("")
+        for name in sorted(summary["counters"]):
+            lines.append(f"{name}: {summary['counters'][name]:g}")
+    return "\n".join(lines)
+
+
+def reset() -> None:
+    """Discards all recorded samples and counters."""
+    with _lock:
+        _durations.clear()
+        _counters.clear()
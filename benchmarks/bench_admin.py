@@ -0,0 +1,218 @@
+'''Load test of the admin interface served by gunicorn with 1, 4 and 8 workers.
+
+Builds a synthetic encrypted corpus and profiles in a temporary directory,
+serves `dev_tools/admin_interface/wsgi.py` on localhost with each worker
+count, and drives it from several client processes for a fixed time with a
+read-mostly mix:
+
+    50%  view a random notebook page
+    25%  the paginated notebook list (random sort and page)
+    15%  view a random user profile
+    10%  the index page
+
+Each run also checks that sessions work across workers: a page is edited and
+the flash message set on the POST must show up on the redirected GET, which
+is often answered by a different worker. Throughput is in requests per second
+with latency percentiles.
+
+Needs gunicorn (`pip install gunicorn`), so it runs on Linux and macOS only.
+
+Usage:
+    python benchmarks/bench_admin.py [--workers 1 4 8] [--clients 16]
+        [--duration 10] [--pages 2000] [--output results.json]
+'''
+import argparse
+import http.client
+import json
+import math
+import multiprocessing
+import os
+import random
+import re
+import secrets
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+from typing import Any, Dict, List, Optional, Tuple
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+ADMIN_DIR = os.path.join(PROJECT_ROOT, "dev_tools", "admin_interface")
+sys.path.append(SCRIPT_DIR)
+
+from bench_suite import build_corpus, build_profile # Also sets a throwaway ENCRYPTION_KEY if none is set.
+from agent_cli import encryption_service
+
+HOST = "127.0.0.1"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def _request(port: int, method: str, path: str, body: Optional[str] = None,
+             headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+    connection = http.client.HTTPConnection(HOST, port, timeout=30)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+
+def _wait_until_ready(port: int, server: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {server.returncode}")
+        try:
+            if _request(port, "GET", "/")[0] == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("gunicorn did not start in time")
+
+
+def _check_sessions(port: int, page: str) -> bool:
+    """Edits a page and checks the flash message survives the redirect, whichever worker serves it."""
+    body = urllib.parse.urlencode({"notebook_content": "Edited by the admin load test."})
+    status, headers, _ = _request(port, "POST", f"/notebooks/{page}/edit", body,
+                                  {"Content-Type": "application/x-www-form-urlencoded"})
+    cookie = headers.get("Set-Cookie", "").split(";", 1)[0]
+    if status != 302 or not cookie:
+        return False
+    status, _, html = _request(port, "GET", f"/notebooks/{page}", headers={"Cookie": cookie})
+    return status == 200 and b"updated successfully" in html
+
+
+def _client(port: int, pages: List[str], profiles: List[str], notebooks: List[str],
+            duration: float, seed: int) -> List[float]:
+    """Sends requests until `duration` has passed; returns each latency in ms (negative for errors)."""
+    rng = random.Random(seed)
+    latencies: List[float] = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        roll = rng.random()
+        if roll < 0.50:
+            path = f"/notebooks/{rng.choice(pages)}"
+        elif roll < 0.75:
+            sort = rng.choice(("notebook", "page", "name", "size", "modified"))
+            path = f"/notebooks?notebook={rng.choice(notebooks)}&sort={sort}&page={rng.randint(1, 4)}"
+        elif roll < 0.90:
+            path = f"/profiles/{rng.choice(profiles)}"
+        else:
+            path = "/"
+        start = time.perf_counter()
+        try:
+            status = _request(port, "GET", path)[0]
+        except OSError:
+            status = 0
+        elapsed = (time.perf_counter() - start) * 1000
+        latencies.append(elapsed if status == 200 else -elapsed)
+    return latencies
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    return values[max(0, math.ceil(fraction * len(values)) - 1)] if values else 0.0
+
+
+def run(worker_counts: List[int], clients: int, duration: float, pages: int) -> List[Dict[str, Any]]:
+    """Serves the admin interface with each worker count and measures it under load.
+
+    Returns:
+        List[Dict[str, Any]]: One row per worker count with throughput, latency and the session check.
+    """
+    workdir = tempfile.mkdtemp(prefix="agent_g_bench_admin_")
+    rows = []
+    try:
+        notebook_dir = os.path.join(workdir, "notebook_context")
+        profile_dir = os.path.join(workdir, "user_profiles")
+        os.makedirs(notebook_dir)
+        os.makedirs(profile_dir)
+        build_corpus(notebook_dir, pages, 1500)
+        profiles = []
+        for index in range(5):
+            profiles.append(f"bench{index}.json.enc")
+            with open(os.path.join(profile_dir, profiles[-1]), 'wb') as f:
+                f.write(encryption_service.encrypt_data(json.dumps(build_profile(200, seed=index)).encode('utf-8')))
+        page_names = sorted(name for name in os.listdir(notebook_dir) if name.endswith(".txt.enc"))
+        notebooks = sorted({re.sub(r"___Page\d+\.txt\.enc$", "", name) for name in page_names})
+
+        env = dict(os.environ,
+                   ADMIN_SECRET_KEY=secrets.token_hex(32),
+                   ADMIN_NOTEBOOK_CONTEXT_DIR=notebook_dir,
+                   ADMIN_USER_PROFILE_DIR=profile_dir,
+                   ADMIN_IMPORT_STATUS_DIR=os.path.join(workdir, "import_jobs"))
+        for workers in worker_counts:
+            port = _free_port()
+            server = subprocess.Popen(
+                [sys.executable, "-m", "gunicorn", "--workers", str(workers), "--bind", f"{HOST}:{port}",
+                 "--chdir", ADMIN_DIR, "--log-level", "warning", "wsgi:app"],
+                env=env,
+            )
+            try:
+                _wait_until_ready(port, server)
+                sessions_ok = all(_check_sessions(port, page_names[index]) for index in range(5))
+                with multiprocessing.Pool(clients) as pool:
+                    results = pool.starmap(_client, [(port, page_names, profiles, notebooks, duration, seed)
+                                                     for seed in range(clients)])
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+            latencies = sorted(value for result in results for value in result if value >= 0)
+            errors = sum(1 for result in results for value in result if value < 0)
+            rows.append({
+                "workers": workers,
+                "requests": len(latencies) + errors,
+                "errors": errors,
+                "requests_per_second": len(latencies) / duration,
+                "p50_ms": _percentile(latencies, 0.5),
+                "p95_ms": _percentile(latencies, 0.95),
+                "sessions_ok": sessions_ok,
+            })
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return rows
+
+
+def main() -> None:
+    """Parses arguments, runs the load test and prints a table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8], help="gunicorn worker counts to test.")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent client processes.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load per worker count.")
+    parser.add_argument("--pages", type=int, default=2000, help="Notebook pages in the synthetic corpus.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    try:
+        import gunicorn # noqa: F401
+    except ImportError:
+        print("gunicorn is not installed; run `pip install gunicorn` (Linux and macOS only).")
+        sys.exit(1)
+
+    rows = run(args.workers, args.clients, args.duration, args.pages)
+    print(f"{os.cpu_count()} CPU(s), {args.clients} clients, {args.duration:g}s per run")
+    header = f"{'workers':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7} {'sessions':>9}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(f"{row['workers']:>7} {row['requests_per_second']:>9.1f} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+              f"{row['errors']:>7} {'ok' if row['sessions_ok'] else 'FAILED':>9}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"cpus": os.cpu_count(), "clients": args.clients, "duration": args.duration,
+                       "pages": args.pages, "rows": rows}, f, indent=2)
+            f.write("\n")
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+'''Measures what compress-then-encrypt saves on a synthetic archive.
+
+Writes the same synthetic archive (notebook pages, a profile with a long
+conversation history and the system prompt) once per cipher mode and
+compression codec, then reports the bytes on disk and the time to load it all
+back the way the CLI does (notebook_handler.load_transcriptions plus the
+profile and prompt).
+
+The text is drawn from a Zipf-distributed vocabulary so it compresses roughly
+like real prose, not like a repeated sentence.
+
+Usage:
+    python benchmarks/bench_compression.py [--pages 5000] [--page-bytes 1500]
+        [--history 2000] [--repeat 3] [--output results.json]
+'''
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.append(PROJECT_ROOT)
+
+if not os.getenv("ENCRYPTION_KEY"):
+    # A throwaway key keeps the benchmark self-contained; no real data is touched.
+    from cryptography.fernet import Fernet
+    os.environ["ENCRYPTION_KEY"] = Fernet.generate_key().decode()
+
+from agent_cli import encryption_service
+from agent_cli.handlers import notebook_handler
+
+SYSTEM_PROMPT_SOURCE = os.path.join(PROJECT_ROOT, "agent_cli", "system_prompt.md")
+
+
+class _Prose:
+    """Generates text from a fixed Zipf-distributed vocabulary."""
+
+    def __init__(self, seed: int = 0, vocabulary: int = 5000) -> None:
+        self._rng = random.Random(seed)
+        self._words = ["".join(self._rng.choices(string.ascii_lowercase, k=self._rng.randint(2, 9)))
+                       for _ in range(vocabulary)]
+        self._weights = [1 / rank for rank in range(1, vocabulary + 1)]
+
+    def text(self, size: int) -> str:
+        words: List[str] = []
+        length = 0
+        while length < size:
+            chunk = self._rng.choices(self._words, self._weights, k=64)
+            words.extend(chunk)
+            length += sum(len(word) + 1 for word in chunk)
+        return " ".join(words)[:size]
+
+
+def _codecs() -> List[str]:
+    codecs = [encryption_service.COMPRESSION_OFF, encryption_service.COMPRESSION_ZLIB]
+    if encryption_service._load_zstd() is not None:
+        codecs.append(encryption_service.COMPRESSION_ZSTD)
+    return codecs
+
+
+def _write_archive(directory: str, pages: int, page_bytes: int, history_turns: int) -> None:
+    prose = _Prose()
+    notebook_dir = os.path.join(directory, "notebook_context")
+    os.makedirs(notebook_dir)
+    notebooks = max(1, pages // 200)
+    for index in range(pages):
+        filename = f"Notebook{index % notebooks:03d}___Page{index // notebooks + 1:03d}.txt.enc"
+        with open(os.path.join(notebook_dir, filename), 'wb') as f:
+            f.write(encryption_service.encrypt_data(prose.text(page_bytes).encode('utf-8')))
+    history = []
+    for turn in range(history_turns):
+        history.append({"role": "user", "parts": [{"text": prose.text(80)}]})
+        history.append({"role": "model", "parts": [{"text": prose.text(400)}]})
+    profile = {"preferred_name": "Bench", "pronouns": "they/them", "context": prose.text(300),
+               "conversation_history": history}
+    with open(os.path.join(directory, "profile.json.enc"), 'wb') as f:
+        f.write(encryption_service.encrypt_data(json.dumps(profile, indent=4).encode('utf-8')))
+    with open(SYSTEM_PROMPT_SOURCE, 'rb') as source, open(os.path.join(directory, "system_prompt.md.enc"), 'wb') as f:
+        f.write(encryption_service.encrypt_data(source.read()))
+
+
+def _disk_bytes(directory: str) -> int:
+    return sum(entry.stat().st_size for root, _, files in os.walk(directory)
+               for entry in os.scandir(root) if entry.is_file())
+
+
+def _load_archive(directory: str) -> None:
+    with contextlib.redirect_stdout(io.StringIO()):
+        notebook_handler.load_transcriptions(os.path.join(directory, "notebook_context"))
+    json.loads(encryption_service.decrypt_file(os.path.join(directory, "profile.json.enc")))
+    encryption_service.decrypt_file(os.path.join(directory, "system_prompt.md.enc"))
+
+
+def run(pages: int, page_bytes: int, history_turns: int, repeat: int) -> List[Dict[str, Any]]:
+    """Writes and loads the archive in every cipher mode and codec.
+
+    Returns:
+        List[Dict[str, Any]]: One row per (cipher mode, codec) with bytes and timings.
+    """
+    saved_mode, saved_codec = encryption_service.CIPHER_MODE, encryption_service.COMPRESSION
+    rows = []
+    try:
+        for mode in (encryption_service.CIPHER_MODE_FERNET, encryption_service.CIPHER_MODE_AESGCM):
+            for codec in _codecs():
+                encryption_service.CIPHER_MODE, encryption_service.COMPRESSION = mode, codec
+                workdir = tempfile.mkdtemp(prefix="agent_g_bench_compression_")
+                try:
+                    start = time.perf_counter()
+                    _write_archive(workdir, pages, page_bytes, history_turns)
+                    write_ms = (time.perf_counter() - start) * 1000
+                    timings = []
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        _load_archive(workdir)
+                        timings.append(time.perf_counter() - start)
+                    rows.append({"cipher_mode": mode, "compression": codec, "disk_bytes": _disk_bytes(workdir),
+                                 "write_ms": write_ms, "load_ms": min(timings) * 1000})
+                finally:
+                    notebook_handler._clear_notebook_data()
+                    shutil.rmtree(workdir, ignore_errors=True)
+    finally:
+        encryption_service.CIPHER_MODE, encryption_service.COMPRESSION = saved_mode, saved_codec
+    return rows
+
+
+def main() -> None:
+    """Parses arguments, runs the benchmark and prints a table relative to uncompressed Fernet."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=5000, help="Notebook pages in the archive.")
+    parser.add_argument("--page-bytes", type=int, default=1500, help="Approximate text size of each page.")
+    parser.add_argument("--history", type=int, default=2000, help="User/model exchanges in the profile.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed loads per configuration (best is kept).")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    rows = run(args.pages, args.page_bytes, args.history, args.repeat)
+    reference = rows[0]
+    header = f"{'cipher':<8} {'codec':<6} {'disk MB':>9} {'vs fernet':>10} {'write ms':>10} {'load ms':>10} {'vs fernet':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(f"{row['cipher_mode']:<8} {row['compression']:<6} {row['disk_bytes'] / 1e6:>9.2f} "
+              f"{row['disk_bytes'] / reference['disk_bytes']:>9.0%} {row['write_ms']:>10.0f} "
+              f"{row['load_ms']:>10.0f} {row['load_ms'] / reference['load_ms']:>9.0%}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"pages": args.pages, "page_bytes": args.page_bytes, "history_turns": args.history,
+                       "rows": rows}, f, indent=2)
+            f.write("\n")
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
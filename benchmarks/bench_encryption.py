@@ -0,0 +1,98 @@
+'''Compares the Fernet and raw AES-GCM cipher modes of encryption_service.
+
+Reports ciphertext size overhead and encrypt/decrypt throughput for a range
+of payload sizes, including the streaming file-object path.
+
+Usage:
+    ENCRYPTION_KEY=... python benchmarks/bench_encryption.py [--repeat N]
+'''
+import argparse
+import io
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.append(PROJECT_ROOT)
+
+if not os.getenv("ENCRYPTION_KEY"):
+    # A throwaway key keeps the benchmark self-contained; no real data is touched.
+    from cryptography.fernet import Fernet
+    os.environ["ENCRYPTION_KEY"] = Fernet.generate_key().decode()
+
+from agent_cli import encryption_service
+
+PAYLOAD_SIZES = [1024, 16 * 1024, 256 * 1024, 4 * 1024 * 1024]
+
+
+def _best_of(func: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _make_payload(size: int) -> bytes:
+    # Text-like payload so the numbers resemble real notebook pages.
+    line = b"Water the roses on Tuesdays. The feed is in the shed by the garage key.\n"
+    return (line * (size // len(line) + 1))[:size]
+
+
+def run(repeat: int) -> List[Dict[str, float]]:
+    """Runs the comparison and returns one result row per payload size.
+
+    Args:
+        repeat (int): Number of timed repetitions per measurement; the best is kept.
+
+    Returns:
+        List[Dict[str, float]]: Sizes in bytes and timings in milliseconds.
+    """
+    fernet = encryption_service.get_cipher()
+    results = []
+    for size in PAYLOAD_SIZES:
+        payload = _make_payload(size)
+        fernet_token = fernet.encrypt(payload)
+        raw_blob = encryption_service.encrypt_raw(payload)
+
+        def stream_roundtrip() -> None:
+            sealed = io.BytesIO()
+            encryption_service.encrypt_stream(io.BytesIO(payload), sealed)
+            sealed.seek(0)
+            encryption_service.decrypt_stream(sealed, io.BytesIO())
+
+        results.append({
+            "payload_bytes": size,
+            "fernet_bytes": len(fernet_token),
+            "raw_bytes": len(raw_blob),
+            "fernet_encrypt_ms": _best_of(lambda: fernet.encrypt(payload), repeat) * 1000,
+            "raw_encrypt_ms": _best_of(lambda: encryption_service.encrypt_raw(payload), repeat) * 1000,
+            "fernet_decrypt_ms": _best_of(lambda: fernet.decrypt(fernet_token), repeat) * 1000,
+            "raw_decrypt_ms": _best_of(lambda: encryption_service.decrypt_raw(memoryview(raw_blob)), repeat) * 1000,
+            "raw_stream_roundtrip_ms": _best_of(stream_roundtrip, repeat) * 1000,
+        })
+    return results
+
+
+def main() -> None:
+    """Parses arguments, runs the benchmark and prints a table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Timed repetitions per measurement (best is kept).")
+    args = parser.parse_args()
+
+    header = f"{'payload':>10} {'fernet B':>10} {'raw B':>10} {'enc F ms':>9} {'enc R ms':>9} {'dec F ms':>9} {'dec R ms':>9} {'stream ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in run(args.repeat):
+        print(
+            f"{row['payload_bytes']:>10} {row['fernet_bytes']:>10} {row['raw_bytes']:>10} "
+            f"{row['fernet_encrypt_ms']:>9.3f} {row['raw_encrypt_ms']:>9.3f} "
+            f"{row['fernet_decrypt_ms']:>9.3f} {row['raw_decrypt_ms']:>9.3f} {row['raw_stream_roundtrip_ms']:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+'''Checks and times HashIndex, the near-duplicate lookup used to skip re-takes.
+
+For every distance from 0 to the threshold, queries are built at exactly that
+Hamming distance from a stored hash: some with the differing bits at random,
+and some with them spread one per band, the worst case for the banding (see
+transcription_service/image_hashes.py). Every query must find its hash; the
+script exits with status 1 if one is missed. Lookups are timed against a
+linear scan over all stored hashes, which is what the index replaces.
+
+Usage:
+    python benchmarks/bench_image_hashes.py [--bits 256] [--threshold 40]
+        [--hashes 20000] [--queries 20] [--output results.json]
+'''
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.append(os.path.join(PROJECT_ROOT, "transcription_service"))
+
+import image_hashes
+
+
+def _flip(value: int, positions: List[int]) -> int:
+    for position in positions:
+        value ^= 1 << position
+    return value
+
+
+def _spread_positions(index: image_hashes.HashIndex, distance: int, rng: random.Random) -> List[int]:
+    """One differing bit in each of `distance` bands, so no more than the rest of the bands match."""
+    bands = rng.sample(index._bands, min(distance, len(index._bands)))
+    return [shift + rng.randrange(mask.bit_length()) for shift, mask in bands]
+
+
+def check(bits: int, threshold: int, hashes: int, queries: int, seed: int = 0) -> Dict[str, Any]:
+    """Returns the number of missed queries and the lookup times of the index and a linear scan."""
+    rng = random.Random(seed)
+    index = image_hashes.HashIndex(bits, threshold)
+    stored = {f"image{number:06d}": rng.getrandbits(bits) for number in range(hashes)}
+    for name, value in stored.items():
+        index.add(name, value)
+
+    names = list(stored)
+    misses = []
+    lookups = []
+    for distance in range(min(threshold, bits) + 1):
+        for query in range(queries):
+            name = rng.choice(names)
+            if query % 2 and distance <= len(index._bands):
+                positions = _spread_positions(index, distance, rng)
+            else:
+                positions = rng.sample(range(bits), distance)
+            lookups.append((name, _flip(stored[name], positions)))
+
+    start = time.perf_counter()
+    for name, value in lookups:
+        found = index.nearest(value)
+        # Another stored hash may be as close; only finding nothing at all is a miss.
+        if found is None or found[1] > image_hashes.hamming(value, stored[name]):
+            misses.append((name, image_hashes.hamming(value, stored[name])))
+    index_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _, value in lookups[:max(1, len(lookups) // 20)]:
+        min(image_hashes.hamming(value, other) for other in stored.values())
+    scan_seconds = (time.perf_counter() - start) / max(1, len(lookups) // 20) * len(lookups)
+
+    return {
+        "bits": bits,
+        "threshold": threshold,
+        "bands": len(index._bands),
+        "hashes": hashes,
+        "lookups": len(lookups),
+        "missed": len(misses),
+        "missed_distances": sorted({distance for _, distance in misses}),
+        "index_ms_per_lookup": index_seconds / len(lookups) * 1000,
+        "scan_ms_per_lookup": scan_seconds / len(lookups) * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check and time HashIndex lookups.")
+    parser.add_argument("--bits", type=int, default=256, help="Hash length (default: %(default)s, a 16x16 hash).")
+    parser.add_argument("--threshold", type=int, nargs="+", default=[10, 40],
+                        help="Thresholds to check (default: %(default)s).")
+    parser.add_argument("--hashes", type=int, default=20000, help="Stored hashes (default: %(default)s).")
+    parser.add_argument("--queries", type=int, default=20, help="Queries per distance (default: %(default)s).")
+    parser.add_argument("--output", help="Also write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'threshold':>9} {'bands':>5} {'lookups':>7} {'missed':>6} {'index ms':>9} {'scan ms':>8}")
+    for threshold in args.threshold:
+        result = check(args.bits, threshold, args.hashes, args.queries)
+        results.append(result)
+        print(f"{threshold:>9} {result['bands']:>5} {result['lookups']:>7} {result['missed']:>6} "
+              f"{result['index_ms_per_lookup']:>9.3f} {result['scan_ms_per_lookup']:>8.3f}")
+        if result["missed"]:
+            print(f"  Missed distances: {result['missed_distances']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if any(result["missed"] for result in results) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+'''Measures query latency of the sharded retrieval service as shards are added.
+
+Builds a synthetic archive in memory (no encryption; indexing and querying are
+what is measured), then for each shard count starts a RetrievalService (see
+agent_cli/retrieval_service.py), times indexing and runs the same queries
+against it. Each query's top-k is checked against the in-process ranking the
+two-stage selector uses (prompt_builder.score_pages over every page, with the
+term counts already cached), which is also timed as the baseline.
+
+The vocabulary is Zipf-distributed, so like real notebooks a few terms appear
+on most pages and most terms on few. Sharding pays off when there are CPUs to
+run the shards on; with fewer CPUs than shards the workers take turns and only
+the IPC overhead remains.
+
+Usage:
+    python benchmarks/bench_retrieval.py [--shards 1 2 4 8] [--pages 50000]
+        [--page-words 250] [--queries 200] [--top-k 20] [--output results.json]
+'''
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(SCRIPT_DIR)
+
+import bench_suite # Sets up the import path and a throwaway ENCRYPTION_KEY if none is set.
+from agent_cli import prompt_builder, retrieval_service
+from agent_cli.handlers import notebook_handler
+
+VOCABULARY_SIZE = 50000
+
+
+def _vocabulary(rng: random.Random) -> List[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = {"".join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(VOCABULARY_SIZE * 2)}
+    return sorted(words)[:VOCABULARY_SIZE]
+
+
+def build_store(pages: int, page_words: int, seed: int = 0) -> Tuple[notebook_handler.PageStore, List[str]]:
+    """Returns a store of `pages` synthetic pages over `pages // 200` notebooks, and the vocabulary."""
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(rng)
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    cumulative = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    notebooks = max(1, pages // 200)
+    rows = []
+    for index in range(pages):
+        notebook_id = f"Family{index % notebooks:03d}"
+        text = " ".join(rng.choices(vocabulary, cum_weights=cumulative, k=page_words))
+        rows.append((notebook_id, index // notebooks + 1, f"{notebook_id}___Page{index // notebooks + 1:03d}.txt.enc",
+                     text))
+    return notebook_handler.PageStore(rows), vocabulary
+
+
+def build_queries(vocabulary: List[str], count: int, seed: int = 1) -> List[str]:
+    """Returns questions of 2-5 terms, mixing common and rare ones."""
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(vocabulary[:rng.choice((50, 2000, len(vocabulary)))])
+                     for _ in range(rng.randint(2, 5)))
+            for _ in range(count)]
+
+
+def _in_process(pages: List[Tuple[str, str]], query: str, top_k: int) -> List[Tuple[str, float]]:
+    """The ranking page_selection performs, as (filename, score) pairs in the service's order."""
+    scores = prompt_builder.score_pages(query, [prompt_builder.page_terms(filename, text) for filename, text in pages])
+    scored = [(filename, score) for (filename, _), score in zip(pages, scores) if score]
+    scored.sort(key=lambda hit: (-hit[1], hit[0]))
+    return scored[:top_k]
+
+
+def _latency(timings: List[float]) -> Dict[str, float]:
+    timings = sorted(timings)
+    return {"p50_ms": statistics.median(timings), "p95_ms": timings[int(len(timings) * 0.95) - 1]}
+
+
+def run(shard_counts: List[int], pages: int, page_words: int, queries: int, top_k: int) -> Dict[str, Any]:
+    """Builds the archive, then measures the in-process baseline and each shard count."""
+    store, vocabulary = build_store(pages, page_words)
+    questions = build_queries(vocabulary, queries)
+    formatted = [(record['filename'], notebook_handler.format_page_for_prompt(record)) for record in store]
+
+    start = time.perf_counter()
+    for filename, text in formatted:
+        prompt_builder.page_terms(filename, text)
+    baseline_index_s = time.perf_counter() - start
+    expected, timings = [], []
+    for question in questions:
+        start = time.perf_counter()
+        expected.append(_in_process(formatted, question, top_k))
+        timings.append((time.perf_counter() - start) * 1000)
+    rows = [dict(mode="in-process", shards=1, index_s=baseline_index_s, matches=queries, **_latency(timings))]
+
+    for shards in shard_counts:
+        with retrieval_service.RetrievalService(shards) as service:
+            start = time.perf_counter()
+            service.rebuild(store, shards=range(shards))
+            index_s = time.perf_counter() - start
+            service.search(questions[0], top_k) # Warm up the connections.
+            matches, timings = 0, []
+            for question, want in zip(questions, expected):
+                start = time.perf_counter()
+                hits = service.search(question, top_k)
+                timings.append((time.perf_counter() - start) * 1000)
+                matches += hits == want
+        rows.append(dict(mode="sharded", shards=shards, index_s=index_s, matches=matches, **_latency(timings)))
+    return {"cpus": os.cpu_count(), "rows": rows}
+
+
+def main() -> None:
+    """Parses arguments, runs the benchmark and prints a table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8], help="Shard counts to test.")
+    parser.add_argument("--pages", type=int, default=50000, help="Pages in the synthetic archive.")
+    parser.add_argument("--page-words", type=int, default=250, help="Words per page.")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per shard count.")
+    parser.add_argument("--top-k", type=int, default=20, help="Pages returned per query.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    results = run(args.shards, args.pages, args.page_words, args.queries, args.top_k)
+    print(f"{args.pages} pages, {args.queries} queries, top {args.top_k}, {results['cpus']} CPU(s)")
+    header = f"{'mode':<11} {'shards':>6} {'index s':>8} {'p50 ms':>8} {'p95 ms':>8} {'same top-k':>11}"
+    print(header)
+    print("-" * len(header))
+    for row in results["rows"]:
+        print(f"{row['mode']:<11} {row['shards']:>6} {row['index_s']:>8.1f} {row['p50_ms']:>8.1f} "
+              f"{row['p95_ms']:>8.1f} {row['matches']:>5}/{args.queries}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(dict(results, pages=args.pages, page_words=args.page_words, queries=args.queries,
+                           top_k=args.top_k), f, indent=2)
+            f.write("\n")
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+'''Compares decrypting the notebooks in every process with mapping a shared corpus.
+
+Builds a synthetic encrypted corpus, publishes it once as a shared corpus (see
+agent_cli/shared_corpus.py) and then starts 1, 2, 4 and 8 worker processes in
+each mode:
+
+    decrypt   every worker calls notebook_handler.load_transcriptions()
+    shared    every worker maps the shared corpus with attach_shared_corpus()
+
+Each worker reads every page once, so the whole corpus is resident, then
+prepares a turn the way the CLI does while the user types (every page goes
+into the prompt; the model is an in-process fake). It reports its start-up
+time and how much memory loading the pages and preparing the turn added: its
+proportional set size (PSS, where memory shared by N processes counts 1/N
+towards each) and its private memory. Both modes hold one private copy of
+the prepared prompt; beyond that, with a shared corpus the total PSS should
+stay flat as workers are added, while with per-process decryption it grows
+with every worker.
+
+Memory figures come from /proc/self/smaps_rollup, so they are Linux only;
+elsewhere only start-up times are reported.
+
+Usage:
+    python benchmarks/bench_shared_corpus.py [--workers 1 2 4 8] [--pages 5000]
+        [--page-bytes 1500] [--output results.json]
+'''
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.append(SCRIPT_DIR)
+
+from bench_suite import _FakeGenAI, build_corpus # Also sets a throwaway ENCRYPTION_KEY if none is set.
+from agent_cli import config, encryption_service, llm_service, shared_corpus
+from agent_cli.handlers import notebook_handler, system_prompt_handler
+
+MODES = ("decrypt", "shared")
+
+
+def _memory() -> Optional[Tuple[int, int]]:
+    """Returns this process's (PSS, private) memory in bytes, or None where it cannot be read."""
+    try:
+        with open("/proc/self/smaps_rollup", encoding="ascii") as f:
+            lines = [line.split(":", 1) for line in f if line.rstrip().endswith(" kB")]
+    except OSError:
+        return None
+    kilobytes = {name: int(value.split()[0]) for name, value in lines}
+    return (kilobytes.get("Pss", 0) * 1024,
+            (kilobytes.get("Private_Clean", 0) + kilobytes.get("Private_Dirty", 0)) * 1024)
+
+
+def _prepare_turn() -> object:
+    """Prepares the next turn as the CLI does, with a budget that keeps every page."""
+    config._genai_module = _FakeGenAI
+    return llm_service.prepare_turn(
+        current_user={"preferred_name": "Bench"},
+        conversation_history=[],
+        full_transcribed_text=notebook_handler.get_full_transcribed_text(),
+        notebook_pages=notebook_handler.get_prompt_pages(),
+        token_budget=sys.maxsize,
+        two_stage="off",
+    )
+
+
+def _worker(mode: str, notebook_dir: str, corpus_path: str, prompt_path: str, loaded, done, results) -> None:
+    """Loads the pages in one mode, reads each once, prepares a turn and reports start-up time and memory."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        system_prompt_handler.load_and_decrypt_system_prompt(prompt_path)
+    before = _memory()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == "decrypt":
+            notebook_handler.load_transcriptions(notebook_dir, use_shared=False)
+        else:
+            notebook_handler.attach_shared_corpus(corpus_path)
+    startup_ms = (time.perf_counter() - start) * 1000
+    characters = sum(len(row[3]) for row in notebook_handler.get_notebook_data().rows())
+    prepared = _prepare_turn() # Held, as the CLI holds it until the question arrives.
+    loaded.wait() # Measure once every worker has loaded, so shared pages are split between all of them.
+    after = _memory()
+    results.put({
+        "startup_ms": startup_ms,
+        "characters": characters,
+        "pss": after[0] - before[0] if before and after else None,
+        "private": after[1] - before[1] if before and after else None,
+        "prepared": prepared is not None and prepared.plan is not None,
+    })
+    done.wait()
+
+
+def run_mode(mode: str, workers: int, notebook_dir: str, corpus_path: str, prompt_path: str) -> Dict[str, Any]:
+    """Starts `workers` processes in one mode and summarises what they report."""
+    context = multiprocessing.get_context("spawn") # Fresh interpreters, like separately started workers.
+    loaded, done, results = context.Barrier(workers), context.Barrier(workers + 1), context.Queue()
+    processes = [context.Process(target=_worker, args=(mode, notebook_dir, corpus_path, prompt_path, loaded, done, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    reports = [results.get(timeout=600) for _ in processes]
+    done.wait()
+    for process in processes:
+        process.join()
+    pss = [report["pss"] for report in reports]
+    private = [report["private"] for report in reports]
+    return {
+        "mode": mode,
+        "workers": workers,
+        "startup_ms": statistics.median(report["startup_ms"] for report in reports),
+        "total_pss_mb": sum(pss) / 1e6 if None not in pss else None,
+        "private_per_worker_mb": statistics.mean(private) / 1e6 if None not in private else None,
+        "pages_read_ok": len({report["characters"] for report in reports}) == 1,
+        "turns_prepared": all(report["prepared"] for report in reports),
+    }
+
+
+def run(worker_counts: List[int], pages: int, page_bytes: int) -> Dict[str, Any]:
+    """Builds the corpus, publishes it and measures each mode with each worker count."""
+    workdir = tempfile.mkdtemp(prefix="agent_g_bench_shared_")
+    # The text is synthetic, so the work directory will do where there is no tmpfs.
+    default_path = shared_corpus.default_path()
+    corpus_path = os.path.join(os.path.dirname(default_path) if default_path else workdir,
+                               f"agent_g_bench_corpus_{os.getpid()}.bin")
+    try:
+        notebook_dir = os.path.join(workdir, "notebook_context")
+        os.makedirs(notebook_dir)
+        build_corpus(notebook_dir, pages, page_bytes)
+        prompt_path = os.path.join(workdir, "system_prompt.md.enc")
+        encryption_service.encrypt_file(prompt_path, b"You are Agent-G, a benchmark stand-in.")
+        with contextlib.redirect_stdout(io.StringIO()):
+            notebook_handler.load_transcriptions(notebook_dir, use_shared=False)
+        start = time.perf_counter()
+        size = notebook_handler.publish_shared_corpus(corpus_path)
+        publish_ms = (time.perf_counter() - start) * 1000
+        rows = [run_mode(mode, workers, notebook_dir, corpus_path, prompt_path)
+                for workers in worker_counts for mode in MODES]
+    finally:
+        shared_corpus.remove_corpus(corpus_path)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {"corpus_path": corpus_path, "corpus_mb": size / 1e6, "publish_ms": publish_ms, "rows": rows}
+
+
+def main() -> None:
+    """Parses arguments, runs the benchmark and prints a table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Worker counts to test.")
+    parser.add_argument("--pages", type=int, default=5000, help="Notebook pages in the synthetic corpus.")
+    parser.add_argument("--page-bytes", type=int, default=1500, help="Approximate size of each page.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    results = run(args.workers, args.pages, args.page_bytes)
+    print(f"{args.pages} pages, shared corpus {results['corpus_mb']:.1f} MB in "
+          f"{os.path.dirname(results['corpus_path'])}, published in {results['publish_ms']:.0f} ms")
+    header = f"{'mode':<8} {'workers':>7} {'startup ms':>11} {'total PSS MB':>13} {'private/worker MB':>18}"
+    print(header)
+    print("-" * len(header))
+    for row in results["rows"]:
+        pss = f"{row['total_pss_mb']:.1f}" if row["total_pss_mb"] is not None else "n/a"
+        private = f"{row['private_per_worker_mb']:.1f}" if row["private_per_worker_mb"] is not None else "n/a"
+        check = "" if row["pages_read_ok"] else "  (workers disagree on page text!)"
+        check += "" if row["turns_prepared"] else "  (no turn prepared)"
+        print(f"{row['mode']:<8} {row['workers']:>7} {row['startup_ms']:>11.1f} {pss:>13} {private:>18}{check}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(dict(results, pages=args.pages, page_bytes=args.page_bytes), f, indent=2)
+            f.write("\n")
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+'''Measures import-time start-up cost of the Agent-G entry points.
+
+Each target is imported in a fresh interpreter under `python -X importtime`
+and the cumulative import time of the target module is reported, together
+with its most expensive transitive imports. Runs are repeated and the
+fastest is kept to reduce noise.
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat N] [--top N] [--output results.json]
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+ADMIN_DIR = os.path.join(PROJECT_ROOT, "dev_tools", "admin_interface")
+
+# name -> (module to time, extra sys.path entry)
+TARGETS: Dict[str, Tuple[str, str]] = {
+    "cli": ("agent_cli.cli", PROJECT_ROOT),
+    "encryption_service": ("agent_cli.encryption_service", PROJECT_ROOT),
+    "admin_app": ("app", ADMIN_DIR),
+    "transcribe": ("transcribe", os.path.join(PROJECT_ROOT, "transcription_service")),
+}
+
+
+def _parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    # Lines look like "import time:   self [us] | cumulative | imported package".
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure(module: str, path_entry: str) -> Dict[str, object]:
+    """Imports a module in a fresh interpreter and parses its import timings.
+
+    Args:
+        module (str): Dotted module name to import.
+        path_entry (str): Directory to put at the front of sys.path.
+
+    Returns:
+        Dict[str, object]: Total cumulative microseconds and per-import rows, or an error.
+    """
+    env = dict(os.environ)
+    if not env.get("ENCRYPTION_KEY"):
+        # Any syntactically valid key will do; nothing is decrypted.
+        env["ENCRYPTION_KEY"] = "A" * 43 + "="
+    code = f"import sys; sys.path.insert(0, {path_entry!r}); import {module}"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=path_entry, env=env,
+    )
+    rows = _parse_importtime(proc.stderr)
+    if proc.returncode != 0:
+        last_error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "unknown error"
+        return {"error": last_error}
+    total = next((cumulative for name, _, cumulative in rows if name == module), None)
+    return {"total_us": total, "rows": rows}
+
+
+def run(repeat: int, top: int) -> Dict[str, Dict[str, object]]:
+    """Measures every target, keeping the fastest of `repeat` runs.
+
+    Args:
+        repeat (int): Fresh interpreters launched per target.
+        top (int): Number of most expensive imports to keep per target.
+
+    Returns:
+        Dict[str, Dict[str, object]]: Results keyed by target name.
+    """
+    results: Dict[str, Dict[str, object]] = {}
+    for name, (module, path_entry) in TARGETS.items():
+        best = None
+        for _ in range(repeat):
+            result = measure(module, path_entry)
+            if "error" in result:
+                best = result
+                break
+            if best is None or result["total_us"] < best["total_us"]:
+                best = result
+        if "error" not in best:
+            rows = sorted(best.pop("rows"), key=lambda row: row[1], reverse=True)[:top]
+            best["heaviest_self_us"] = {row_name: self_us for row_name, self_us, _ in rows}
+        results[name] = best
+    return results
+
+
+def main() -> None:
+    """Parses arguments, runs the measurements and prints a summary."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per target (fastest is kept).")
+    parser.add_argument("--top", type=int, default=5, help="Number of heaviest imports to list per target.")
+    parser.add_argument("--output", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    results = run(max(1, args.repeat), args.top)
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<20} skipped ({result['error']})")
+            continue
+        print(f"{name:<20} {result['total_us'] / 1000:8.1f} ms")
+        for import_name, self_us in result["heaviest_self_us"].items():
+            print(f"    {import_name:<40} {self_us / 1000:8.1f} ms self")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
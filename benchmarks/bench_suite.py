@@ -0,0 +1,356 @@
+'''Offline benchmark suite for the Agent-G hot paths.
+
+Builds synthetic encrypted corpora and a profile with a long conversation
+history in a temporary directory, then times:
+
+    load_transcriptions       notebook_handler.load_transcriptions
+    full_transcribed_text     notebook_handler.get_full_transcribed_text
+    find_duplicates           dedup.find_duplicates over every page with no cached
+                              signatures
+    prompt_assembly           llm_service.get_gemini_response with a fake model
+    two_stage_assembly        the same with local two-stage page selection; also
+                              records the estimated notebook tokens before and
+                              after selection
+    save_user_profile         user_profile_handler.save_user_profile
+    prepare_context           utilities/prepare_context.prepare_context
+
+No network access or real data is needed: the Gemini SDK is replaced by an
+in-process fake that returns immediately, and a throwaway ENCRYPTION_KEY is
+generated if none is set. Results are printed as a table and can be written
+as JSON and compared against a stored baseline.
+
+Usage:
+    python benchmarks/bench_suite.py [--pages 1000 10000] [--history 2000]
+        [--repeat N] [--output results.json]
+        [--baseline baseline.json] [--save-baseline baseline.json]
+        [--threshold 0.2] [--fail-on-regression]
+'''
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, "utilities"))
+
+if not os.getenv("ENCRYPTION_KEY"):
+    # A throwaway key keeps the benchmark self-contained; no real data is touched.
+    from cryptography.fernet import Fernet
+    os.environ["ENCRYPTION_KEY"] = Fernet.generate_key().decode()
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+
+from agent_cli import config, dedup, encryption_service, llm_service
+from agent_cli.handlers import notebook_handler, system_prompt_handler, user_profile_handler
+
+DEFAULT_BASELINE_PATH = os.path.join(SCRIPT_DIR, "baselines", "bench_suite.json")
+SYSTEM_PROMPT_SOURCE = os.path.join(PROJECT_ROOT, "agent_cli", "system_prompt.md")
+
+_WORDS = (
+    "water roses tuesday feed shed garage key boiler pressure bins collected "
+    "thursday neighbour spare ladder loft fuse box meter reading greenhouse "
+    "tomatoes compost mower petrol hedge trimmer alarm code hallway cupboard"
+).split()
+
+
+class _FakeGenAI:
+    """Stands in for `google.generativeai`; the model replies immediately."""
+
+    class _Chat:
+        def __init__(self, history: List[Dict[str, Any]]) -> None:
+            self.history = history
+
+        def send_message(self, message: str) -> SimpleNamespace:
+            return SimpleNamespace(text="ok")
+
+    class _Model:
+        def __init__(self, model_name: str, system_instruction: Any = None) -> None:
+            self.system_instruction = system_instruction
+
+        def start_chat(self, history: List[Dict[str, Any]]) -> "_FakeGenAI._Chat":
+            return _FakeGenAI._Chat(history)
+
+    types = SimpleNamespace(ContentDict=dict, PartDict=dict)
+    GenerativeModel = _Model
+
+    @staticmethod
+    def configure(**kwargs: Any) -> None:
+        pass
+
+
+def _synthetic_text(rng: random.Random, size: int) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+
+def build_corpus(directory: str, pages: int, page_bytes: int, seed: int = 0) -> None:
+    """Writes `pages` encrypted synthetic pages spread over several notebooks.
+
+    Fixtures are written directly (no fsync) since their cost is not measured.
+    """
+    rng = random.Random(seed)
+    notebooks = max(1, pages // 200)
+    for index in range(pages):
+        notebook_id = f"Notebook{index % notebooks:03d}"
+        filename = f"{notebook_id}___Page{index // notebooks + 1:03d}.txt.enc"
+        with open(os.path.join(directory, filename), 'wb') as f:
+            f.write(encryption_service.encrypt_data(_synthetic_text(rng, page_bytes).encode('utf-8')))
+
+
+def build_raw_transcriptions(directory: str, pages: int, page_bytes: int, seed: int = 1) -> None:
+    """Writes `pages` plain-text transcriptions, as produced by the transcription service."""
+    rng = random.Random(seed)
+    for index in range(pages):
+        with open(os.path.join(directory, f"Raw___Page{index + 1:03d}.txt"), 'w', encoding='utf-8') as f:
+            f.write(_synthetic_text(rng, page_bytes))
+
+
+def build_profile(turns: int, seed: int = 2) -> Dict[str, Any]:
+    """Returns a profile with `turns` user/model exchanges in its history."""
+    rng = random.Random(seed)
+    history = []
+    for _ in range(turns):
+        history.append({"role": "user", "parts": [{"text": _synthetic_text(rng, 80)}]})
+        history.append({"role": "model", "parts": [{"text": _synthetic_text(rng, 400)}]})
+    return {
+        "preferred_name": "Bench",
+        "pronouns": "they/them",
+        "context": "Synthetic profile used by the benchmark suite.",
+        "conversation_history": history,
+    }
+
+
+def _time(func: Callable[[], object], repeat: int) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()): # The handlers print progress.
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+    return {
+        "best_ms": min(timings) * 1000,
+        "median_ms": statistics.median(timings) * 1000,
+        "runs": len(timings),
+    }
+
+
+def run_size(pages: int, page_bytes: int, history_turns: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    """Builds fixtures for one corpus size and times every stage.
+
+    Args:
+        pages (int): Number of notebook pages in the synthetic corpus.
+        page_bytes (int): Approximate size of each page's text.
+        history_turns (int): Exchanges in the synthetic profile's history.
+        repeat (int): Timed repetitions per stage.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Timings per stage, plus fixture set-up time.
+    """
+    with contextlib.redirect_stdout(io.StringIO()): # It loads the keyring and prints on import.
+        import prepare_context
+
+    workdir = tempfile.mkdtemp(prefix="agent_g_bench_")
+    try:
+        corpus_dir = os.path.join(workdir, "notebook_context")
+        raw_dir = os.path.join(workdir, "raw_transcriptions")
+        prepared_dir = os.path.join(workdir, "prepared_context")
+        profile_dir = os.path.join(workdir, "user_profiles")
+        for directory in (corpus_dir, raw_dir, prepared_dir, profile_dir):
+            os.makedirs(directory)
+
+        setup_start = time.perf_counter()
+        build_corpus(corpus_dir, pages, page_bytes)
+        build_raw_transcriptions(raw_dir, pages, page_bytes)
+        prompt_path = os.path.join(workdir, "system_prompt.md.enc")
+        with open(SYSTEM_PROMPT_SOURCE, 'rb') as f:
+            encryption_service.encrypt_file(prompt_path, f.read())
+        profile = build_profile(history_turns)
+        setup_ms = (time.perf_counter() - setup_start) * 1000
+
+        system_prompt_handler.load_and_decrypt_system_prompt(prompt_path)
+        config._genai_module = _FakeGenAI # Replace the model call; prompt assembly runs for real.
+        user_profile_handler._set_current_user_profile(profile)
+        user_profile_handler._set_conversation_history(profile["conversation_history"])
+
+        results: Dict[str, Dict[str, float]] = {"setup": {"best_ms": setup_ms, "median_ms": setup_ms, "runs": 1}}
+        results["load_transcriptions"] = _time(lambda: notebook_handler.load_transcriptions(corpus_dir), repeat)
+
+        def full_text_uncached() -> str:
+            notebook_handler._set_notebook_data(notebook_handler.get_notebook_data()) # Drops the cached text.
+            return notebook_handler.get_full_transcribed_text()
+
+        results["full_transcribed_text"] = _time(full_text_uncached, repeat)
+
+        def find_duplicates_uncached() -> object:
+            dedup._signature_cache.clear()
+            return dedup.find_duplicates((row[2], row[3]) for row in notebook_handler.get_notebook_data().rows())
+
+        results["find_duplicates"] = _time(find_duplicates_uncached, repeat)
+        results["prompt_assembly"] = _time(lambda: llm_service.get_gemini_response(
+            user_query="Where is the garage key?",
+            current_user=user_profile_handler.get_current_user(),
+            conversation_history=user_profile_handler.get_conversation_history(),
+            full_transcribed_text=notebook_handler.get_full_transcribed_text(),
+            model_name=config.GEMINI_MODEL_NAME,
+            two_stage="off",
+        ), repeat)
+        results["two_stage_assembly"] = _time(lambda: llm_service.get_gemini_response(
+            user_query="Where is the garage key?",
+            current_user=user_profile_handler.get_current_user(),
+            conversation_history=user_profile_handler.get_conversation_history(),
+            notebook_pages=notebook_handler.get_prompt_pages(),
+            model_name=config.GEMINI_MODEL_NAME,
+            two_stage="local",
+        ), repeat)
+        selection = llm_service.get_last_selection()
+        if selection is not None:
+            results["two_stage_assembly"].update(
+                full_context_tokens=selection.full_context_tokens,
+                selected_tokens=selection.selected_tokens,
+            )
+        results["save_user_profile"] = _time(
+            lambda: user_profile_handler.save_user_profile(profile_dir, "bench.json.enc"), repeat)
+
+        prepare_context.RAW_TRANSCRIPTIONS_DIR = raw_dir
+        prepare_context.NOTEBOOK_CONTEXT_DIR = prepared_dir
+        results["prepare_context"] = _time(prepare_context.prepare_context, repeat)
+        return results
+    finally:
+        notebook_handler._clear_notebook_data()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Compares best timings against a baseline run with the same parameters.
+
+    Args:
+        current (Dict[str, Any]): Results of this run.
+        baseline (Dict[str, Any]): Results loaded from the baseline file.
+        threshold (float): Relative slowdown (e.g. 0.2 for 20%) counted as a regression.
+
+    Returns:
+        List[Dict[str, Any]]: One row per corpus size and stage present in both runs.
+    """
+    rows = []
+    for size, stages in current["results"].items():
+        baseline_stages = baseline.get("results", {}).get(size, {})
+        for stage, timing in stages.items():
+            if stage == "setup" or stage not in baseline_stages:
+                continue
+            before = baseline_stages[stage]["best_ms"]
+            after = timing["best_ms"]
+            ratio = after / before if before else float("inf")
+            rows.append({
+                "pages": size,
+                "stage": stage,
+                "baseline_ms": before,
+                "current_ms": after,
+                "ratio": ratio,
+                "regression": ratio > 1 + threshold,
+            })
+    return rows
+
+
+def _load_json(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+
+def main() -> None:
+    """Parses arguments, runs the suite, prints a table and handles baselines."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1000],
+                        help="Corpus sizes to benchmark, e.g. --pages 1000 10000 100000.")
+    parser.add_argument("--page-bytes", type=int, default=1500, help="Approximate text size of each page.")
+    parser.add_argument("--history", type=int, default=500, help="User/model exchanges in the synthetic profile.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed repetitions per stage.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH,
+                        help="Baseline JSON to compare against (default: %(default)s, if it exists).")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE_PATH,
+                        help="Store this run as the baseline (default path if no file is given).")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative slowdown reported as a regression (default: %(default)s).")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on any regression.")
+    args = parser.parse_args()
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cipher_mode": encryption_service.CIPHER_MODE,
+            "page_bytes": args.page_bytes,
+            "history_turns": args.history,
+            "repeat": args.repeat,
+        },
+        "results": {},
+    }
+    for pages in args.pages:
+        print(f"Benchmarking {pages} page(s)...", file=sys.stderr)
+        report["results"][str(pages)] = run_size(pages, args.page_bytes, args.history, args.repeat)
+
+    header = f"{'pages':>8} {'stage':<24} {'best ms':>10} {'median ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for pages, stages in report["results"].items():
+        for stage, timing in stages.items():
+            print(f"{pages:>8} {stage:<24} {timing['best_ms']:>10.2f} {timing['median_ms']:>10.2f}")
+    for pages, stages in report["results"].items():
+        two_stage = stages.get("two_stage_assembly", {})
+        if "full_context_tokens" in two_stage:
+            print(f"{pages:>8} two-stage notebook tokens: ~{two_stage['selected_tokens']} "
+                  f"instead of ~{two_stage['full_context_tokens']}")
+
+    regressions = 0
+    baseline = _load_json(args.baseline) if args.baseline else None
+    if baseline is not None:
+        if {k: baseline.get("meta", {}).get(k) for k in ("page_bytes", "history_turns")} != \
+                {k: report["meta"][k] for k in ("page_bytes", "history_turns")}:
+            print(f"\nWarning: {args.baseline} was recorded with different fixture parameters.")
+        rows = compare(report, baseline, args.threshold)
+        report["comparison"] = {"baseline": args.baseline, "threshold": args.threshold, "rows": rows}
+        print(f"\nCompared with {args.baseline}:")
+        for row in rows:
+            flag = "  REGRESSION" if row["regression"] else ""
+            print(f"{row['pages']:>8} {row['stage']:<24} {row['baseline_ms']:>10.2f} -> {row['current_ms']:>10.2f}"
+                  f"  x{row['ratio']:.2f}{flag}")
+        regressions = sum(row["regression"] for row in rows)
+
+    if args.output:
+        _write_json(args.output, report)
+        print(f"\nResults written to {args.output}")
+    if args.save_baseline:
+        _write_json(args.save_baseline, report)
+        print(f"Baseline saved to {args.save_baseline}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,25 @@ Main Flask application for the Agent-G Admin Interface.
 
 This application provides a web-based interface for managing and inspecting
 project data, including system prompts, notebook contexts, and user profiles.
+
+`create_app()` builds the application. `python app.py` runs it on Flask's
+development server; `wsgi.py` is the entry point for a multi-worker WSGI
+server such as gunicorn. Every worker must share ADMIN_SECRET_KEY, which signs
+the session cookie holding flash messages, and bulk import progress is kept
+in ADMIN_IMPORT_STATUS_DIR so any worker can answer a status poll. The caches
+below are per process, thread-safe, and validated against the files on disk,
+so workers never serve each other's stale data.
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Blueprint, Flask, current_app, render_template, request, redirect, url_for, flash, make_response, session, jsonify, abort
 import sys
 import os
+import json
+import logging
+import tempfile
+from typing import Callable, List, Optional
 from dotenv import load_dotenv
+from werkzeug.http import is_resource_modified
 from werkzeug.utils import secure_filename
 
 # Adjust path to import from agent_cli
@@ -24,22 +37,144 @@ load_dotenv(dotenv_path)
 # encryption_service now handles its own key loading.
 # If it fails to load its key, it will raise an error on import or use.
 from agent_cli.encryption_service import decrypt_data, encrypt_data
+from agent_cli.file_io import atomic_write
+from agent_cli import change_events
 from agent_cli.config import SYSTEM_PROMPT_FILE_PATH # For system prompt path
+from content_cache import DecryptedContentCache, Validators
+from notebook_catalogue import NotebookCatalogue, PAGE_SORT_KEYS, NOTEBOOK_SORT_KEYS
+from bulk_import import BulkImportManager
 
 # Configuration for notebook context
-NOTEBOOK_CONTEXT_DIR = os.path.join(os.path.dirname(__file__), '''../../agent_cli/notebook_context/''')
+NOTEBOOK_CONTEXT_DIR = os.getenv("ADMIN_NOTEBOOK_CONTEXT_DIR",
+                                 os.path.join(os.path.dirname(__file__), '''../../agent_cli/notebook_context/'''))
 if not os.path.exists(NOTEBOOK_CONTEXT_DIR):
     os.makedirs(NOTEBOOK_CONTEXT_DIR)
 
 # Configuration for user profiles
-USER_PROFILE_DIR = os.path.join(os.path.dirname(__file__), '''../../agent_cli/user_profiles/''')
+USER_PROFILE_DIR = os.getenv("ADMIN_USER_PROFILE_DIR",
+                             os.path.join(os.path.dirname(__file__), '''../../agent_cli/user_profiles/'''))
 if not os.path.exists(USER_PROFILE_DIR):
     os.makedirs(USER_PROFILE_DIR)
 
-app = Flask(__name__)
-app.secret_key = os.urandom(24)
+logger = logging.getLogger(__name__)
+
+admin = Blueprint('admin', __name__)
+
+# Upper bound on a single request body, e.g. a bulk import archive.
+ADMIN_MAX_UPLOAD_BYTES = int(os.getenv("ADMIN_MAX_UPLOAD_BYTES", str(256 * 1024 * 1024)))
+# Shared directory for bulk import progress, so every worker can report on any job.
+ADMIN_IMPORT_STATUS_DIR = os.getenv("ADMIN_IMPORT_STATUS_DIR",
+                                    os.path.join(tempfile.gettempdir(), "agent_g_import_jobs"))
+
+# Decrypted file contents, revalidated against mtime/size on every request.
+ADMIN_CACHE_MAX_BYTES = int(os.getenv("ADMIN_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+content_cache = DecryptedContentCache(decrypt_data, max_bytes=ADMIN_CACHE_MAX_BYTES)
+
+# Grouped listing of notebook pages, rebuilt only when the directory changes.
+notebook_catalogue = NotebookCatalogue(NOTEBOOK_CONTEXT_DIR)
+NOTEBOOK_LIST_PER_PAGE_DEFAULT = 50
+NOTEBOOK_LIST_PER_PAGE_MAX = 500
+
+def _notebook_pages_written(written_paths: List[str]) -> None:
+    """Refreshes caches and notifies running CLIs after notebook pages are written.
+
+    Used for single edits and, once per job, for bulk imports. Failing to
+    record the change event only delays the CLI reload, so it is logged
+    rather than reported as a failed save.
+    """
+    for path in written_paths:
+        content_cache.invalidate(path)
+    notebook_catalogue.invalidate()
+    try:
+        change_events.record_changes(NOTEBOOK_CONTEXT_DIR, written_paths)
+    except OSError as e:
+        logger.warning(f"Could not record notebook change event: {e}")
+
+bulk_imports = BulkImportManager(
+    NOTEBOOK_CONTEXT_DIR,
+    encrypt_data,
+    on_complete=_notebook_pages_written,
+    workers=int(os.getenv("ADMIN_IMPORT_WORKERS", "4")),
+    status_dir=ADMIN_IMPORT_STATUS_DIR
+)
+
+def create_app(secret_key: Optional[str] = None, require_secret: bool = False) -> Flask:
+    """Builds the admin Flask application.
 
-@app.route('/')
+    Args:
+        secret_key (Optional[str]): Key signing the session cookie. Defaults to
+            the ADMIN_SECRET_KEY environment variable (also read from agent_cli/.env).
+        require_secret (bool): Refuse to start without a configured key. Set by
+            wsgi.py, since workers with different random keys reject each
+            other's session cookies and lose flash messages.
+
+    Returns:
+        Flask: The configured application.
+
+    Raises:
+        RuntimeError: If `require_secret` is set and no key is configured.
+    """
+    app = Flask(__name__)
+    secret_key = secret_key or os.getenv("ADMIN_SECRET_KEY")
+    if not secret_key:
+        if require_secret:
+            raise RuntimeError("ADMIN_SECRET_KEY must be set when serving the admin interface with several "
+                               "workers. Generate one with: python -c \"import secrets; print(secrets.token_hex(32))\"")
+        logger.warning("ADMIN_SECRET_KEY is not set; using a random key, so sessions end when the server restarts.")
+        secret_key = os.urandom(24).hex()
+    app.secret_key = secret_key
+    app.config['MAX_CONTENT_LENGTH'] = ADMIN_MAX_UPLOAD_BYTES
+    app.register_blueprint(admin)
+    return app
+
+def _pretty_print_json(content: str) -> str:
+    """Pretty-prints JSON content, returning it unchanged if it is not valid JSON."""
+    try:
+        return json.dumps(json.loads(content), indent=4)
+    except json.JSONDecodeError:
+        return content
+
+def _not_modified(validators: Validators) -> bool:
+    """Checks whether the client's cached copy of a page is still current.
+
+    Pending flash messages always force a full response, since they are
+    rendered into the page but are not part of the file's validators.
+    """
+    if session.get('_flashes'):
+        return False
+    return not is_resource_modified(request.environ, etag=validators.etag, last_modified=validators.last_modified)
+
+def _conditional_view(file_path: str, render: Callable[[str], str], view: str = "raw",
+                      transform: Optional[Callable[[str], str]] = None):
+    """Renders a decrypted file with ETag/Last-Modified headers, or returns 304.
+
+    The validators come from the ciphertext, so an unchanged file is answered
+    with 304 Not Modified without being decrypted or rendered.
+
+    Args:
+        file_path (str): Path of the encrypted file.
+        render (Callable[[str], str]): Renders the page from the decrypted text.
+        view (str): Cache view name for the (transformed) text.
+        transform (Optional[Callable[[str], str]]): Applied to the decrypted text before caching.
+
+    Returns:
+        Response: The rendered page or an empty 304 response.
+    """
+    validators = content_cache.get_validators(file_path)
+    if _not_modified(validators):
+        response = make_response("", 304)
+    else:
+        content = content_cache.get(file_path, view=view, transform=transform)
+        validators = content.validators
+        response = make_response(render(content.text))
+    response.set_etag(validators.etag)
+    response.last_modified = validators.last_modified
+    # Revalidate on every visit; the pages hold decrypted data, so keep them out of shared caches.
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@admin.route('/')
 def index() -> str:
     """Renders the main index page of the admin interface.
 
@@ -48,7 +183,7 @@ def index() -> str:
     """
     return render_template('index.html')
 
-@app.route('/view_system_prompt')
+@admin.route('/view_system_prompt')
 def view_system_prompt() -> str:
     """Reads, decrypts, and displays the system prompt.
 
@@ -56,19 +191,17 @@ def view_system_prompt() -> str:
         str: Rendered HTML page displaying the system prompt or an error message.
     """
     try:
-        with open(SYSTEM_PROMPT_FILE_PATH, 'rb') as f:
-            encrypted_prompt = f.read()
-        
-        decrypted_prompt_bytes = decrypt_data(encrypted_prompt)
-        decrypted_prompt = decrypted_prompt_bytes.decode('utf-8')
-        return render_template('view_system_prompt.html', prompt_content=decrypted_prompt)
+        return _conditional_view(
+            SYSTEM_PROMPT_FILE_PATH,
+            lambda decrypted_prompt: render_template('view_system_prompt.html', prompt_content=decrypted_prompt)
+        )
     except FileNotFoundError:
         return render_template('view_system_prompt.html', prompt_content="ERROR: System prompt file not found.")
     except Exception as e:
         # Log the exception e for debugging if necessary
         return render_template('view_system_prompt.html', prompt_content=f"ERROR: Could not decrypt or read system prompt: {str(e)}")
 
-@app.route('/edit_system_prompt', methods=['GET', 'POST'])
+@admin.route('/edit_system_prompt', methods=['GET', 'POST'])
 def edit_system_prompt() -> str:
     """Handles editing and saving the system prompt.
 
@@ -83,11 +216,11 @@ def edit_system_prompt() -> str:
         new_prompt_content = request.form['prompt_content']
         try:
             encrypted_new_prompt = encrypt_data(new_prompt_content.encode('utf-8'))
-            with open(SYSTEM_PROMPT_FILE_PATH, 'wb') as f:
-                f.write(encrypted_new_prompt)
+            atomic_write(SYSTEM_PROMPT_FILE_PATH, encrypted_new_prompt)
+            content_cache.invalidate(SYSTEM_PROMPT_FILE_PATH)
             # Add a success message if desired, e.g., using flash messages
             flash("System prompt updated successfully.", "success")
-            return redirect(url_for('view_system_prompt'))
+            return redirect(url_for('admin.view_system_prompt'))
         except Exception as e:
             # Log error, pass error message to template
             flash(f"Error saving prompt: {str(e)}", "error")
@@ -99,10 +232,7 @@ def edit_system_prompt() -> str:
 
     # GET request logic
     try:
-        with open(SYSTEM_PROMPT_FILE_PATH, 'rb') as f:
-            encrypted_prompt = f.read()
-        decrypted_prompt_bytes = decrypt_data(encrypted_prompt)
-        decrypted_prompt = decrypted_prompt_bytes.decode('utf-8')
+        decrypted_prompt = content_cache.get(SYSTEM_PROMPT_FILE_PATH).text
         return render_template('edit_system_prompt.html', current_prompt_content=decrypted_prompt)
     except FileNotFoundError:
         flash("ERROR: System prompt file not found. Cannot edit.", "error")
@@ -111,25 +241,64 @@ def edit_system_prompt() -> str:
         flash(f"ERROR: Could not decrypt or read system prompt: {str(e)}", "error")
         return render_template('edit_system_prompt.html', current_prompt_content="", error_message=f"ERROR: Could not decrypt or read system prompt: {str(e)}")
 
-@app.route('/notebooks')
+@admin.route('/notebooks')
 def list_notebooks() -> str:
-    """Lists encrypted notebook files from the notebook_context directory.
+    """Lists encrypted notebook pages grouped by notebook, with pagination and sorting.
+
+    Query parameters:
+        notebook: Only list pages of this notebook.
+        sort / order: Page list ordering (see PAGE_SORT_KEYS; "asc" or "desc").
+        nb_sort / nb_order: Notebook summary ordering (see NOTEBOOK_SORT_KEYS).
+        page / per_page: Pagination of the page list.
 
     Returns:
-        str: Rendered HTML page displaying the list of notebook files or an error message.
+        str: Rendered HTML page displaying the catalogue or an error message.
     """
+    notebook_id = request.args.get('notebook') or None
+    sort = request.args.get('sort', 'notebook')
+    if sort not in PAGE_SORT_KEYS:
+        sort = 'notebook'
+    descending = request.args.get('order') == 'desc'
+    nb_sort = request.args.get('nb_sort', 'notebook')
+    if nb_sort not in NOTEBOOK_SORT_KEYS:
+        nb_sort = 'notebook'
+    nb_descending = request.args.get('nb_order') == 'desc'
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', NOTEBOOK_LIST_PER_PAGE_DEFAULT, type=int)
+    per_page = min(max(1, per_page), NOTEBOOK_LIST_PER_PAGE_MAX)
+
+    def list_url(**overrides) -> str:
+        # Links keep the current view state and override only the given parameters.
+        args = dict(notebook=notebook_id, sort=sort, order='desc' if descending else 'asc',
+                    nb_sort=nb_sort, nb_order='desc' if nb_descending else 'asc',
+                    per_page=per_page, page=page)
+        args.update(overrides)
+        return url_for('admin.list_notebooks', **{k: v for k, v in args.items() if v is not None})
+
+    list_args = dict(
+        list_url=list_url, notebooks=[], listing=None, notebook_id=notebook_id, sort=sort,
+        order='desc' if descending else 'asc', nb_sort=nb_sort,
+        nb_order='desc' if nb_descending else 'asc', per_page=per_page,
+        total_files=0, total_size=0, notebook_context_dir=NOTEBOOK_CONTEXT_DIR
+    )
     try:
         if not os.path.exists(NOTEBOOK_CONTEXT_DIR):
             flash(f"Notebook context directory not found: {NOTEBOOK_CONTEXT_DIR}", "error")
-            return render_template('list_notebooks.html', files=[])
-
-        files = [f for f in os.listdir(NOTEBOOK_CONTEXT_DIR) if os.path.isfile(os.path.join(NOTEBOOK_CONTEXT_DIR, f)) and f.endswith(".txt.enc")]
-        return render_template('list_notebooks.html', files=files)
+            return render_template('list_notebooks.html', **list_args)
+
+        snapshot = notebook_catalogue.snapshot()
+        list_args.update(
+            notebooks=snapshot.sorted_notebooks(nb_sort, nb_descending),
+            listing=snapshot.list_pages(notebook_id, sort, descending, page, per_page),
+            total_files=len(snapshot.pages),
+            total_size=snapshot.total_size,
+        )
+        return render_template('list_notebooks.html', **list_args)
     except Exception as e:
         flash(f"Error listing notebook files: {str(e)}", "error")
-        return render_template('list_notebooks.html', files=[])
+        return render_template('list_notebooks.html', **list_args)
 
-@app.route('/notebooks/<filename>')
+@admin.route('/notebooks/<filename>')
 def view_notebook_route(filename: str) -> str:
     """Displays the decrypted content of a specific notebook file.
 
@@ -143,23 +312,19 @@ def view_notebook_route(filename: str) -> str:
     """
     file_path = os.path.join(NOTEBOOK_CONTEXT_DIR, secure_filename(filename))
     try:
-        with open(file_path, 'rb') as f:
-            encrypted_content = f.read()
-        
-        # Directly use the decrypt_data function.
         # If encryption_service.py had an issue loading its key,
-        # an error would likely have occurred during its import,
-        # or this decrypt_data call will fail.
-        decrypted_content_bytes = decrypt_data(encrypted_content)
-        decrypted_content = decrypted_content_bytes.decode('utf-8')
-        return render_template('view_notebook.html', filename=filename, content=decrypted_content, error=False)
+        # decryption inside the cache will fail and is handled below.
+        return _conditional_view(
+            file_path,
+            lambda decrypted_content: render_template('view_notebook.html', filename=filename, content=decrypted_content, error=False)
+        )
     except FileNotFoundError:
         flash(f"Notebook file '{filename}' not found.", "error")
-        return redirect(url_for('list_notebooks'))
+        return redirect(url_for('admin.list_notebooks'))
     except Exception as e:
         # This can catch errors from decrypt_data (e.g., invalid key, corrupted data)
         # or file I/O issues.
-        app.logger.error(f"Error viewing notebook {filename}: {e}", exc_info=True)
+        current_app.logger.error(f"Error viewing notebook {filename}: {e}", exc_info=True)
         flash(f"An error occurred while trying to view notebook '{filename}'. "
               "This could be due to corrupted content, an issue with the encryption key "
               "(ensure ENCRYPTION_KEY in agent_cli/.env is correct and accessible to the encryption service), "
@@ -167,7 +332,7 @@ def view_notebook_route(filename: str) -> str:
         # Optionally, render the error on the same page or redirect
         return render_template('view_notebook.html', filename=filename, content=f"Error: {str(e)}", error=True)
 
-@app.route('/notebooks/<filename>/edit', methods=['GET', 'POST'])
+@admin.route('/notebooks/<filename>/edit', methods=['GET', 'POST'])
 def edit_notebook_route(filename: str) -> str:
     """Handles editing and saving a specific notebook file.
 
@@ -189,10 +354,10 @@ def edit_notebook_route(filename: str) -> str:
         new_content = request.form['notebook_content']
         try:
             encrypted_new_content = encrypt_data(new_content.encode('utf-8'))
-            with open(file_path, 'wb') as f:
-                f.write(encrypted_new_content)
+            atomic_write(file_path, encrypted_new_content)
+            _notebook_pages_written([file_path])
             flash(f"Notebook '{filename}' updated successfully.", "success")
-            return redirect(url_for('view_notebook_route', filename=filename))
+            return redirect(url_for('admin.view_notebook_route', filename=filename))
         except Exception as e:
             flash(f"Error saving notebook: {str(e)}", "error")
             return render_template(
@@ -204,19 +369,16 @@ def edit_notebook_route(filename: str) -> str:
 
     # GET request logic
     try:
-        with open(file_path, 'rb') as f:
-            encrypted_content = f.read()
-        decrypted_content_bytes = decrypt_data(encrypted_content)
-        decrypted_content = decrypted_content_bytes.decode('utf-8')
+        decrypted_content = content_cache.get(file_path).text
         return render_template('edit_notebook.html', filename=filename, current_content=decrypted_content)
     except FileNotFoundError:
         flash(f"Notebook file '{filename}' not found. Cannot edit.", "error")
-        return redirect(url_for('list_notebooks'))
+        return redirect(url_for('admin.list_notebooks'))
     except Exception as e:
         flash(f"ERROR: Could not decrypt or read notebook '{filename}': {str(e)}", "error")
         return render_template('edit_notebook.html', filename=filename, current_content="", error_message=f"ERROR: Could not decrypt or read notebook '{filename}': {str(e)}")
 
-@app.route('/notebooks/new', methods=['GET', 'POST'])
+@admin.route('/notebooks/new', methods=['GET', 'POST'])
 def new_notebook_route() -> str:
     """Handles creating a new notebook file.
 
@@ -248,10 +410,10 @@ def new_notebook_route() -> str:
 
         try:
             encrypted_content = encrypt_data(content.encode('utf-8'))
-            with open(file_path, 'wb') as f:
-                f.write(encrypted_content)
+            atomic_write(file_path, encrypted_content)
+            _notebook_pages_written([file_path])
             flash(f"Notebook '{secure_file}' created successfully.", "success")
-            return redirect(url_for('view_notebook_route', filename=secure_file))
+            return redirect(url_for('admin.view_notebook_route', filename=secure_file))
         except Exception as e:
             flash(f"Error creating notebook: {str(e)}", "error")
             # Pass is_new=True to ensure the template renders correctly for a new file scenario
@@ -263,10 +425,67 @@ def new_notebook_route() -> str:
     # by passing a new flag, e.g., `is_new=True`.
     return render_template('edit_notebook.html', filename="", current_content="", is_new=True)
 
+@admin.route('/notebooks/import', methods=['GET', 'POST'])
+def import_notebooks_route() -> str:
+    """Handles bulk import of raw transcriptions.
+
+    GET: Displays the upload form.
+    POST: Accepts a zip archive and/or several .txt files and starts a background
+          import job that encrypts and writes each page, then redirects to its status page.
+          With "overwrite" ticked, existing pages are replaced, which makes this a bulk edit.
+
+    Returns:
+        str: Rendered HTML page, or a redirect to the job status page.
+    """
+    if request.method == 'POST':
+        uploads = [f for f in request.files.getlist('files') if f and f.filename]
+        if not uploads:
+            flash("Please choose at least one .txt file or .zip archive to import.", "error")
+            return render_template('import_notebooks.html')
+        try:
+            job = bulk_imports.start(uploads, overwrite=bool(request.form.get('overwrite')))
+        except Exception as e:
+            flash(f"Error starting import: {str(e)}", "error")
+            return render_template('import_notebooks.html')
+        return redirect(url_for('admin.import_status_route', job_id=job.job_id))
+
+    return render_template('import_notebooks.html')
+
+@admin.route('/notebooks/import/<job_id>')
+def import_status_route(job_id: str) -> str:
+    """Displays the progress of a bulk import job; the page polls the JSON endpoint.
+
+    Args:
+        job_id (str): The id of the import job.
+
+    Returns:
+        str: Rendered HTML status page, or a redirect if the job is unknown.
+    """
+    job = bulk_imports.get_status(job_id)
+    if job is None:
+        flash(f"Import job '{job_id}' not found. It may have expired.", "error")
+        return redirect(url_for('admin.list_notebooks'))
+    return render_template('import_status.html', job=job)
+
+@admin.route('/notebooks/import/<job_id>/status')
+def import_status_json_route(job_id: str):
+    """Returns the progress of a bulk import job as JSON, for polling.
+
+    Args:
+        job_id (str): The id of the import job.
+
+    Returns:
+        Response: The job snapshot, or 404 if the job is unknown.
+    """
+    job = bulk_imports.get_status(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job)
+
 
 # --- User Profile Management Routes ---
 
-@app.route('/profiles')
+@admin.route('/profiles')
 def list_user_profiles() -> str:
     """Lists encrypted user profile files from the user_profiles directory.
 
@@ -284,7 +503,7 @@ def list_user_profiles() -> str:
         flash(f"Error listing user profiles: {str(e)}", "error")
         return render_template('list_user_profiles.html', profiles=[], user_profile_dir=USER_PROFILE_DIR)
 
-@app.route('/profiles/<filename>')
+@admin.route('/profiles/<filename>')
 def view_user_profile_route(filename: str) -> str:
     """Displays the decrypted content of a specific user profile file.
 
@@ -296,30 +515,25 @@ def view_user_profile_route(filename: str) -> str:
     """
     file_path = os.path.join(USER_PROFILE_DIR, secure_filename(filename))
     try:
-        with open(file_path, 'rb') as f:
-            encrypted_content = f.read()
-        decrypted_content_bytes = decrypt_data(encrypted_content)
-        decrypted_content = decrypted_content_bytes.decode('utf-8')
-        # Attempt to pretty-print JSON for better readability
-        try:
-            import json
-            parsed_json = json.loads(decrypted_content)
-            decrypted_content = json.dumps(parsed_json, indent=4)
-        except json.JSONDecodeError:
-            # If it's not valid JSON, display as is
-            pass
-        return render_template('view_user_profile.html', filename=filename, content=decrypted_content, error=False)
+        # Pretty-print JSON for better readability; the result is cached, so
+        # repeat views skip both decryption and re-formatting.
+        return _conditional_view(
+            file_path,
+            lambda decrypted_content: render_template('view_user_profile.html', filename=filename, content=decrypted_content, error=False),
+            view="pretty",
+            transform=_pretty_print_json
+        )
     except FileNotFoundError:
         flash(f"User profile file '{filename}' not found.", "error")
-        return redirect(url_for('list_user_profiles'))
+        return redirect(url_for('admin.list_user_profiles'))
     except Exception as e:
-        app.logger.error(f"Error viewing user profile {filename}: {e}", exc_info=True)
+        current_app.logger.error(f"Error viewing user profile {filename}: {e}", exc_info=True)
         flash(f"An error occurred while trying to view user profile '{filename}'. "
               "This could be due to corrupted content or an encryption key issue. "
               "Check server logs for details.", "error")
         return render_template('view_user_profile.html', filename=filename, content=f"Error: {str(e)}", error=True)
 
-@app.route('/profiles/<filename>/edit', methods=['GET', 'POST'])
+@admin.route('/profiles/<filename>/edit', methods=['GET', 'POST'])
 def edit_user_profile_route(filename: str) -> str:
     """Handles editing and saving a specific user profile file.
 
@@ -340,14 +554,13 @@ def edit_user_profile_route(filename: str) -> str:
         new_content = request.form['profile_content']
         try:
             # Validate JSON before encrypting
-            import json
             json.loads(new_content) # Will raise an error if not valid JSON
             
             encrypted_new_content = encrypt_data(new_content.encode('utf-8'))
-            with open(file_path, 'wb') as f:
-                f.write(encrypted_new_content)
+            atomic_write(file_path, encrypted_new_content)
+            content_cache.invalidate(file_path)
             flash(f"User profile '{filename}' updated successfully.", "success")
-            return redirect(url_for('view_user_profile_route', filename=filename))
+            return redirect(url_for('admin.view_user_profile_route', filename=filename))
         except json.JSONDecodeError:
             flash("Invalid JSON format. Please ensure the content is valid JSON.", "error")
             return render_template(
@@ -369,19 +582,16 @@ def edit_user_profile_route(filename: str) -> str:
 
     # GET request logic
     try:
-        with open(file_path, 'rb') as f:
-            encrypted_content = f.read()
-        decrypted_content_bytes = decrypt_data(encrypted_content)
-        decrypted_content = decrypted_content_bytes.decode('utf-8')
+        decrypted_content = content_cache.get(file_path).text
         return render_template('edit_user_profile.html', filename=filename, current_content=decrypted_content, is_new=False)
     except FileNotFoundError:
         flash(f"User profile file '{filename}' not found. Cannot edit.", "error")
-        return redirect(url_for('list_user_profiles'))
+        return redirect(url_for('admin.list_user_profiles'))
     except Exception as e:
         flash(f"ERROR: Could not decrypt or read user profile '{filename}': {str(e)}", "error")
         return render_template('edit_user_profile.html', filename=filename, current_content="", error_message=f"Could not read profile: {str(e)}", is_new=False)
 
-@app.route('/profiles/new', methods=['GET', 'POST'])
+@admin.route('/profiles/new', methods=['GET', 'POST'])
 def new_user_profile_route() -> str:
     """Handles creating a new user profile file.
 
@@ -412,14 +622,13 @@ def new_user_profile_route() -> str:
 
         try:
             # Validate JSON before encrypting
-            import json
             json.loads(content) # Will raise an error if not valid JSON
 
             encrypted_content = encrypt_data(content.encode('utf-8'))
-            with open(file_path, 'wb') as f:
-                f.write(encrypted_content)
+            atomic_write(file_path, encrypted_content)
+            content_cache.invalidate(file_path)
             flash(f"User profile '{secure_file}' created successfully.", "success")
-            return redirect(url_for('view_user_profile_route', filename=secure_file))
+            return redirect(url_for('admin.view_user_profile_route', filename=secure_file))
         except json.JSONDecodeError:
             flash("Invalid JSON format. Please ensure the content is valid JSON.", "error")
             return render_template('edit_user_profile.html', filename=filename, current_content=content, error_message="Invalid JSON format.", is_new=True)
@@ -432,7 +641,7 @@ def new_user_profile_route() -> str:
 
 
 if __name__ == '__main__':
-    # Note: Debug mode should be False in a production environment or if exposed.
-    # For local development, True is acceptable.
-    app.run(debug=True)
+    # Flask's development server: one process, with the debugger enabled. Never
+    # expose it; serve wsgi.py with a WSGI server instead (see the README).
+    create_app().run(debug=True)
 
@@ -0,0 +1,337 @@
+"""
+Background bulk import of raw transcriptions for the Agent-G Admin Interface.
+
+An upload (a zip archive and/or several .txt files) is spooled to a private
+temporary directory during the request and then processed by a background
+job: pages are read one at a time, encrypted and written atomically by a
+small thread pool, and progress is recorded on the job so the status page can
+poll it. Caches are refreshed once, when the job finishes.
+
+With a status directory, job snapshots are also written there (at most every
+STATUS_WRITE_INTERVAL seconds while running), so when the admin interface runs
+as several worker processes, a poll answered by another worker still finds
+the job.
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from werkzeug.datastructures import FileStorage
+from werkzeug.utils import secure_filename
+
+from agent_cli.file_io import atomic_write
+
+# Largest single transcription accepted from an upload; guards against zip bombs.
+MAX_PAGE_BYTES = 5 * 1024 * 1024
+# Finished jobs kept for the status page.
+MAX_JOBS_KEPT = 50
+# Maximum errors kept per job; further errors are only counted.
+MAX_ERRORS_KEPT = 200
+# Minimum seconds between status file writes while a job runs.
+STATUS_WRITE_INTERVAL = 0.5
+# Status files older than this are deleted when a new job starts.
+STATUS_FILE_MAX_AGE = 24 * 60 * 60
+
+_JOB_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+
+class BulkImportJob:
+    """Progress and outcome of one bulk import.
+
+    Attributes are updated by the worker thread under the job's lock;
+    `to_dict()` returns a consistent snapshot for the status endpoint.
+    """
+
+    def __init__(self, job_id: str, overwrite: bool) -> None:
+        self.job_id = job_id
+        self.overwrite = overwrite
+        self.status = STATUS_QUEUED
+        self.total = 0
+        self.processed = 0
+        self.imported = 0
+        self.skipped = 0
+        self.failed = 0
+        self.errors: List[str] = []
+        self.message = ""
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def add_total(self, count: int) -> None:
+        """Adds pages discovered in the upload to the expected total."""
+        with self._lock:
+            self.total += count
+
+    def mark_running(self) -> None:
+        """Marks the job as started."""
+        with self._lock:
+            self.status = STATUS_RUNNING
+
+    def finish(self, status: str, message: str) -> None:
+        """Marks the job as finished."""
+        with self._lock:
+            self.status = status
+            self.message = message
+            self.finished_at = time.time()
+
+    def record(self, outcome: str, detail: str = "") -> None:
+        """Records the outcome of one page ("imported", "skipped" or "failed")."""
+        with self._lock:
+            self.processed += 1
+            if outcome == "imported":
+                self.imported += 1
+            elif outcome == "skipped":
+                self.skipped += 1
+            else:
+                self.failed += 1
+            if detail and outcome != "imported" and len(self.errors) < MAX_ERRORS_KEPT:
+                self.errors.append(detail)
+
+    def to_dict(self) -> Dict[str, object]:
+        """Returns a JSON-serialisable snapshot of the job."""
+        with self._lock:
+            elapsed = (self.finished_at or time.time()) - self.created_at
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "total": self.total,
+                "processed": self.processed,
+                "imported": self.imported,
+                "skipped": self.skipped,
+                "failed": self.failed,
+                "errors": list(self.errors),
+                "message": self.message,
+                "overwrite": self.overwrite,
+                "elapsed_seconds": round(elapsed, 2),
+                "done": self.status in (STATUS_COMPLETED, STATUS_FAILED),
+            }
+
+
+def _target_name(name: str) -> Optional[str]:
+    """Maps an uploaded/archived file name to its encrypted page filename."""
+    base = os.path.basename(name.replace("\\", "/"))
+    if not base or base.startswith(".") or not base.endswith(".txt"):
+        return None
+    secure = secure_filename(base)
+    return f"{secure}.enc" if secure else None
+
+
+class BulkImportManager:
+    """Runs bulk imports in background threads and keeps their status.
+
+    Args:
+        notebook_dir (str): Destination directory for encrypted pages.
+        encrypt (Callable[[bytes], bytes]): Encrypts one page.
+        on_complete (Callable[[List[str]], None]): Called once per job with the
+            paths written, to refresh caches and indexes.
+        workers (int): Threads encrypting and writing pages in parallel.
+        status_dir (Optional[str]): Directory shared by all worker processes for
+            job snapshots; None keeps status in this process only.
+    """
+
+    def __init__(self, notebook_dir: str, encrypt: Callable[[bytes], bytes],
+                 on_complete: Callable[[List[str]], None], workers: int = 4,
+                 status_dir: Optional[str] = None) -> None:
+        self.notebook_dir = notebook_dir
+        self._encrypt = encrypt
+        self._on_complete = on_complete
+        self._workers = max(1, workers)
+        self._status_dir = status_dir
+        self._jobs: "OrderedDict[str, BulkImportJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, job_id: str) -> Optional[BulkImportJob]:
+        """Returns a job started by this process by id, or None if it is unknown or has been discarded."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def get_status(self, job_id: str) -> Optional[Dict[str, object]]:
+        """Returns a snapshot of a job started by any worker process, or None if it is unknown.
+
+        Args:
+            job_id (str): The id of the job.
+
+        Returns:
+            Optional[Dict[str, object]]: The job's `to_dict()` snapshot.
+        """
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self._status_dir is None or not _JOB_ID_RE.fullmatch(job_id):
+            return None
+        try:
+            with open(self._status_path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _status_path(self, job_id: str) -> str:
+        return os.path.join(self._status_dir or "", f"{job_id}.json")
+
+    def _write_status(self, job: BulkImportJob) -> None:
+        """Writes the job's snapshot for other worker processes. Failures only cost cross-worker polling."""
+        if self._status_dir is None:
+            return
+        try:
+            atomic_write(self._status_path(job.job_id), json.dumps(job.to_dict()).encode('utf-8'))
+        except OSError:
+            pass
+
+    def _prune_status_files(self) -> None:
+        if self._status_dir is None:
+            return
+        try:
+            os.makedirs(self._status_dir, mode=0o700, exist_ok=True)
+            cutoff = time.time() - STATUS_FILE_MAX_AGE
+            with os.scandir(self._status_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".json") and entry.stat().st_mtime < cutoff:
+                        os.unlink(entry.path)
+        except OSError:
+            pass
+
+    def start(self, uploads: List[FileStorage], overwrite: bool = False) -> BulkImportJob:
+        """Spools the uploaded files to disk and starts a background import.
+
+        Must be called during the request, since uploaded streams are closed
+        once it ends.
+
+        Args:
+            uploads (List[FileStorage]): Uploaded .txt files and/or .zip archives.
+            overwrite (bool): Replace pages that already exist instead of skipping them.
+
+        Returns:
+            BulkImportJob: The new job.
+        """
+        job = BulkImportJob(uuid.uuid4().hex, overwrite)
+        spool_dir = tempfile.mkdtemp(prefix="agent_g_import_")
+        spooled: List[Tuple[str, str]] = []
+        try:
+            for index, upload in enumerate(uploads):
+                if not upload or not upload.filename:
+                    continue
+                spool_path = os.path.join(spool_dir, f"{index:06d}")
+                upload.save(spool_path)
+                spooled.append((upload.filename, spool_path))
+        except Exception:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+            raise
+
+        with self._lock:
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > MAX_JOBS_KEPT:
+                self._jobs.popitem(last=False)
+        self._prune_status_files()
+        self._write_status(job)
+        thread = threading.Thread(target=self._run, args=(job, spooled, spool_dir),
+                                  name=f"bulk-import-{job.job_id[:8]}", daemon=True)
+        thread.start()
+        return job
+
+    def _iter_pages(self, job: BulkImportJob, spooled: List[Tuple[str, str]]) -> Iterator[Tuple[str, str, bytes]]:
+        """Yields (source name, target filename, content) one page at a time."""
+        for original_name, spool_path in spooled:
+            if original_name.lower().endswith(".zip"):
+                try:
+                    with zipfile.ZipFile(spool_path) as archive:
+                        members = [m for m in archive.infolist() if not m.is_dir()]
+                        job.add_total(len(members))
+                        for member in members:
+                            target = _target_name(member.filename)
+                            if "__MACOSX" in member.filename or target is None:
+                                job.record("skipped", f"{member.filename}: not a .txt transcription")
+                                continue
+                            if member.file_size > MAX_PAGE_BYTES:
+                                job.record("failed", f"{member.filename}: larger than {MAX_PAGE_BYTES} bytes")
+                                continue
+                            yield member.filename, target, archive.read(member)
+                except zipfile.BadZipFile:
+                    job.add_total(1)
+                    job.record("failed", f"{original_name}: not a valid zip archive")
+                continue
+
+            job.add_total(1)
+            target = _target_name(original_name)
+            if target is None:
+                job.record("skipped", f"{original_name}: not a .txt transcription")
+                continue
+            if os.path.getsize(spool_path) > MAX_PAGE_BYTES:
+                job.record("failed", f"{original_name}: larger than {MAX_PAGE_BYTES} bytes")
+                continue
+            with open(spool_path, 'rb') as f:
+                yield original_name, target, f.read()
+
+    def _write_page(self, job: BulkImportJob, source: str, target: str, content: bytes) -> Optional[str]:
+        target_path = os.path.join(self.notebook_dir, target)
+        if not job.overwrite and os.path.exists(target_path):
+            job.record("skipped", f"{source}: {target} already exists")
+            return None
+        try:
+            content.decode('utf-8') # Pages must be text; reject binaries early.
+            atomic_write(target_path, self._encrypt(content))
+        except UnicodeDecodeError:
+            job.record("failed", f"{source}: not valid UTF-8 text")
+            return None
+        except Exception as e:
+            job.record("failed", f"{source}: {e}")
+            return None
+        job.record("imported")
+        return target_path
+
+    def _run(self, job: BulkImportJob, spooled: List[Tuple[str, str]], spool_dir: str) -> None:
+        job.mark_running()
+        written: List[str] = []
+        in_flight: Set[Future] = set()
+        seen_targets: Set[str] = set()
+        last_status_write = 0.0
+
+        def report_progress() -> None:
+            nonlocal last_status_write
+            now = time.monotonic()
+            if now - last_status_write >= STATUS_WRITE_INTERVAL:
+                last_status_write = now
+                self._write_status(job)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self._workers) as executor:
+                for source, target, content in self._iter_pages(job, spooled):
+                    if target in seen_targets:
+                        job.record("skipped", f"{source}: {target} appears more than once in the upload")
+                        continue
+                    seen_targets.add(target)
+                    # Bound the pages held in memory while the pool catches up.
+                    if len(in_flight) >= self._workers * 2:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        written.extend(path for path in (f.result() for f in done) if path)
+                        report_progress()
+                    in_flight.add(executor.submit(self._write_page, job, source, target, content))
+                done, _ = wait(in_flight)
+                written.extend(path for path in (f.result() for f in done) if path)
+            status, message = STATUS_COMPLETED, f"Imported {job.imported} page(s)."
+        except Exception as e:
+            status, message = STATUS_FAILED, f"Import failed: {e}"
+        finally:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+        try:
+            # Refresh caches and indexes once for the whole batch.
+            if written:
+                self._on_complete(written)
+        except Exception as e:
+            status, message = STATUS_FAILED, f"{message} Refreshing caches failed: {e}"
+        job.finish(status, message)
+        self._write_status(job)
@@ -0,0 +1,154 @@
+"""
+In-process cache of decrypted files for the Agent-G Admin Interface.
+
+Entries are keyed by path and validated against the file's modification time
+and size on every lookup, so a file changed on disk (by the CLI, a script or
+another process) is never served stale. Memory use is bounded with LRU
+eviction. Validators for HTTP conditional requests are derived from the
+ciphertext, so a 304 can be answered without decrypting anything.
+"""
+
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+StatKey = Tuple[int, int]  # (st_mtime_ns, st_size)
+
+
+class Validators(NamedTuple):
+    """HTTP validators for a file, derived from its ciphertext."""
+    etag: str
+    last_modified: datetime
+
+
+class CachedContent(NamedTuple):
+    """A decrypted (and optionally transformed) file plus its validators."""
+    text: str
+    validators: Validators
+
+
+class DecryptedContentCache:
+    """Bounded LRU cache of decrypted file contents.
+
+    Args:
+        decrypt (Callable[[bytes], bytes]): Function that decrypts a file's ciphertext.
+        max_bytes (int): Approximate upper bound on memory held by cached text.
+    """
+
+    def __init__(self, decrypt: Callable[[bytes], bytes], max_bytes: int = 32 * 1024 * 1024) -> None:
+        self._decrypt = decrypt
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # (path, view) -> (stat key, content, size in bytes)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[StatKey, CachedContent, int]]" = OrderedDict()
+        # path -> (stat key, validators); lets 304s skip decryption entirely
+        self._validators: Dict[str, Tuple[StatKey, Validators]] = {}
+        self._current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _stat_key(path: str) -> Tuple[StatKey, datetime]:
+        st = os.stat(path)
+        last_modified = datetime.fromtimestamp(int(st.st_mtime), tz=timezone.utc)
+        return (st.st_mtime_ns, st.st_size), last_modified
+
+    def _read_validators(self, path: str, stat_key: StatKey, last_modified: datetime, ciphertext: bytes) -> Validators:
+        validators = Validators(hashlib.sha256(ciphertext).hexdigest()[:32], last_modified)
+        with self._lock:
+            self._validators[path] = (stat_key, validators)
+        return validators
+
+    def get_validators(self, path: str) -> Validators:
+        """Returns the ETag and Last-Modified values for a file without decrypting it.
+
+        Args:
+            path (str): Path of the encrypted file.
+
+        Returns:
+            Validators: ETag (a hash of the ciphertext) and modification time.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+        """
+        path = os.path.abspath(path)
+        stat_key, last_modified = self._stat_key(path)
+        with self._lock:
+            cached = self._validators.get(path)
+        if cached and cached[0] == stat_key:
+            return cached[1]
+        with open(path, 'rb') as f:
+            ciphertext = f.read()
+        return self._read_validators(path, stat_key, last_modified, ciphertext)
+
+    def get(self, path: str, view: str = "raw", transform: Optional[Callable[[str], str]] = None) -> CachedContent:
+        """Returns the decrypted text of a file, decrypting only when it has changed.
+
+        Args:
+            path (str): Path of the encrypted file.
+            view (str): Name of the representation being cached (e.g. "raw", "pretty").
+                Different views of the same file are cached separately.
+            transform (Optional[Callable[[str], str]]): Applied to the decrypted text
+                before caching, e.g. JSON pretty-printing.
+
+        Returns:
+            CachedContent: The (transformed) text and the file's validators.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+            Exception: Whatever the decrypt function raises for invalid ciphertext.
+        """
+        path = os.path.abspath(path)
+        stat_key, last_modified = self._stat_key(path)
+        key = (path, view)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == stat_key:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        with open(path, 'rb') as f:
+            ciphertext = f.read()
+        validators = self._read_validators(path, stat_key, last_modified, ciphertext)
+        text = self._decrypt(ciphertext).decode('utf-8')
+        if transform is not None:
+            text = transform(text)
+        content = CachedContent(text, validators)
+
+        size = sys.getsizeof(text)
+        if size <= self._max_bytes:
+            with self._lock:
+                old = self._entries.pop(key, None)
+                if old:
+                    self._current_bytes -= old[2]
+                self._entries[key] = (stat_key, content, size)
+                self._current_bytes += size
+                while self._current_bytes > self._max_bytes:
+                    _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                    self._current_bytes -= evicted_size
+        return content
+
+    def invalidate(self, path: str) -> None:
+        """Drops every cached view of a file. Call after writing to it.
+
+        Args:
+            path (str): Path of the file that was written.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            self._validators.pop(path, None)
+            for key in [key for key in self._entries if key[0] == path]:
+                self._current_bytes -= self._entries.pop(key)[2]
+
+    def clear(self) -> None:
+        """Drops all cached entries."""
+        with self._lock:
+            self._entries.clear()
+            self._validators.clear()
+            self._current_bytes = 0
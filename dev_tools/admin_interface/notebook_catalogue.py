@@ -0,0 +1,201 @@
+"""
+Catalogue of encrypted notebook pages for the Agent-G Admin Interface.
+
+Scans the notebook context directory once with `os.scandir`, groups pages by
+notebook using the same filename rules as the CLI's notebook_handler, and
+keeps the result in memory until the directory's mtime changes. On Linux
+scandir only supplies the file type, so a scan costs one `stat()` per page
+for its size and mtime (Windows returns those with the listing); the cache is
+what keeps that cost off most requests. Creating, renaming or deleting a
+page (including atomic rewrites, which rename a temporary file into place)
+bumps the directory mtime; `invalidate()` covers anything else.
+"""
+
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from agent_cli.handlers.notebook_handler import _parse_filename
+
+PAGE_SORT_KEYS = ("notebook", "page", "name", "size", "modified")
+NOTEBOOK_SORT_KEYS = ("notebook", "pages", "size", "modified")
+
+
+class PageEntry(NamedTuple):
+    """One encrypted notebook page on disk."""
+    filename: str
+    notebook_id: str
+    page_number: int
+    size: int
+    modified: datetime
+
+
+class NotebookSummary(NamedTuple):
+    """Aggregated details for all pages of one notebook."""
+    notebook_id: str
+    page_count: int
+    total_size: int
+    first_page: int
+    last_page: int
+    modified: datetime
+
+
+class PageListing(NamedTuple):
+    """One page of a paginated, sorted page list."""
+    pages: List[PageEntry]
+    page: int
+    per_page: int
+    total_pages: int
+    total_items: int
+
+
+def _page_sort_key(sort: str):
+    if sort == "page":
+        return lambda p: (p.page_number, p.notebook_id, p.filename)
+    if sort == "name":
+        return lambda p: p.filename
+    if sort == "size":
+        return lambda p: (p.size, p.filename)
+    if sort == "modified":
+        return lambda p: (p.modified, p.filename)
+    return lambda p: (p.notebook_id, p.page_number, p.filename)
+
+
+def _notebook_sort_key(sort: str):
+    if sort == "pages":
+        return lambda n: (n.page_count, n.notebook_id)
+    if sort == "size":
+        return lambda n: (n.total_size, n.notebook_id)
+    if sort == "modified":
+        return lambda n: (n.modified, n.notebook_id)
+    return lambda n: n.notebook_id
+
+
+class CatalogueSnapshot:
+    """An immutable view of the directory at one point in time.
+
+    Sorted orderings are computed on first request and memoised, so paging
+    through a large catalogue does not re-sort it on every request.
+    """
+
+    def __init__(self, pages: List[PageEntry]) -> None:
+        self.pages = pages
+        self.total_size = sum(p.size for p in pages)
+        self._by_notebook: Dict[str, List[PageEntry]] = {}
+        for page in pages:
+            self._by_notebook.setdefault(page.notebook_id, []).append(page)
+        self.notebooks: List[NotebookSummary] = [
+            NotebookSummary(
+                notebook_id=notebook_id,
+                page_count=len(notebook_pages),
+                total_size=sum(p.size for p in notebook_pages),
+                first_page=min(p.page_number for p in notebook_pages),
+                last_page=max(p.page_number for p in notebook_pages),
+                modified=max(p.modified for p in notebook_pages),
+            )
+            for notebook_id, notebook_pages in self._by_notebook.items()
+        ]
+        self._sorted_pages: Dict[Tuple[Optional[str], str, bool], List[PageEntry]] = {}
+        self._lock = threading.Lock()
+
+    def sorted_notebooks(self, sort: str = "notebook", descending: bool = False) -> List[NotebookSummary]:
+        """Returns the notebook summaries in the requested order.
+
+        Args:
+            sort (str): One of NOTEBOOK_SORT_KEYS.
+            descending (bool): Reverse the order.
+
+        Returns:
+            List[NotebookSummary]: The sorted summaries.
+        """
+        return sorted(self.notebooks, key=_notebook_sort_key(sort), reverse=descending)
+
+    def list_pages(self, notebook_id: Optional[str] = None, sort: str = "notebook",
+                   descending: bool = False, page: int = 1, per_page: int = 50) -> PageListing:
+        """Returns one page of the sorted page list, optionally for one notebook.
+
+        Args:
+            notebook_id (Optional[str]): Only list pages from this notebook.
+            sort (str): One of PAGE_SORT_KEYS.
+            descending (bool): Reverse the order.
+            page (int): 1-based page of results; clamped to the valid range.
+            per_page (int): Results per page.
+
+        Returns:
+            PageListing: The requested slice plus pagination details.
+        """
+        key = (notebook_id, sort, descending)
+        with self._lock:
+            ordered = self._sorted_pages.get(key)
+        if ordered is None:
+            source = self._by_notebook.get(notebook_id, []) if notebook_id else self.pages
+            ordered = sorted(source, key=_page_sort_key(sort), reverse=descending)
+            with self._lock:
+                self._sorted_pages[key] = ordered
+        total_items = len(ordered)
+        total_pages = max(1, -(-total_items // per_page))
+        page = min(max(1, page), total_pages)
+        start = (page - 1) * per_page
+        return PageListing(ordered[start:start + per_page], page, per_page, total_pages, total_items)
+
+
+class NotebookCatalogue:
+    """Lazily built, mtime-invalidated catalogue of a notebook directory.
+
+    Args:
+        directory (str): The notebook context directory to catalogue.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._snapshot: Optional[CatalogueSnapshot] = None
+        self._snapshot_mtime_ns: Optional[int] = None
+        # Bumped by invalidate(), so a scan that started before it is not kept.
+        self._generation = 0
+
+    def _scan(self) -> CatalogueSnapshot:
+        pages = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".txt.enc") or not entry.is_file():
+                    continue
+                st = entry.stat()
+                notebook_id, page_number = _parse_filename(entry.name)
+                pages.append(PageEntry(
+                    filename=entry.name,
+                    notebook_id=notebook_id,
+                    page_number=page_number,
+                    size=st.st_size,
+                    modified=datetime.fromtimestamp(st.st_mtime),
+                ))
+        return CatalogueSnapshot(pages)
+
+    def snapshot(self) -> CatalogueSnapshot:
+        """Returns the current catalogue, rescanning only if the directory changed.
+
+        Returns:
+            CatalogueSnapshot: The catalogue of the directory.
+
+        Raises:
+            FileNotFoundError: If the directory does not exist.
+        """
+        mtime_ns = os.stat(self.directory).st_mtime_ns
+        with self._lock:
+            if self._snapshot is not None and self._snapshot_mtime_ns == mtime_ns:
+                return self._snapshot
+            generation = self._generation
+        snapshot = self._scan()
+        with self._lock:
+            if self._generation == generation:
+                self._snapshot = snapshot
+                self._snapshot_mtime_ns = mtime_ns
+        return snapshot
+
+    def invalidate(self) -> None:
+        """Forces the next `snapshot()` call to rescan the directory."""
+        with self._lock:
+            self._snapshot = None
+            self._snapshot_mtime_ns = None
+            self._generation += 1
@@ -0,0 +1,14 @@
+"""
+WSGI entry point for serving the Agent-G Admin Interface with several workers.
+
+    cd dev_tools/admin_interface
+    ADMIN_SECRET_KEY=... gunicorn --workers 4 --bind 127.0.0.1:8000 wsgi:app
+
+ADMIN_SECRET_KEY is required here (see `app.create_app()`); it may also be
+set in agent_cli/.env. Keep the bind address on localhost: the interface shows
+decrypted data and has no login of its own.
+"""
+
+from app import create_app
+
+app = create_app(require_secret=True)
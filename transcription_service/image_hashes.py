@@ -0,0 +1,253 @@
+'''Perceptual hashes for spotting re-takes of the same notebook page.
+
+Burst shots and re-takes of a page differ in their pixels, so a content hash
+of the file never matches, but they look the same. A perceptual hash reduces
+each image to a small grayscale thumbnail and keeps only its coarse structure:
+
+    dhash   whether each pixel is brighter than its right-hand neighbour, on a
+            (hash_size + 1) x hash_size thumbnail. Cheap and robust to
+            exposure and compression changes.
+    phash   the sign of the low-frequency DCT coefficients of a
+            4 * hash_size square thumbnail relative to their median. Slower,
+            and more tolerant of small shifts and blur.
+
+Two images whose hashes differ in at most `threshold` bits (their Hamming
+distance) are treated as the same page. HashIndex finds such a match without
+comparing against every stored hash: a hash is split into threshold + 1
+bands, and any hash within the threshold must match at least one band
+exactly (the pigeonhole principle).
+
+Hashes are computed in a process pool, since decoding photos is CPU-bound.
+JPEGs are decoded at reduced scale (`Image.draft`), which does most of the
+downscaling for free.
+'''
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageOps
+import pillow_heif
+
+pillow_heif.register_heif_opener() # Worker processes import this module, not transcribe.py.
+
+METHOD_DHASH = "dhash"
+METHOD_PHASH = "phash"
+METHODS = (METHOD_DHASH, METHOD_PHASH)
+
+CACHE_VERSION = 1
+
+
+def _thumbnail(image_path: str, size: Tuple[int, int]) -> bytes:
+    """Decodes an image as a grayscale thumbnail of `size` and returns its pixels."""
+    with Image.open(image_path) as img:
+        img.draft("L", (size[0] * 8, size[1] * 8)) # Only JPEG honours this; others decode in full.
+        img = ImageOps.exif_transpose(img).convert("L")
+        return img.resize(size, Image.LANCZOS).tobytes()
+
+
+def dhash(image_path: str, hash_size: int = 16) -> int:
+    """Computes the difference hash of an image.
+
+    Args:
+        image_path (str): The image file.
+        hash_size (int): Bits per row and rows; the hash has hash_size ** 2 bits.
+
+    Returns:
+        int: The hash.
+    """
+    width = hash_size + 1
+    pixels = _thumbnail(image_path, (width, hash_size))
+    value = 0
+    for row in range(hash_size):
+        offset = row * width
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return value
+
+
+def _dct_table(size: int, coefficients: int) -> List[List[float]]:
+    # table[x][u] = cos(pi * (2x + 1) * u / (2 * size)), the DCT-II basis.
+    return [[math.cos(math.pi * (2 * x + 1) * u / (2 * size)) for u in range(coefficients)] for x in range(size)]
+
+
+def phash(image_path: str, hash_size: int = 16) -> int:
+    """Computes the DCT-based perceptual hash of an image.
+
+    Args:
+        image_path (str): The image file.
+        hash_size (int): Low-frequency coefficients kept per axis; the hash has hash_size ** 2 bits.
+
+    Returns:
+        int: The hash.
+    """
+    size = hash_size * 4
+    pixels = _thumbnail(image_path, (size, size))
+    table = _dct_table(size, hash_size)
+    # Separable 2-D DCT: first along each row, then down each column.
+    rows = []
+    for y in range(size):
+        line = pixels[y * size:(y + 1) * size]
+        rows.append([sum(line[x] * table[x][u] for x in range(size)) for u in range(hash_size)])
+    coefficients = [sum(rows[y][u] * table[y][v] for y in range(size))
+                    for v in range(hash_size) for u in range(hash_size)]
+    median = sorted(coefficients[1:])[len(coefficients) // 2 - 1] # The DC term is left out.
+    value = 0
+    for coefficient in coefficients:
+        value = (value << 1) | (coefficient > median)
+    return value
+
+
+_HASHERS = {METHOD_DHASH: dhash, METHOD_PHASH: phash}
+
+
+def hamming(first: int, second: int) -> int:
+    """Returns the number of bits in which two hashes differ."""
+    return bin(first ^ second).count("1")
+
+
+def _hash_one(job: Tuple[str, str, int]) -> Tuple[str, Optional[int], Optional[str]]:
+    image_path, method, hash_size = job
+    try:
+        return image_path, _HASHERS[method](image_path, hash_size), None
+    except Exception as e:
+        return image_path, None, str(e)
+
+
+def hash_images(image_paths: Iterable[str], method: str = METHOD_DHASH, hash_size: int = 16,
+                workers: Optional[int] = None) -> Dict[str, Tuple[Optional[int], Optional[str]]]:
+    """Hashes images in a process pool.
+
+    Args:
+        image_paths (Iterable[str]): Image files to hash.
+        method (str): METHOD_DHASH or METHOD_PHASH.
+        hash_size (int): See `dhash()` and `phash()`.
+        workers (Optional[int]): Worker processes; None for one per CPU.
+
+    Returns:
+        Dict[str, Tuple[Optional[int], Optional[str]]]: (hash, None) or (None, error) by image path.
+    """
+    if method not in _HASHERS:
+        raise ValueError(f"Unknown image hash method '{method}'. Use one of: {', '.join(METHODS)}.")
+    jobs = [(path, method, hash_size) for path in image_paths]
+    if not jobs:
+        return {}
+    if len(jobs) == 1 or workers == 1:
+        results = map(_hash_one, jobs)
+        return {path: (value, error) for path, value, error in results}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_hash_one, jobs, chunksize=max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1))))
+        return {path: (value, error) for path, value, error in results}
+
+
+class HashIndex:
+    """Finds a stored hash within a Hamming distance of a query, without a full scan.
+
+    The bits are split into exactly `threshold + 1` bands whose widths differ by
+    at most one bit. Hashes shorter than that are all compared with the query.
+
+    Args:
+        bits (int): Length of the hashes.
+        threshold (int): Largest distance that counts as a match.
+    """
+
+    def __init__(self, bits: int, threshold: int) -> None:
+        self.threshold = threshold
+        bands = threshold + 1
+        # (shift, mask) per band; the first `bits % bands` bands are one bit wider.
+        self._bands: List[Tuple[int, int]] = []
+        if bits >= bands:
+            width, wider = divmod(bits, bands)
+            shift = 0
+            for band in range(bands):
+                band_bits = width + (band < wider)
+                self._bands.append((shift, (1 << band_bits) - 1))
+                shift += band_bits
+        self._hashes: Dict[str, int] = {}
+        self._buckets: Dict[Tuple[int, int], List[str]] = {}
+
+    def _keys(self, value: int) -> Iterable[Tuple[int, int]]:
+        return ((band, (value >> shift) & mask) for band, (shift, mask) in enumerate(self._bands))
+
+    def _candidates(self, value: int) -> Iterable[str]:
+        if not self._bands:
+            return list(self._hashes)
+        return (name for key in self._keys(value) for name in self._buckets.get(key, ()))
+
+    def add(self, name: str, value: int) -> None:
+        """Stores a hash under `name`, replacing any hash stored under it before."""
+        if name in self._hashes:
+            self.remove(name)
+        self._hashes[name] = value
+        for key in self._keys(value):
+            self._buckets.setdefault(key, []).append(name)
+
+    def remove(self, name: str) -> None:
+        """Forgets the hash stored under `name`, if any."""
+        value = self._hashes.pop(name, None)
+        if value is None:
+            return
+        for key in self._keys(value):
+            bucket = self._buckets.get(key)
+            if bucket is not None and name in bucket:
+                bucket.remove(name)
+
+    def nearest(self, value: int, exclude: Optional[str] = None) -> Optional[Tuple[str, int]]:
+        """Returns the closest stored (name, distance) within the threshold, or None.
+
+        Args:
+            value (int): The hash to look up.
+            exclude (Optional[str]): A name never to return, such as the query image itself.
+        """
+        best: Optional[Tuple[str, int]] = None
+        seen = set()
+        for name in self._candidates(value):
+            if name == exclude or name in seen:
+                continue
+            seen.add(name)
+            distance = hamming(value, self._hashes[name])
+            if distance <= self.threshold and (best is None or (distance, name) < (best[1], best[0])):
+                best = (name, distance)
+        return best
+
+
+class HashCache(NamedTuple):
+    """Hashes from earlier runs, so unchanged images are not decoded again.
+
+    `entries` maps image filename to a dict with "size", "mtime_ns", "hash"
+    (hex), "output" (the transcription written for it, or None) and
+    "duplicate_of" (the image it was skipped for, or None).
+    """
+    path: str
+    method: str
+    hash_size: int
+    entries: Dict[str, Dict[str, object]]
+
+    @classmethod
+    def load(cls, path: str, method: str, hash_size: int) -> "HashCache":
+        """Reads the cache, or starts an empty one if it is missing, unreadable or for other settings."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION and data.get("method") == method \
+                    and data.get("hash_size") == hash_size:
+                return cls(path, method, hash_size, dict(data.get("images", {})))
+        except (OSError, ValueError, AttributeError):
+            pass
+        return cls(path, method, hash_size, {})
+
+    def lookup(self, filename: str, stat: os.stat_result) -> Optional[int]:
+        """Returns the cached hash of an image if the file is unchanged since it was hashed."""
+        entry = self.entries.get(filename)
+        if entry and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            return int(str(entry["hash"]), 16)
+        return None
+
+    def save(self) -> None:
+        """Writes the cache atomically."""
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "method": self.method, "hash_size": self.hash_size,
+                       "images": self.entries}, f, indent=2, sort_keys=True)
+        os.replace(temporary, self.path)
@@ -1,25 +1,61 @@
 import os
-import google.generativeai as genai
+import sys
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 from PIL import Image
 import pillow_heif
 import dotenv
 import re
 
+import image_hashes
+
+# The profiler (agent_cli/profiler.py) has no dependencies beyond the standard library.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent_cli import profiler
+
 pillow_heif.register_heif_opener()
 
 dotenv.load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    print("Error: GEMINI_API_KEY not found in .env.")
-    exit()
-genai.configure(api_key=GEMINI_API_KEY)
 
+TRANSCRIPTION_MODEL_NAME = "gemini-2.5-flash-preview-04-17"
 TRANSCRIPTION_TEMPERATURE = 0.7
-transcription_model = genai.GenerativeModel(
-    "gemini-2.5-flash-preview-04-17",
-    generation_config=genai.types.GenerationConfig(temperature=TRANSCRIPTION_TEMPERATURE)
-)
+
+# Perceptual-hash check before transcribing (see image_hashes.py): "skip" does
+# not send images that look like an image already transcribed, "report" only
+# lists them, "off" disables hashing.
+IMAGE_DEDUP_MODE = os.getenv("AGENT_G_IMAGE_DEDUP", "skip").lower()
+IMAGE_HASH_METHOD = os.getenv("AGENT_G_IMAGE_HASH", image_hashes.METHOD_DHASH).lower()
+IMAGE_HASH_SIZE = int(os.getenv("AGENT_G_IMAGE_HASH_SIZE", "16"))
+# Largest Hamming distance (out of IMAGE_HASH_SIZE ** 2 bits) for two images to count as the same page.
+IMAGE_HASH_THRESHOLD = int(os.getenv("AGENT_G_IMAGE_HASH_THRESHOLD", "40"))
+IMAGE_HASH_WORKERS = int(os.getenv("AGENT_G_IMAGE_HASH_WORKERS", "0")) or None # 0: one per CPU
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".heic", ".webp")
+IMAGE_HASH_CACHE_FILENAME = ".image_hashes.json"
+
+# Built on first use so that importing this module (e.g. to reuse its helpers)
+# does not import the Gemini SDK or require an API key.
+_transcription_model: Optional[Any] = None
+
+def get_transcription_model() -> Any:
+    """Configures the Gemini API and builds the transcription model on first use.
+
+    Returns:
+        Any: The configured `genai.GenerativeModel` used for transcription.
+    """
+    global _transcription_model
+    if _transcription_model is None:
+        if not GEMINI_API_KEY:
+            print("Error: GEMINI_API_KEY not found in .env.")
+            exit()
+        import google.generativeai as genai
+        genai.configure(api_key=GEMINI_API_KEY)
+        _transcription_model = genai.GenerativeModel(
+            TRANSCRIPTION_MODEL_NAME,
+            generation_config=genai.types.GenerationConfig(temperature=TRANSCRIPTION_TEMPERATURE)
+        )
+    return _transcription_model
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PICTURES_DIR = os.path.join(BASE_DIR, "pictures")
@@ -52,23 +88,26 @@ def sanitise_filename_component(name_part: str) -> str:
     """
     return str(re.sub(r'[\\/*?:"<>|\[\]]', "", name_part))
 
-def transcribe_image(image_path: str, transcribed_texts_dir: str = TRANSCRIBED_TEXTS_DIR) -> None:
+def transcribe_image(image_path: str, transcribed_texts_dir: str = TRANSCRIBED_TEXTS_DIR) -> Optional[str]:
     """Transcribes a single image using Gemini API and saves the result.
 
     Args:
         image_path (str): The absolute path to the image file.
         transcribed_texts_dir (str): Directory to save the transcription.
             Defaults to TRANSCRIBED_TEXTS_DIR.
+
+    Returns:
+        Optional[str]: The filename of the transcription written, or None if none was.
     """
     try:
         print(f"Processing image: {image_path}...")
         img = Image.open(image_path)
     except FileNotFoundError:
         print(f"Error: Image file not found at {image_path}")
-        return
+        return None
     except Exception as e:
         print(f"Error opening image {image_path}: {e}")
-        return
+        return None
 
     try:
         filename = os.path.basename(image_path)
@@ -77,24 +116,24 @@ def transcribe_image(image_path: str, transcribed_texts_dir: str = TRANSCRIBED_T
         parts = name_part.split('_Page')
         if len(parts) != 2:
             print(f"Warning: Could not parse NotebookIdentifier and PageNumber from filename: {filename}. Skipping.")
-            return
+            return None
 
         notebook_identifier = sanitise_filename_component(parts[0])
         page_number_str = sanitise_filename_component(parts[1])
 
         if not notebook_identifier or not page_number_str.isdigit():
             print(f"Warning: Invalid NotebookIdentifier or PageNumber from filename: {filename} (Parsed: '{notebook_identifier}', '{page_number_str}'). Skipping.")
-            return
+            return None
             
         page_number = int(page_number_str)
 
         print(f"  Sending to Gemini for transcription...")
-        response = transcription_model.generate_content([TRANSCRIPTION_PROMPT, img], stream=False)
+        response = get_transcription_model().generate_content([TRANSCRIPTION_PROMPT, img], stream=False)
         response.resolve()
 
         if not response.candidates or not response.candidates[0].content.parts:
             print(f"  Error: No content returned from Gemini for {filename}.")
-            return
+            return None
             
         transcribed_text = response.text.strip()
 
@@ -104,10 +143,55 @@ def transcribe_image(image_path: str, transcribed_texts_dir: str = TRANSCRIBED_T
         with open(output_filepath, "w", encoding="utf-8") as f:
             f.write(transcribed_text)
         print(f"  Successfully transcribed and saved to: {output_filepath}")
+        return output_filename
 
     except Exception as e:
         print(f"  An error occurred during transcription or saving for {image_path}: {e}")
+        return None
+
+class DedupReport(NamedTuple):
+    """What the perceptual-hash check found in one run of `process_images()`."""
+    images: int
+    hashed: int
+    cached: int
+    errors: List[str]
+    duplicates: List[Tuple[str, str, int]] # (image, image it matches, Hamming distance)
+    skipped: int
+    elapsed_ms: float
 
+    def describe(self) -> str:
+        """Returns a short summary including the API calls avoided."""
+        outcome = (f"{self.skipped} API call(s) avoided" if self.skipped
+                   else "none skipped" if self.duplicates else "no API calls avoided")
+        return (f"Image hashes: {self.images} image(s), {self.hashed} hashed, {self.cached} from cache "
+                f"in {self.elapsed_ms:.0f} ms; {len(self.duplicates)} near-duplicate(s), {outcome}.")
+
+def _hash_images(pictures_dir: str, filenames: List[str], cache: image_hashes.HashCache
+                 ) -> Tuple[Dict[str, int], int, List[str]]:
+    """Returns the hash of every image that could be hashed, the number computed, and errors."""
+    hashes: Dict[str, int] = {}
+    to_hash: Dict[str, os.stat_result] = {}
+    for filename in filenames:
+        stat = os.stat(os.path.join(pictures_dir, filename))
+        cached = cache.lookup(filename, stat)
+        if cached is None:
+            to_hash[filename] = stat
+        else:
+            hashes[filename] = cached
+    results = image_hashes.hash_images((os.path.join(pictures_dir, f) for f in to_hash),
+                                       IMAGE_HASH_METHOD, IMAGE_HASH_SIZE, IMAGE_HASH_WORKERS)
+    errors = []
+    for filename, stat in to_hash.items():
+        value, error = results[os.path.join(pictures_dir, filename)]
+        if value is None:
+            errors.append(f"{filename}: {error}")
+            continue
+        hashes[filename] = value
+        cache.entries[filename] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                   "hash": format(value, "x"), "output": None, "duplicate_of": None}
+    return hashes, len(to_hash), errors
+
+@profiler.profiled("transcribe")
 def process_images(pictures_dir: str = PICTURES_DIR, transcribed_texts_dir: str = TRANSCRIBED_TEXTS_DIR) -> None:
     """Processes all images in the specified directory, transcribes them, and saves the results.
 
@@ -125,17 +209,72 @@ def process_images(pictures_dir: str = PICTURES_DIR, transcribed_texts_dir: str
         print(f"Error: Pictures directory not found at {pictures_dir}. Please create it and add images.")
         return
 
+    filenames = sorted(f for f in os.listdir(pictures_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+    dedup_on = IMAGE_DEDUP_MODE in ("skip", "report") and bool(filenames)
+    if dedup_on and IMAGE_HASH_METHOD not in image_hashes.METHODS:
+        print(f"Warning: Unknown AGENT_G_IMAGE_HASH '{IMAGE_HASH_METHOD}' "
+              f"(use one of: {', '.join(image_hashes.METHODS)}); transcribing without the duplicate check.")
+        dedup_on = False
+    hashes: Dict[str, int] = {}
+    index: Optional[image_hashes.HashIndex] = None
+    cache: Optional[image_hashes.HashCache] = None
+    duplicates: List[Tuple[str, str, int]] = []
+    hash_errors: List[str] = []
+    hashed = skipped = 0
+    start = time.perf_counter()
+    if dedup_on:
+        print(f"Hashing images ({IMAGE_HASH_METHOD}, threshold {IMAGE_HASH_THRESHOLD})...")
+        cache = image_hashes.HashCache.load(os.path.join(transcribed_texts_dir, IMAGE_HASH_CACHE_FILENAME),
+                                            IMAGE_HASH_METHOD, IMAGE_HASH_SIZE)
+        hashes, hashed, hash_errors = _hash_images(pictures_dir, filenames, cache)
+        index = image_hashes.HashIndex(IMAGE_HASH_SIZE ** 2, IMAGE_HASH_THRESHOLD)
+        # Images transcribed by earlier runs count as already transcribed, as long as their text is still there.
+        for filename, entry in cache.entries.items():
+            output = entry.get("output")
+            if output and os.path.exists(os.path.join(transcribed_texts_dir, str(output))):
+                index.add(filename, int(str(entry["hash"]), 16))
+    hash_ms = (time.perf_counter() - start) * 1000
+
     processed_files = 0
-    for filename in os.listdir(pictures_dir):
-        if filename.lower().endswith((".png", ".jpg", ".jpeg", ".heic", ".webp")):
-            image_path = os.path.join(pictures_dir, filename)
-            transcribe_image(image_path, transcribed_texts_dir)
-            processed_files += 1
+    for filename in filenames:
+        image_path = os.path.join(pictures_dir, filename)
+        value = hashes.get(filename)
+        if index is not None and cache is not None and value is not None:
+            match = index.nearest(value, exclude=filename)
+            cache.entries[filename]["duplicate_of"] = match[0] if match else None
+            if match is not None:
+                duplicates.append((filename, match[0], match[1]))
+                print(f"Near-duplicate: {filename} looks like {match[0]} (distance {match[1]}).")
+                if IMAGE_DEDUP_MODE == "skip":
+                    print("  Skipping; it was not sent for transcription.")
+                    cache.entries[filename]["output"] = None
+                    skipped += 1
+                    processed_files += 1
+                    continue
+        output_filename = transcribe_image(image_path, transcribed_texts_dir)
+        if index is not None and cache is not None and value is not None:
+            cache.entries[filename]["output"] = output_filename
+            if output_filename is not None:
+                index.add(filename, value)
+        processed_files += 1
+
+    if cache is not None:
+        for filename in set(cache.entries) - set(filenames):
+            del cache.entries[filename] # The image is gone.
+        try:
+            cache.save()
+        except OSError as e:
+            print(f"Warning: Could not save image hashes: {e}")
 
     if processed_files == 0:
         print(f"No image files found in {pictures_dir}. Please add images (e.g., .jpg, .png).")
     else:
         print(f"Transcription process completed. Processed {processed_files} image(s).")
+    if dedup_on:
+        report = DedupReport(len(filenames), hashed, len(filenames) - hashed, hash_errors, duplicates, skipped, hash_ms)
+        for error in report.errors:
+            print(f"Warning: Could not hash {error}")
+        print(report.describe())
 
 def main() -> None:
     """Main function to orchestrate the transcription process.
@@ -0,0 +1,410 @@
+"""
+Backs up and restores every encrypted artefact as a single archive.
+
+The system prompt, notebook pages (with their summaries and reports) and user
+profiles are streamed into one tar archive exactly as they are on disk, still
+encrypted, so no key is needed to take a backup. The archive ends with a
+manifest listing every file with its size, modification time and SHA-256
+hash; a copy of the manifest is also written next to the archive as
+<archive>.manifest.json.
+
+Usage:
+    python utilities/backup.py create backups/full.tar
+    python utilities/backup.py create backups/monday.tar --incremental-from backups/full.tar
+    python utilities/backup.py verify backups/monday.tar
+    python utilities/backup.py restore backups/monday.tar
+
+Incremental backups only store files whose content changed since the base
+backup; the manifest still lists every file and names the archive holding
+it. Restoring an incremental backup therefore needs its base archives, under
+their original names, in the same directory.
+
+Restoring extracts into a staging directory, checks each file's hash against
+the manifest and its ciphertext against the keyring (in parallel worker
+processes), and only if every file passes swaps the restored directories into
+place, each with two renames. The data that was there before is kept in
+agent_cli/.pre-restore-<timestamp>-<suffix>/ and can be deleted once the
+restore is checked. A running CLI is told about the restored pages through the
+change event log.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# Determine project root and paths
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+AGENT_CLI_DIR = os.path.join(PROJECT_ROOT, "agent_cli")
+DOTENV_PATH = os.path.join(AGENT_CLI_DIR, ".env")
+
+load_dotenv(dotenv_path=DOTENV_PATH)
+sys.path.append(PROJECT_ROOT)
+
+from agent_cli import change_events
+from agent_cli import file_io
+
+# Backed-up locations, relative to agent_cli/.
+DATA_DIRS = ("notebook_context", "user_profiles")
+SYSTEM_PROMPT_NAME = "system_prompt.md.enc"
+
+MANIFEST_NAME = "MANIFEST.json"
+MANIFEST_SUFFIX = ".manifest.json"
+MANIFEST_VERSION = 1
+
+# Files are handed to verification workers in batches to keep inter-process
+# overhead low when the archive consists of many small pages.
+BATCH_SIZE = 64
+
+
+def collect_files(root: str) -> List[str]:
+    """Lists every encrypted file that belongs to the data set.
+
+    Args:
+        root (str): The agent_cli directory.
+
+    Returns:
+        List[str]: Paths relative to `root`, with "/" separators, sorted.
+    """
+    files = []
+    if os.path.isfile(os.path.join(root, SYSTEM_PROMPT_NAME)):
+        files.append(SYSTEM_PROMPT_NAME)
+    for directory in DATA_DIRS:
+        path = os.path.join(root, directory)
+        if not os.path.isdir(path):
+            continue
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".enc"):
+                    files.append(f"{directory}/{entry.name}")
+    return sorted(files)
+
+
+def _is_data_path(name: str) -> bool:
+    """Checks that an archive or manifest path names a file `collect_files` could have listed."""
+    if name == SYSTEM_PROMPT_NAME:
+        return True
+    parts = name.split("/")
+    return (len(parts) == 2 and parts[0] in DATA_DIRS and parts[1].endswith(".enc")
+            and parts[1] not in ("", ".", "..") and "\\" not in parts[1])
+
+
+def read_manifest(archive_path: str) -> Dict[str, Any]:
+    """Reads the manifest of a backup, from its sidecar file or else from the archive itself.
+
+    Raises:
+        ValueError: If the manifest is missing, unreadable or lists a path outside the data set.
+    """
+    try:
+        with open(archive_path + MANIFEST_SUFFIX, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        try:
+            with tarfile.open(archive_path, "r:") as tar:
+                member = tar.extractfile(MANIFEST_NAME)
+                data = member.read() if member is not None else b""
+        except (KeyError, OSError, tarfile.TarError) as e:
+            raise ValueError(f"Could not read the manifest of {archive_path}: {e}") from e
+    try:
+        manifest = json.loads(data)
+    except ValueError as e:
+        raise ValueError(f"The manifest of {archive_path} is not valid JSON: {e}") from e
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"{archive_path} has no manifest in a supported format.")
+    unsafe = [name for name in manifest.get("files", {}) if not _is_data_path(name)]
+    if unsafe:
+        raise ValueError(f"The manifest of {archive_path} lists unexpected paths, e.g. {unsafe[0]!r}.")
+    return manifest
+
+
+def _write_member(tar: tarfile.TarFile, name: str, data: bytes, mtime: float) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(mtime) # A whole-second mtime avoids a PAX header per member.
+    info.mode = 0o600
+    tar.addfile(info, io.BytesIO(data))
+
+
+def create_backup(output: str, root: str = AGENT_CLI_DIR, base: Optional[str] = None) -> Dict[str, Any]:
+    """Streams the encrypted data set into a tar archive, without decrypting anything.
+
+    Args:
+        output (str): The archive to write; it appears only once it is complete.
+        root (str): The agent_cli directory to back up.
+        base (Optional[str]): An earlier backup; files unchanged since then are not stored again.
+
+    Returns:
+        Dict[str, Any]: The manifest that was written.
+    """
+    base_files: Dict[str, Dict[str, Any]] = read_manifest(base)["files"] if base else {}
+    archive_name = os.path.basename(output)
+    if base and archive_name == os.path.basename(base):
+        raise ValueError("An incremental backup needs a different file name from its base.")
+    files = collect_files(root)
+    entries: Dict[str, Dict[str, Any]] = {}
+    stored = reused = stored_bytes = 0
+    start = time.perf_counter()
+
+    directory = os.path.dirname(os.path.abspath(output))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".part")
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            with tarfile.open(fileobj=raw, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+                for name in files:
+                    path = os.path.join(root, name)
+                    previous = base_files.get(name)
+                    try:
+                        st = os.stat(path)
+                        if previous and previous["size"] == st.st_size and previous["mtime_ns"] == st.st_mtime_ns:
+                            entries[name] = dict(previous)
+                            reused += 1
+                            continue
+                        with open(path, 'rb') as f:
+                            st = os.fstat(f.fileno())
+                            data = f.read()
+                    except FileNotFoundError:
+                        continue # Deleted since it was listed.
+                    digest = hashlib.sha256(data).hexdigest()
+                    if previous and previous["sha256"] == digest:
+                        entries[name] = dict(previous, mtime_ns=st.st_mtime_ns)
+                        reused += 1
+                        continue
+                    _write_member(tar, name, data, st.st_mtime)
+                    entries[name] = {"size": len(data), "mtime_ns": st.st_mtime_ns, "sha256": digest,
+                                     "archive": archive_name}
+                    stored += 1
+                    stored_bytes += len(data)
+                manifest = {
+                    "version": MANIFEST_VERSION,
+                    "created": time.time(),
+                    "archive": archive_name,
+                    "base": os.path.basename(base) if base else None,
+                    "files": entries,
+                }
+                manifest_bytes = json.dumps(manifest, sort_keys=True).encode('utf-8')
+                _write_member(tar, MANIFEST_NAME, manifest_bytes, time.time())
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(temp_path, output)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    file_io.atomic_write(output + MANIFEST_SUFFIX, manifest_bytes)
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(f"Backed up {len(entries)} file(s) to {output} in {elapsed:.1f}s: "
+          f"{stored} stored ({stored_bytes / 1e6:.1f} MB, {stored_bytes / elapsed / 1e6:.1f} MB/s), "
+          f"{reused} unchanged since {os.path.basename(base) if base else 'the base'}.")
+    return manifest
+
+
+def verify_batch(file_paths: List[str]) -> List[Tuple[str, bool]]:
+    """Checks a batch of restored files against the keyring in a worker process.
+
+    Args:
+        file_paths (List[str]): Files to check.
+
+    Returns:
+        List[Tuple[str, bool]]: (path, whether the ciphertext is intact and decryptable) per file.
+    """
+    from agent_cli import encryption_service
+    results = []
+    for file_path in file_paths:
+        try:
+            with open(file_path, 'rb') as f:
+                results.append((file_path, encryption_service.verify_data(f.read())))
+        except OSError:
+            results.append((file_path, False))
+    return results
+
+
+def _extract(archive_path: str, wanted: Dict[str, Dict[str, Any]], staging: str,
+             executor: ProcessPoolExecutor, futures: list, failures: List[str]) -> int:
+    """Streams the wanted members of one archive into `staging`, checking their hashes.
+
+    Verified files are handed to `executor` in batches as they are written.
+
+    Returns:
+        int: Bytes extracted.
+    """
+    remaining = set(wanted)
+    batch: List[str] = []
+    extracted = 0
+    with open(archive_path, 'rb') as raw, tarfile.open(fileobj=raw, mode="r|") as tar:
+        for member in tar:
+            if member.name not in remaining or not member.isfile():
+                continue
+            remaining.discard(member.name)
+            entry = wanted[member.name]
+            data = tar.extractfile(member).read()
+            if len(data) != entry["size"] or hashlib.sha256(data).hexdigest() != entry["sha256"]:
+                failures.append(f"{member.name}: does not match the manifest hash")
+                continue
+            destination = os.path.join(staging, *member.name.split("/"))
+            fd = os.open(destination, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.utime(destination, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+            extracted += len(data)
+            batch.append(destination)
+            if len(batch) >= BATCH_SIZE:
+                futures.append(executor.submit(verify_batch, batch))
+                batch = []
+    if batch:
+        futures.append(executor.submit(verify_batch, batch))
+    for name in sorted(remaining):
+        failures.append(f"{name}: missing from {os.path.basename(archive_path)}")
+    return extracted
+
+
+def _swap_into_place(staging: str, root: str) -> str:
+    """Moves the restored data into `root`, keeping what was there in a .pre-restore directory.
+
+    Returns:
+        str: The directory holding the previous data.
+    """
+    # A unique suffix, since restores can follow each other within a second.
+    previous = tempfile.mkdtemp(prefix=f".pre-restore-{time.strftime('%Y%m%d-%H%M%S')}-", dir=root)
+    for directory in DATA_DIRS:
+        current = os.path.join(root, directory)
+        restored = os.path.join(staging, directory)
+        if os.path.isdir(current):
+            # Files outside the data set (such as the change event log) stay with the live directory.
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_file() and not _is_data_path(f"{directory}/{entry.name}"):
+                        shutil.copy2(entry.path, os.path.join(restored, entry.name))
+            os.rename(current, os.path.join(previous, directory))
+        os.rename(restored, current)
+    current = os.path.join(root, SYSTEM_PROMPT_NAME)
+    restored = os.path.join(staging, SYSTEM_PROMPT_NAME)
+    if os.path.exists(current):
+        shutil.copy2(current, os.path.join(previous, SYSTEM_PROMPT_NAME))
+        if not os.path.exists(restored):
+            os.unlink(current)
+    if os.path.exists(restored):
+        os.replace(restored, current)
+    return previous
+
+
+def restore_backup(archive_path: str, root: str = AGENT_CLI_DIR, workers: int = 1, dry_run: bool = False) -> int:
+    """Restores a backup, verifying every file before anything is replaced.
+
+    Args:
+        archive_path (str): The backup to restore; its base archives must sit next to it.
+        root (str): The agent_cli directory to restore into.
+        workers (int): Number of verification worker processes.
+        dry_run (bool): If True, only verify the backup; nothing is replaced.
+
+    Returns:
+        int: The number of files that failed verification (0 if the restore went ahead).
+    """
+    from agent_cli import encryption_service
+    encryption_service.load_keyring() # Fails here, before any work, if the key is invalid.
+
+    manifest = read_manifest(archive_path)
+    files: Dict[str, Dict[str, Any]] = manifest["files"]
+    archive_dir = os.path.dirname(os.path.abspath(archive_path))
+    by_archive: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for name, entry in files.items():
+        by_archive.setdefault(entry["archive"], {})[name] = entry
+    # The backup's own files are read from `archive_path` even if it was renamed; bases are found by name.
+    paths = {name: archive_path if name == manifest.get("archive") else os.path.join(archive_dir, name)
+             for name in by_archive}
+    missing = [name for name, path in paths.items() if not os.path.isfile(path)]
+    if missing:
+        print(f"Error: Archive(s) needed by this backup are not in {archive_dir}: {', '.join(sorted(missing))}")
+        return len(files)
+    print(f"Verifying {len(files)} file(s) from {len(by_archive)} archive(s)...")
+
+    staging = tempfile.mkdtemp(prefix=".restore-", dir=None if dry_run else root)
+    for directory in DATA_DIRS:
+        os.makedirs(os.path.join(staging, directory))
+    failures: List[str] = []
+    extracted = 0
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures: list = []
+            for name, wanted in sorted(by_archive.items()):
+                extracted += _extract(paths[name], wanted, staging, executor, futures, failures)
+            for future in as_completed(futures):
+                for file_path, ok in future.result():
+                    if not ok:
+                        failures.append(f"{os.path.relpath(file_path, staging)}: "
+                                        "ciphertext is damaged or was made with an unknown key")
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        print(f"Checked {len(files)} file(s) ({extracted / 1e6:.1f} MB) in {elapsed:.1f}s "
+              f"({len(files) / elapsed:.0f} files/s, {extracted / elapsed / 1e6:.1f} MB/s).")
+        for failure in failures[:20]:
+            print(f"  Failed: {failure}")
+        if len(failures) > 20:
+            print(f"  ... and {len(failures) - 20} more.")
+        if failures:
+            print(f"{len(failures)} file(s) failed verification; nothing was restored.")
+            return len(failures)
+        if dry_run:
+            print("The backup is intact.")
+            return 0
+        previous = _swap_into_place(staging, root)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    pages = {name.split("/", 1)[1] for name in files if name.startswith(f"{DATA_DIRS[0]}/")}
+    previous_pages = set(os.listdir(os.path.join(previous, DATA_DIRS[0]))) \
+        if os.path.isdir(os.path.join(previous, DATA_DIRS[0])) else set()
+    try:
+        notebook_dir = os.path.join(root, DATA_DIRS[0])
+        change_events.record_changes(notebook_dir, sorted(pages))
+        change_events.record_changes(notebook_dir, sorted(name for name in previous_pages - pages
+                                                          if _is_data_path(f"{DATA_DIRS[0]}/{name}")),
+                                     change_events.OP_DELETE)
+    except OSError as e:
+        print(f"Warning: Could not record change events for a running CLI: {e}")
+    print(f"Restored {len(files)} file(s). The previous data is in {previous}; delete it once you have checked the restore.")
+    return 0
+
+
+def main() -> None:
+    """Parses command-line arguments and runs the requested command."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="Write a backup archive.")
+    create.add_argument("archive", help="The archive to write.")
+    create.add_argument("--incremental-from", metavar="BASE", help="Only store files changed since this backup.")
+    for name, text in (("verify", "Check a backup without restoring it."),
+                       ("restore", "Verify a backup and swap it into place.")):
+        command = commands.add_parser(name, help=text)
+        command.add_argument("archive", help="The archive to read.")
+        command.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                             help="Number of verification worker processes (default: CPU count).")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "create":
+            create_backup(args.archive, base=args.incremental_from)
+            failures = 0
+        else:
+            failures = restore_backup(args.archive, workers=max(1, args.workers), dry_run=args.command == "verify")
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,7 +19,11 @@ sys.path.append(PROJECT_ROOT)
 
 # Attempt to import encryption_service
 try:
-    from agent_cli.encryption_service import encrypt_data
+    from agent_cli.encryption_service import decrypt_file, encrypt_data, load_keyring
+    from agent_cli.file_io import atomic_write
+    from agent_cli.change_events import record_changes
+    from agent_cli import config, dedup, profiler, summaries
+    load_keyring()
 except ImportError as e:
     print(f"Error: Could not import encrypt_data from agent_cli.encryption_service: {e}")
     print("Ensure that 'agent_cli' is a package in the project root and encryption_service.py exists within it.")
@@ -36,6 +40,105 @@ RAW_TRANSCRIPTIONS_DIR = os.path.join(PROJECT_ROOT, "transcription_service", "ra
 NOTEBOOK_CONTEXT_DIR = os.path.join(PROJECT_ROOT, "agent_cli", "notebook_context")
 
 
+def summarise_pages(page_texts: dict, written_filenames: list) -> None:
+    """
+    Brings the encrypted page and notebook summaries in NOTEBOOK_CONTEXT_DIR up to date.
+
+    Only pages whose content changed since their summary was written are
+    summarised again. Uses config.SUMMARY_MODEL_NAME when set (and an API key
+    is available), otherwise writes extractive summaries. Pages whose summary
+    changed are added to `written_filenames` so a running CLI reloads them.
+
+    Args:
+        page_texts (dict): Decrypted page text already at hand, by output filename.
+        written_filenames (list): Output filenames to record change events for; extended in place.
+
+    Returns:
+        None
+    """
+    model_name = config.SUMMARY_MODEL_NAME
+    if model_name and not config.API_KEY:
+        print("Warning: GOOGLE_API_KEY is not set; writing extractive summaries instead.")
+        model_name = ""
+    elif model_name:
+        try:
+            config.get_genai().configure(api_key=config.API_KEY)
+        except Exception as e:
+            print(f"Warning: Could not configure the Gemini API ({e}); writing extractive summaries instead.")
+            model_name = ""
+    print(f"Updating summaries ({model_name or 'extractive'})...")
+    report = summaries.summarise_directory(
+        NOTEBOOK_CONTEXT_DIR,
+        known_texts=page_texts,
+        model_name=model_name,
+        workers=config.SUMMARY_WORKERS,
+        requests_per_minute=config.SUMMARY_REQUESTS_PER_MINUTE,
+    )
+    for error in report.errors[:20]:
+        print(f"Warning: Summary error: {error}")
+    if len(report.errors) > 20:
+        print(f"Warning: {len(report.errors) - 20} more summary error(s).")
+    print(report.describe())
+    already_recorded = set(written_filenames)
+    written_filenames.extend(filename for filename in report.changed_pages if filename not in already_recorded)
+
+
+def read_other_pages(page_texts: dict) -> None:
+    """
+    Decrypts the pages in NOTEBOOK_CONTEXT_DIR not written by this run into `page_texts`.
+
+    Args:
+        page_texts (dict): Decrypted page text by output filename; extended in place.
+
+    Returns:
+        None
+    """
+    for filename in sorted(os.listdir(NOTEBOOK_CONTEXT_DIR)):
+        if not filename.endswith(".txt.enc") or filename in page_texts:
+            continue
+        try:
+            page_texts[filename] = decrypt_file(os.path.join(NOTEBOOK_CONTEXT_DIR, filename)).decode("utf-8")
+        except Exception as e:
+            print(f"Warning: Could not decrypt {filename}: {e}")
+
+
+def report_duplicates(page_texts: dict) -> None:
+    """
+    Finds near-duplicate pages, prints the clusters and writes the encrypted report
+    and page signatures.
+
+    Signatures saved by the previous run are reused for pages that did not
+    change, and the CLI reads the report and signatures back so it does not
+    hash every page again.
+
+    Pages are not removed; the CLI collapses duplicates in prompts according to
+    config.DUPLICATE_PAGES_MODE.
+
+    Args:
+        page_texts (dict): Decrypted text of every page, by output filename.
+
+    Returns:
+        None
+    """
+    if config.DUPLICATE_PAGES_MODE == dedup.MODE_OFF:
+        return
+    dedup.load_signatures(NOTEBOOK_CONTEXT_DIR)
+    report = dedup.find_duplicates(sorted(page_texts.items()), config.DUPLICATE_THRESHOLD)
+    print(report.describe())
+    for cluster in report.clusters[:20]:
+        duplicates = ", ".join(f"{filename} ({score:.0%})" for filename, score in cluster.duplicates)
+        print(f"  {cluster.keep} = {duplicates}")
+    if len(report.clusters) > 20:
+        print(f"  ... and {len(report.clusters) - 20} more cluster(s).")
+    try:
+        path = dedup.write_report(NOTEBOOK_CONTEXT_DIR, report)
+        print(f"Duplicate report written to {path}")
+        dedup.save_signatures(NOTEBOOK_CONTEXT_DIR, page_texts)
+    except OSError as e:
+        print(f"Warning: Could not write the duplicate report: {e}")
+
+
+@profiler.profiled("prepare_context")
 def prepare_context() -> None:
     """
     Reads plain text files from raw_transcriptions, encrypts, and saves them to notebook_context.
@@ -76,6 +179,8 @@ def prepare_context() -> None:
 
     processed_files_count = 0
     failed_files_count = 0
+    written_filenames = []
+    page_texts = {}
 
     for filename in os.listdir(RAW_TRANSCRIPTIONS_DIR):
         if filename.endswith(".txt"):
@@ -91,8 +196,9 @@ def prepare_context() -> None:
                 
                 encrypted_content = encrypt_data(content_bytes)
 
-                with open(output_filepath, "wb") as f_out:
-                    f_out.write(encrypted_content)
+                atomic_write(output_filepath, encrypted_content)
+                written_filenames.append(output_filename)
+                page_texts[output_filename] = content
                 
                 print(f"Successfully processed and encrypted: {filename} -> {output_filename}")
                 processed_files_count += 1
@@ -107,6 +213,18 @@ def prepare_context() -> None:
                 failed_files_count += 1
         else:
             pass
+
+    # Summaries and duplicate detection both need every page, so decrypt the rest once.
+    read_other_pages(page_texts)
+    summarise_pages(page_texts, written_filenames)
+    report_duplicates(page_texts)
+
+    # Let a running CLI reload just the pages written here.
+    if written_filenames:
+        try:
+            record_changes(NOTEBOOK_CONTEXT_DIR, written_filenames)
+        except OSError as e:
+            print(f"Warning: Could not record change events for a running CLI: {e}")
             
     print(f"\nContext preparation complete.")
     print(f"Successfully processed files: {processed_files_count}")
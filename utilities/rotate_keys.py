@@ -0,0 +1,251 @@
+"""
+Re-encrypts every encrypted artefact with the primary ENCRYPTION_KEY.
+
+Rotation workflow:
+    1. Stop the CLI, the admin interface and its workers. A process that is
+       already running keeps encrypting with the key it loaded at start-up,
+       so files it writes during or after the rotation would still need the
+       old key.
+    2. Generate a new key and set it as ENCRYPTION_KEY in agent_cli/.env.
+    3. Move the old key into ENCRYPTION_KEYS_PREVIOUS (comma separated).
+    4. Run this script. Files already encrypted with the primary key (in the
+       current AGENT_G_CIPHER_MODE) are skipped, so an interrupted run can
+       simply be started again and resumes where it stopped.
+    5. Start the agent again. Once the script reports that every file was
+       verified, remove the old key from ENCRYPTION_KEYS_PREVIOUS.
+
+Every file is rewritten atomically. A file that changes while it is being
+re-encrypted is read again rather than overwritten with its old content.
+After rotating, the script reads every file back and checks that it decrypts
+with the primary key; only then is it safe to drop the old key.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Tuple
+from dotenv import load_dotenv
+
+# Determine project root and paths
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+AGENT_CLI_DIR = os.path.join(PROJECT_ROOT, "agent_cli")
+DOTENV_PATH = os.path.join(AGENT_CLI_DIR, ".env")
+
+load_dotenv(dotenv_path=DOTENV_PATH)
+sys.path.append(PROJECT_ROOT)
+
+try:
+    from agent_cli import encryption_service
+    from agent_cli import file_io
+    encryption_service.load_keyring()
+except ValueError as e:
+    print(f"Error during import of encryption_service: {e}")
+    print(f"Please ensure that ENCRYPTION_KEY is correctly set in {DOTENV_PATH} and the file is accessible.")
+    sys.exit(1)
+
+NOTEBOOK_CONTEXT_DIR = os.path.join(AGENT_CLI_DIR, "notebook_context")
+USER_PROFILE_DIR = os.path.join(AGENT_CLI_DIR, "user_profiles")
+SYSTEM_PROMPT_FILE_PATH = os.path.join(AGENT_CLI_DIR, "system_prompt.md.enc")
+
+# Files are handed to workers in batches to keep inter-process overhead low
+# when the archive consists of many small pages.
+BATCH_SIZE = 64
+
+STATUS_ROTATED = "rotated"
+STATUS_SKIPPED = "skipped"
+STATUS_FAILED = "failed"
+
+# Times a file that changes while it is being re-encrypted is read again.
+ROTATE_ATTEMPTS = 3
+
+
+def collect_targets() -> List[str]:
+    """Lists every encrypted file that belongs to the data set.
+
+    Returns:
+        List[str]: Absolute paths of the system prompt, notebook pages and user profiles.
+    """
+    targets = []
+    if os.path.isfile(SYSTEM_PROMPT_FILE_PATH):
+        targets.append(SYSTEM_PROMPT_FILE_PATH)
+    for directory in (NOTEBOOK_CONTEXT_DIR, USER_PROFILE_DIR):
+        if not os.path.isdir(directory):
+            continue
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".enc"):
+                    targets.append(entry.path)
+    return sorted(targets)
+
+
+def _file_version(file_path: str) -> Tuple[int, int, int, int]:
+    st = os.stat(file_path)
+    return st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _rotate_file(file_path: str) -> Tuple[str, str, int, str]:
+    for _ in range(ROTATE_ATTEMPTS):
+        version = _file_version(file_path)
+        with open(file_path, 'rb') as f:
+            encrypted = f.read()
+        if encryption_service.is_encrypted_with_primary_key(encrypted):
+            return file_path, STATUS_SKIPPED, len(encrypted), ""
+        rotated = encryption_service.rotate_data(encrypted)
+        # Do not replace a version written after it was read, e.g. by a profile save.
+        if _file_version(file_path) != version:
+            continue
+        file_io.atomic_write(file_path, rotated)
+        return file_path, STATUS_ROTATED, len(encrypted), ""
+    return (file_path, STATUS_FAILED, 0,
+            f"changed {ROTATE_ATTEMPTS} times while being rotated; is the agent still running?")
+
+
+def rotate_batch(file_paths: List[str]) -> List[Tuple[str, str, int, str]]:
+    """Rotates a batch of files in a worker process.
+
+    Args:
+        file_paths (List[str]): Files to re-encrypt.
+
+    Returns:
+        List[Tuple[str, str, int, str]]: (path, status, bytes read, error message) per file.
+    """
+    results = []
+    for file_path in file_paths:
+        try:
+            results.append(_rotate_file(file_path))
+        except Exception as e:
+            results.append((file_path, STATUS_FAILED, 0, str(e) or type(e).__name__))
+    return results
+
+
+def verify_batch(file_paths: List[str]) -> List[Tuple[str, str]]:
+    """Checks in a worker process that files decrypt with the primary key.
+
+    Args:
+        file_paths (List[str]): Files to check.
+
+    Returns:
+        List[Tuple[str, str]]: (path, problem) for each file that does not.
+    """
+    problems = []
+    for file_path in file_paths:
+        try:
+            with open(file_path, 'rb') as f:
+                encrypted = f.read()
+            if not encryption_service.is_encrypted_with_primary_key(encrypted):
+                problems.append((file_path, "not encrypted with the primary key"))
+            elif not encryption_service.verify_data(encrypted):
+                problems.append((file_path, "does not decrypt"))
+        except Exception as e:
+            problems.append((file_path, str(e) or type(e).__name__))
+    return problems
+
+
+def verify_rotation(executor: ProcessPoolExecutor) -> int:
+    """Reads every target back, including files created during the rotation.
+
+    Args:
+        executor (ProcessPoolExecutor): Pool to run the checks in.
+
+    Returns:
+        int: The number of files that still need an old key or do not decrypt.
+    """
+    targets = collect_targets()
+    print(f"\nVerifying {len(targets)} file(s)...")
+    batches = [targets[i:i + BATCH_SIZE] for i in range(0, len(targets), BATCH_SIZE)]
+    problems = 0
+    for future in as_completed([executor.submit(verify_batch, batch) for batch in batches]):
+        for file_path, problem in future.result():
+            problems += 1
+            print(f"  Not verified: {os.path.relpath(file_path, PROJECT_ROOT)}: {problem}")
+    return problems
+
+
+def rotate_keys(workers: int, dry_run: bool = False) -> int:
+    """Re-encrypts all targets in parallel, reporting progress and throughput.
+
+    Args:
+        workers (int): Number of worker processes.
+        dry_run (bool): If True, only report which files would be rotated.
+
+    Returns:
+        int: The number of files that failed to rotate or, if none did, that
+            failed the verification pass afterwards.
+    """
+    targets = collect_targets()
+    total = len(targets)
+    print(f"Primary key fingerprint: {encryption_service.primary_key_fingerprint()}")
+    print(f"Previous keys in keyring: {len(encryption_service.PREVIOUS_ENCRYPTION_KEYS)}")
+    print(f"Cipher mode for rewritten files: {encryption_service.CIPHER_MODE}")
+    print(f"Found {total} encrypted file(s).")
+    if not total:
+        return 0
+
+    if dry_run:
+        pending = 0
+        for file_path in targets:
+            with open(file_path, 'rb') as f:
+                if not encryption_service.is_encrypted_with_primary_key(f.read()):
+                    pending += 1
+                    print(f"  would rotate: {os.path.relpath(file_path, PROJECT_ROOT)}")
+        print(f"{pending} of {total} file(s) would be rotated.")
+        return 0
+
+    counts = {STATUS_ROTATED: 0, STATUS_SKIPPED: 0, STATUS_FAILED: 0}
+    bytes_processed = 0
+    done = 0
+    start = time.perf_counter()
+    last_report = start
+    batches = [targets[i:i + BATCH_SIZE] for i in range(0, total, BATCH_SIZE)]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(rotate_batch, batch) for batch in batches]
+        for future in as_completed(futures):
+            for file_path, status, size, error in future.result():
+                counts[status] += 1
+                bytes_processed += size
+                done += 1
+                if status == STATUS_FAILED:
+                    print(f"  Failed: {os.path.relpath(file_path, PROJECT_ROOT)}: {error}")
+            now = time.perf_counter()
+            if now - last_report >= 1.0 or done == total:
+                elapsed = max(now - start, 1e-9)
+                print(
+                    f"  {done}/{total} files ({done / total:.0%}) | "
+                    f"{done / elapsed:.0f} files/s | {bytes_processed / elapsed / 1e6:.1f} MB/s"
+                )
+                last_report = now
+
+        elapsed = time.perf_counter() - start
+        print(f"\nKey rotation complete in {elapsed:.1f}s.")
+        print(f"Rotated: {counts[STATUS_ROTATED]}")
+        print(f"Already on primary key: {counts[STATUS_SKIPPED]}")
+        print(f"Failed: {counts[STATUS_FAILED]}")
+        if counts[STATUS_FAILED]:
+            print("Re-run the script to retry failed files. Keep the old keys in ENCRYPTION_KEYS_PREVIOUS until no failures remain.")
+            return counts[STATUS_FAILED]
+        unverified = verify_rotation(executor)
+
+    if unverified:
+        print(f"{unverified} file(s) failed verification. Make sure the agent is stopped, re-run the script "
+              "and keep the old keys in ENCRYPTION_KEYS_PREVIOUS until every file verifies.")
+        return unverified
+    print("Every file decrypts with the primary key. The old key can be removed from ENCRYPTION_KEYS_PREVIOUS.")
+    return 0
+
+
+def main() -> None:
+    """Parses command-line arguments and runs the rotation."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes (default: CPU count).")
+    parser.add_argument("--dry-run", action="store_true", help="List files that would be rotated without changing them.")
+    args = parser.parse_args()
+    failures = rotate_keys(max(1, args.workers), dry_run=args.dry_run)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()